@@ -3,6 +3,10 @@ from pathlib import Path
 
 import matplotlib.pyplot as plt
 import pandas as pd
+from diskfiles.countTables import CountTable
+from motifs.motif import Mononucleotide
+from motifs.parse_motifcentral_json import MOTIFCENTRAL
+from utils.binning import bin_statistics, size_bins
 
 if __name__ == "__main__":
 
@@ -25,20 +29,30 @@ if __name__ == "__main__":
     Ref_ScorePath = CountTablePath.parent / Path(
         f"{CountTablePath.name[:11]}_{Ref_Motif_ID}.txt"
     )
-
-    if not Ref_ScorePath.exists():
-        raise FileNotFoundError(
-            f"You need to score the count table with the reference motif first!"
-        )
-
     Cofactor_ScorePath = CountTablePath.parent / Path(
         f"{CountTablePath.name[:11]}_{Cofactor_Motif_ID}.txt"
     )
 
-    if not Cofactor_ScorePath.exists():
-        raise FileNotFoundError(
-            f"You need to score the count table with the cofactor motif first!"
+    # Score the motifs that haven't been scored yet in one pass over the count table
+    missing = [
+        motif_id
+        for motif_id, score_path in (
+            (Ref_Motif_ID, Ref_ScorePath),
+            (Cofactor_Motif_ID, Cofactor_ScorePath),
         )
+        if not score_path.exists()
+    ]
+    if missing:
+        motifs = [
+            Mononucleotide.create_from_motif_central(motif)
+            for motif in MOTIFCENTRAL
+            if motif["metadata"]["fit_id"] in missing
+        ]
+        if len(motifs) != len(set(missing)):
+            raise FileNotFoundError(
+                f"You need to score the count table with {missing} first!"
+            )
+        CountTable(CountTablePath).score_many(motifs)
 
     # Reading data as pandas dataframe
     pandas_r0_r1 = pd.read_csv(
@@ -54,29 +68,18 @@ if __name__ == "__main__":
     merged_df.sort_values(by="Ref_Score", ascending=False, inplace=True)
 
     # Bin the dataframe
-
-    i = 0
-    avg_ref_score = []
-    avg_cof_score = []
-    r0_count = []
-    r1_count = []
-    while (
-        i < merged_df.shape[0] - 10
-    ):  # Keeping a buffer, so that the last bin isn't super small
-        bin = merged_df.iloc[i : i + 1000, :].copy()
-        avg_cof_score.append(bin.iloc[:, 3].mean())
-        avg_ref_score.append(bin.iloc[:, 2].mean())
-        r0_count.append(bin.iloc[:, 0].sum())
-        r1_count.append(bin.iloc[:, 1].sum())
-        i += 1000
-
-    bin_df = pd.DataFrame(
-        {
-            "avg_cof_score": avg_cof_score,
-            "avg_ref_score": avg_ref_score,
-            "r0_count": r0_count,
-            "r1_count": r1_count,
-        }
+    starts, ends = size_bins(merged_df.shape[0], bin_size=1000)
+    bin_df = bin_statistics(
+        starts,
+        ends,
+        means={
+            "avg_cof_score": merged_df["Cofactor Score"].to_numpy(),
+            "avg_ref_score": merged_df["Ref_Score"].to_numpy(),
+        },
+        sums={
+            "r0_count": merged_df["R0"].to_numpy(),
+            "r1_count": merged_df["R1"].to_numpy(),
+        },
     )
     bin_df["enrichment"] = bin_df["r1_count"] / bin_df["r0_count"]
 
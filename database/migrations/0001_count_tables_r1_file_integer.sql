@@ -0,0 +1,22 @@
+-- count_tables.r1_file references files.id but was declared TEXT. Comparing it to the
+-- INTEGER id converts every row, so looking a count table up by its file scanned the whole
+-- table instead of using the UNIQUE index. SQLite can't change a column type in place, so
+-- the table is rebuilt.
+
+CREATE TABLE "count_tables_new" (
+    "id" INTEGER,
+    "r1_file" INTEGER NOT NULL UNIQUE,
+    "probe_count" INTEGER NOT NULL,
+    "r0_count" INTEGER NOT NULL,
+    "r1_count" INTEGER NOT NULL,
+    FOREIGN KEY ("r1_file") REFERENCES "files" ("id"),
+    PRIMARY KEY ("id")
+);
+
+INSERT INTO "count_tables_new" ("id", "r1_file", "probe_count", "r0_count", "r1_count")
+    SELECT "id", CAST("r1_file" AS INTEGER), "probe_count", "r0_count", "r1_count"
+    FROM "count_tables";
+
+DROP TABLE "count_tables";
+
+ALTER TABLE "count_tables_new" RENAME TO "count_tables";
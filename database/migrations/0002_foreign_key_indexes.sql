@@ -0,0 +1,7 @@
+-- Indexes on the foreign keys, for joins from an experiment down to its libraries, files
+-- and motif scores. Lookups by accession and the already-scored check of CountTable.score
+-- are served by the indexes of the UNIQUE constraints.
+
+CREATE INDEX IF NOT EXISTS "libraries_experiment_id" ON "libraries" ("experiment_id");
+CREATE INDEX IF NOT EXISTS "files_library_id" ON "files" ("library_id");
+CREATE INDEX IF NOT EXISTS "motif_count_table_id" ON "motif" ("count_table_id");
@@ -0,0 +1,28 @@
+-- Ledger of the submitted jobs, see source/utils/ledger.py. inputs is the JSON of what the
+-- job runs (script, params, tasks), so failed jobs can be resubmitted. retry_of is the job
+-- it resubmits. state is Slurm's, PENDING until the job is known to be finished.
+
+CREATE TABLE IF NOT EXISTS "jobs" (
+    "id" INTEGER,
+    "job_id" TEXT NOT NULL,
+    "executor" TEXT NOT NULL,
+    "job_name" TEXT NOT NULL,
+    "job_file" TEXT NOT NULL,
+    "inputs" TEXT NOT NULL,
+    "cores" INTEGER NOT NULL,
+    "memory" TEXT NOT NULL,
+    "time" INTEGER NOT NULL,
+    "attempt" INTEGER NOT NULL DEFAULT 1,
+    "retry_of" INTEGER,
+    "submitted_at" REAL NOT NULL,
+    "state" TEXT NOT NULL DEFAULT 'PENDING',
+    "exit_code" INTEGER,
+    "wall_time" REAL,
+    "max_rss" INTEGER,
+    FOREIGN KEY ("retry_of") REFERENCES "jobs" ("id"),
+    PRIMARY KEY ("id")
+);
+
+CREATE INDEX IF NOT EXISTS "jobs_job_id" ON "jobs" ("executor", "job_id");
+CREATE INDEX IF NOT EXISTS "jobs_state" ON "jobs" ("state");
+CREATE INDEX IF NOT EXISTS "jobs_retry_of" ON "jobs" ("retry_of");
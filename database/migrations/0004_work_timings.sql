@@ -0,0 +1,15 @@
+-- How long each work item (e.g. scoring a motif on the count tables of an experiment) took,
+-- with the size of its input, to estimate the cost of the next runs. See
+-- source/utils/packing.py.
+
+CREATE TABLE IF NOT EXISTS "work_timings" (
+    "id" INTEGER,
+    "kind" TEXT NOT NULL,
+    "item" TEXT NOT NULL,
+    "size" INTEGER NOT NULL,
+    "seconds" REAL NOT NULL,
+    "recorded_at" REAL NOT NULL,
+    PRIMARY KEY ("id")
+);
+
+CREATE INDEX IF NOT EXISTS "work_timings_kind_item" ON "work_timings" ("kind", "item");
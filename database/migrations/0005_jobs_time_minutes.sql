@@ -0,0 +1,3 @@
+-- The wall time of the jobs is in minutes, it was in hours (the jobs asked for time:59:00).
+
+UPDATE "jobs" SET "time" = 60 * "time" + 59;
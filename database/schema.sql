@@ -1,3 +1,5 @@
+-- Baseline schema (version 0). Changes go in database/migrations, see source/utils/database.py
+
 CREATE TABLE IF NOT EXISTS "experiments" (
     "id" INTEGER,
     "accession" TEXT UNIQUE NOT NULL,
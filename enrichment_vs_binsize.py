@@ -3,7 +3,7 @@ from argparse import ArgumentParser
 from pathlib import Path
 
 import matplotlib.pyplot as plt
-import pandas as pd
+from diskfiles.countTables import CountTable
 
 if __name__ == "__main__":
 
@@ -12,6 +12,15 @@ if __name__ == "__main__":
     # Required positional arguments
     parser.add_argument("CountTablePath", help="Absolute Path to the Count Table")
     parser.add_argument("Motif_ID", help="Motif_ID")
+    parser.add_argument(
+        "--pseudocount", type=float, default=1, help="Added to the R0 and R1 counts"
+    )
+    parser.add_argument(
+        "--log_samples",
+        type=int,
+        default=None,
+        help="Number of log spaced bin sizes to plot (default: every bin size)",
+    )
 
     args = parser.parse_args()
 
@@ -21,45 +30,23 @@ if __name__ == "__main__":
     if not CountTablePath.exists():
         raise FileNotFoundError("The counttable does not exist")
 
-    ScorePath = CountTablePath.parent / Path(
-        f"{CountTablePath.name[:11]}_{Motif_ID}.txt"
-    )
+    count_table = CountTable(CountTablePath)
 
-    if not ScorePath.exists():
+    if not count_table.get_score_path(Motif_ID).exists():
         raise FileNotFoundError(
             f"You need to score the count table with the motif first!"
         )
 
-    # Reading data as pandas dataframe
-    pandas_r0_r1 = pd.read_csv(
-        CountTablePath, sep="\t", header=None, index_col=None, usecols=[1, 2]
-    )
-    score_pd = pd.read_csv(ScorePath, sep="\t", header=None, index_col=None)
-
-    merged_df = pd.concat([pandas_r0_r1, score_pd], axis=1)
-    merged_df.columns = ["R0", "R1", "Score"]
-    merged_df.sort_values(by="Score", ascending=False, inplace=True)
-
-    merged_df = merged_df.apply(pd.to_numeric)
-    merged_df.reset_index(drop=True, inplace=True)
-
     # Enrirchment vs Bin Size plots
-    num_rows = merged_df.shape[0]
-    bin_sizes = range(500, num_rows)
-    enrichment = []
-
-    numerator = merged_df.loc[: 500 - 1, "R1"].sum() + 1
-    denominator = merged_df.loc[: 500 - 1, "R0"].sum() + 1
-
-    enrichment.append(numerator / denominator)
-
-    for index, row in merged_df.loc[501:].iterrows():
-        numerator += row["R1"]
-        denominator += row["R0"]
-        enrichment.append(numerator / denominator)
+    curve = count_table.get_enrichment_vs_bin_size(
+        Motif_ID,
+        min_bin_size=500,
+        pseudocount=args.pseudocount,
+        n_samples=args.log_samples,
+    )
 
     # Creating the scatter plot
-    plt.scatter([math.log(bin, 10) for bin in bin_sizes], enrichment)
+    plt.scatter([math.log(bin, 10) for bin in curve["bin_size"]], curve["enrichment"])
 
     # Adding titles and labels
     plt.title(f"Enrichment vs Bin-Size for {CountTablePath.name[:11]} using {Motif_ID}")
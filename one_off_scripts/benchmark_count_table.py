@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmarks CountTable.create_from_fasta against ProBound's pb make-table on the same two
+fasta files (or simulated ones), and checks that both give the same processed table.
+"""
+
+import random
+import resource
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.append(str(Path(__file__).parent.parent / Path("source")))
+from diskfiles.countTables import CountTable
+
+
+def simulate_fasta(path: Path, n_reads: int, read_length: int, n_distinct: int):
+    "Writes n_reads reads drawn from n_distinct random probes, with a few N reads"
+    probes = [
+        "".join(random.choice("ACGT") for _ in range(read_length))
+        for _ in range(n_distinct)
+    ]
+    with open(path, "w") as f:
+        for i in range(n_reads):
+            seq = random.choice(probes)
+            if i % 1000 == 0:
+                seq = "N" + seq[1:]
+            f.write(f">{i}\n{seq}\n")
+
+
+def as_dict(count_table: CountTable) -> dict:
+    "{seq: (r0, r1)} of a count table"
+    df = count_table.get_pandas_df()
+    return {seq: (r0, r1) for seq, r0, r1 in df.itertuples(index=False)}
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument("--fasta1", help="R0 fasta (simulated if not given)")
+    parser.add_argument("--fasta2", help="R1 fasta (simulated if not given)")
+    parser.add_argument("--n_reads", type=int, default=1000000)
+    parser.add_argument("--read_length", type=int, default=36)
+    parser.add_argument("--n_distinct", type=int, default=200000)
+    parser.add_argument("--pb", default="/burg/home/hg2604/ProBound/pb")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+
+        if args.fasta1 and args.fasta2:
+            fasta1, fasta2 = Path(args.fasta1), Path(args.fasta2)
+        else:
+            random.seed(0)
+            fasta1, fasta2 = tmp_dir / Path("r0.fasta"), tmp_dir / Path("r1.fasta")
+            for fasta in (fasta1, fasta2):
+                simulate_fasta(fasta, args.n_reads, args.read_length, args.n_distinct)
+
+        start = time.perf_counter()
+        native = CountTable.create_from_fasta(
+            fasta1, fasta2, tmp_dir / Path("native.tsv")
+        )
+        native_time = time.perf_counter() - start
+        # ru_maxrss is in KB on linux
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"create_from_fasta: {native_time:.2f}s, peak memory {peak_mb:.0f}MB")
+
+        if not Path(args.pb).exists():
+            print(f"{args.pb} not found, skipping pb make-table")
+            sys.exit(0)
+
+        start = time.perf_counter()
+        pb_path = tmp_dir / Path("pb.tsv")
+        with open(pb_path, "w") as output_file:
+            subprocess.run(
+                [args.pb, "make-table", str(fasta1), str(fasta2)], stdout=output_file
+            )
+        pb_table = CountTable(pb_path)
+        pb_table.processTable(collapse_duplicates=True)
+        pb_time = time.perf_counter() - start
+        print(f"pb make-table + processTable: {pb_time:.2f}s")
+
+        same = as_dict(native) == as_dict(pb_table)
+        print(f"Same table: {same}")
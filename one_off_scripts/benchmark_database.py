@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the lookups of CountTable.score and update_database on a simulated
+Selex_X_Genome.db, before and after the migrations, as the motif table grows.
+"""
+
+import random
+import sqlite3
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.append(str(Path(__file__).parent.parent / Path("source")))
+from utils import database
+
+# The lookups as they were before the migrations, and as they are now
+COUNT_TABLE_ID_OLD = """
+    SELECT "id" FROM "count_tables" WHERE "r1_file" IN (SELECT "id" FROM "files" WHERE "accession" = ?)
+"""
+COUNT_TABLE_ID = """
+    SELECT count_tables.id FROM count_tables
+    JOIN files ON files.id = count_tables.r1_file
+    WHERE files.accession = ?
+"""
+MOTIF_COUNT = """
+    SELECT COUNT(*) FROM motif
+    WHERE tf = ? AND search_tf = ? AND organism = ? AND count_table_id = ?
+"""
+
+
+def fill(conn: sqlite3.Connection, n_files: int):
+    "One experiment and library, n_files files with a count table each"
+    conn.execute(
+        "INSERT INTO experiments (accession, control) VALUES ('ENCSR000AAA', 'n')"
+    )
+    conn.execute(
+        "INSERT INTO libraries (accession, experiment_id) VALUES ('ENCLB000AAA', 1)"
+    )
+    conn.executemany(
+        "INSERT INTO files (accession, experiment_id, library_id) VALUES (?, 1, 1)",
+        ((f"ENCFF{i:06}",) for i in range(n_files)),
+    )
+    conn.executemany(
+        "INSERT INTO count_tables (r1_file, probe_count, r0_count, r1_count) "
+        "VALUES (?, 0, 0, 0)",
+        ((i + 1,) for i in range(n_files)),
+    )
+    conn.commit()
+
+
+def add_motifs(conn: sqlite3.Connection, start: int, stop: int, n_files: int):
+    "Motif rows start to stop, spread over the count tables"
+    conn.executemany(
+        "INSERT INTO motif (type, tf, search_tf, organism, count_table_id, score) "
+        "VALUES ('Mononucleotide', ?, 'CTCF', 'Homo+sapiens', ?, 0)",
+        ((f"TF{i // n_files}", i % n_files + 1) for i in range(start, stop)),
+    )
+    conn.commit()
+
+
+def time_query(
+    conn: sqlite3.Connection, query: str, params: list, repeats: int
+) -> float:
+    "Mean latency of the query in microseconds"
+    start = time.perf_counter()
+    for i in range(repeats):
+        conn.execute(query, params[i % len(params)]).fetchall()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument("--n_files", type=int, default=20000)
+    parser.add_argument(
+        "--motif_rows", type=int, nargs="+", default=[10000, 100000, 1000000, 3000000]
+    )
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    accessions = [(f"ENCFF{random.randrange(args.n_files):06}",) for _ in range(100)]
+    motif_keys = [
+        (
+            f"TF{random.randrange(10)}",
+            "CTCF",
+            "Homo+sapiens",
+            random.randrange(args.n_files),
+        )
+        for _ in range(100)
+    ]
+
+    with TemporaryDirectory() as tmp_dir:
+        baseline = sqlite3.connect(Path(tmp_dir) / Path("baseline.db"))
+        baseline.executescript(database.SCHEMA_PATH.read_text())
+        fill(baseline, args.n_files)
+
+        migrated = sqlite3.connect(
+            Path(tmp_dir) / Path("migrated.db"), isolation_level=None
+        )
+        database.migrate(migrated)
+        # Back to implicit transactions, committed by fill and add_motifs
+        migrated.isolation_level = ""
+        fill(migrated, args.n_files)
+
+        print(
+            "motif rows\tcount table id (before / after)\tmotif count (before / after)"
+        )
+        n_motifs = 0
+        for motif_rows in args.motif_rows:
+            for conn in (baseline, migrated):
+                add_motifs(conn, n_motifs, motif_rows, args.n_files)
+            n_motifs = motif_rows
+
+            id_before = time_query(
+                baseline, COUNT_TABLE_ID_OLD, accessions, args.repeats
+            )
+            id_after = time_query(migrated, COUNT_TABLE_ID, accessions, args.repeats)
+            count_before = time_query(baseline, MOTIF_COUNT, motif_keys, args.repeats)
+            count_after = time_query(migrated, MOTIF_COUNT, motif_keys, args.repeats)
+            print(
+                f"{motif_rows}\t{id_before:.1f}us / {id_after:.1f}us"
+                f"\t{count_before:.1f}us / {count_after:.1f}us"
+            )
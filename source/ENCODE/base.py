@@ -1,6 +1,8 @@
+from __future__ import annotations
+
 from enum import Enum
 
-import requests
+from ENCODE.client import ENCODE_URL, EncodeRequestError, get_client
 
 
 class FetchExperimentDataFailure(Exception):
@@ -15,6 +17,13 @@ class RunType(Enum):
     PE = "paired-ended"
 
 
+def accession_from_link(link: str | dict) -> str:
+    "Accession of an embedded (dict) or linked (/experiments/ENCSR068HEE/) object"
+    if isinstance(link, dict):
+        return link["accession"]
+    return link.strip("/").split("/")[-1]
+
+
 class ENCODE_Object:
     """Base class for different ENCODE objects (ENCFF, ENCSR, ENCLB, etc.)"""
 
@@ -23,7 +32,7 @@ class ENCODE_Object:
 
     def get_url(self) -> str:
         """Returns the url for the ENCODE object"""
-        return f"https://www.encodeproject.org/{self.accession}"
+        return f"{ENCODE_URL}/{self.accession}"
 
 
 class Experiment(ENCODE_Object):
@@ -38,15 +47,9 @@ class Experiment(ENCODE_Object):
         if self.expr_data is not None:
             return self.expr_data
         else:
-            # Get the URL
-            url = self.get_url()
-            # Force return from the server in JSON format
-            headers = {"accept": "application/json"}
-            # Query the DB
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
+            # Query the DB (or the local cache of it)
+            try:
+                self.expr_data = get_client().get_json(self.get_url())
+            except EncodeRequestError:
                 raise FetchExperimentDataFailure
-            else:
-                # Extract the JSON response as a python dictionary
-                self.expr_data = response.json()
-                return self.expr_data
+            return self.expr_data
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ENCODE_URL = "https://www.encodeproject.org"
+
+# JSON responses are cached here, one file per url. Override with ENCODE_CACHE_DIR.
+DEFAULT_CACHE_DIR = Path.home() / Path(".cache/Selex-X-Genome/ENCODE")
+# Cached responses younger than this (seconds) are used without asking the server
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+
+class EncodeRequestError(Exception):
+    "Error to be raised when the ENCODE server doesn't return a 200 (or 304) response"
+
+    def __init__(self, url: str, status_code: int):
+        super().__init__(f"{url} returned {status_code}")
+        self.url = url
+        self.status_code = status_code
+
+
+class DownloadVerificationError(Exception):
+    "Error to be raised when a downloaded file doesn't match its size or md5sum"
+
+    pass
+
+
+class RangesUnsupported(Exception):
+    "Error to be raised when the server answers a bounded Range request with the whole file"
+
+    pass
+
+
+class EncodeClient:
+    """
+    HTTP client for the ENCODE portal. One pooled keep-alive session with retries and
+    backoff, and an on-disk cache of the JSON responses keyed by the sha256 of the url.
+    Cached responses older than the ttl are revalidated with their ETag.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = None,
+        ttl: float = DEFAULT_TTL,
+        retries: int = 5,
+        backoff_factor: float = 0.5,
+        pool_size: int = 16,
+        timeout: float = 60,
+    ):
+        if cache_dir is None:
+            cache_dir = Path(os.environ.get("ENCODE_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_cache_path(self, url: str) -> Path:
+        "Path of the cached response for the url"
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / Path(key[:2]) / Path(f"{key}.json")
+
+    def _read_cache(self, url: str) -> dict:
+        try:
+            with open(self.get_cache_path(url)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, url: str, entry: dict) -> None:
+        # Written to a temporary file first so readers never see half an entry
+        cache_path = self.get_cache_path(url)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.parent / Path(f".{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        tmp_path.replace(cache_path)
+
+    def get_cached(self, url: str, ttl: float = None) -> dict:
+        "The cached JSON response for the url if it is younger than ttl, else None"
+        ttl = self.ttl if ttl is None else ttl
+        cached = self._read_cache(url)
+        if cached is not None and time.time() - cached["fetched_at"] < ttl:
+            return cached["data"]
+        return None
+
+    def get_json(self, url: str, ttl: float = None) -> dict:
+        """
+        Returns the JSON response for the url, from the cache when it is younger than ttl.
+        Raises EncodeRequestError for any other response than 200 (or 304 for a cached url).
+        If the server can't be reached, a stale cached response is returned instead.
+        """
+        fresh = self.get_cached(url, ttl)
+        if fresh is not None:
+            return fresh
+
+        cached = self._read_cache(url)
+
+        headers = {"accept": "application/json"}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            if cached is not None:
+                return cached["data"]
+            raise
+
+        if response.status_code == 304 and cached is not None:
+            cached["fetched_at"] = time.time()
+            self._write_cache(url, cached)
+            return cached["data"]
+        if response.status_code != 200:
+            raise EncodeRequestError(url, response.status_code)
+
+        data = response.json()
+        self._write_cache(
+            url,
+            {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "fetched_at": time.time(),
+                "data": data,
+            },
+        )
+        return data
+
+    def stream(self, url: str, headers: dict = None) -> requests.Response:
+        "Streaming (uncached) GET, for file downloads"
+        return self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+
+    def download(
+        self,
+        url: str,
+        file_path: Path,
+        md5sum: str = None,
+        file_size: int = None,
+        n_parts: int = 1,
+        max_attempts: int = 5,
+        chunk_size: int = 1024 * 1024,
+    ) -> Path:
+        """
+        Downloads url to file_path. The data goes to file_path.part first, and an interrupted
+        download resumes from where it stopped with a Range request, on the next attempt or
+        the next call. The size and md5sum are checked, when given, before file_path.part is
+        renamed to file_path, so file_path only ever exists complete.
+
+        With n_parts > 1 (and a known file_size), the file is fetched as n_parts byte ranges
+        in parallel, each to its own resumable .partN file, and joined at the end. If the
+        server doesn't support ranges, the .partN files are deleted and the file is fetched
+        as one stream.
+        """
+        part_path = file_path.parent / Path(f"{file_path.name}.part")
+        md5 = hashlib.md5()
+
+        if n_parts > 1 and file_size is not None and file_size >= n_parts:
+            bounds = [file_size * i // n_parts for i in range(n_parts + 1)]
+            range_paths = [
+                file_path.parent / Path(f"{file_path.name}.part{i}")
+                for i in range(n_parts)
+            ]
+            try:
+                with ThreadPoolExecutor(n_parts) as executor:
+                    list(
+                        executor.map(
+                            lambda i: self._download_range(
+                                url,
+                                range_paths[i],
+                                bounds[i],
+                                bounds[i + 1] - 1,
+                                max_attempts,
+                                chunk_size,
+                            ),
+                            range(n_parts),
+                        )
+                    )
+            except RangesUnsupported:
+                for range_path in range_paths:
+                    range_path.unlink(missing_ok=True)
+                return self.download(
+                    url, file_path, md5sum, file_size, 1, max_attempts, chunk_size
+                )
+            # Joining the ranges, hashing on the way
+            with open(part_path, "wb") as part_file:
+                for range_path in range_paths:
+                    with open(range_path, "rb") as range_file:
+                        while chunk := range_file.read(chunk_size):
+                            part_file.write(chunk)
+                            md5.update(chunk)
+            for range_path in range_paths:
+                range_path.unlink()
+        else:
+            md5 = self._download_range(
+                url, part_path, 0, None, max_attempts, chunk_size, hash_md5=True
+            )
+
+        size = part_path.stat().st_size
+        if (file_size is not None and size != file_size) or (
+            md5sum is not None and md5.hexdigest() != md5sum
+        ):
+            part_path.unlink()
+            raise DownloadVerificationError(
+                f"{url}: got {size} bytes with md5sum {md5.hexdigest()}, "
+                f"expected {file_size} bytes with md5sum {md5sum}"
+            )
+
+        part_path.replace(file_path)
+        return file_path
+
+    def _download_range(
+        self,
+        url: str,
+        part_path: Path,
+        start: int,
+        end: int,
+        max_attempts: int,
+        chunk_size: int,
+        hash_md5: bool = False,
+    ):
+        """
+        Downloads bytes start to end (inclusive, None for the end of the file) of url to
+        part_path, continuing after whatever part_path already holds. With hash_md5, returns
+        the md5 hash of part_path, computed as the bytes are written. Raises
+        RangesUnsupported if the server answers a bounded range with the whole file.
+        """
+        md5 = hashlib.md5() if hash_md5 else None
+        done = part_path.stat().st_size if part_path.exists() else 0
+        if md5 is not None and done:
+            with open(part_path, "rb") as part_file:
+                while chunk := part_file.read(chunk_size):
+                    md5.update(chunk)
+
+        for attempt in range(max_attempts):
+            if end is not None and start + done > end:
+                return md5
+            headers = None
+            if start + done > 0 or end is not None:
+                end_byte = "" if end is None else end
+                headers = {"Range": f"bytes={start + done}-{end_byte}"}
+            try:
+                with self.stream(url, headers) as response:
+                    # Nothing left to download
+                    if response.status_code == 416 and end is None and done:
+                        return md5
+                    if response.status_code == 200 and end is not None:
+                        raise RangesUnsupported(f"{url} ignored the Range header")
+                    if response.status_code == 200 and headers is not None:
+                        # Range not supported, start over
+                        if start > 0:
+                            raise EncodeRequestError(url, response.status_code)
+                        done = 0
+                        md5 = hashlib.md5() if hash_md5 else None
+                    elif response.status_code not in (200, 206):
+                        raise EncodeRequestError(url, response.status_code)
+
+                    with open(part_path, "ab" if done else "wb") as part_file:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            part_file.write(chunk)
+                            done += len(chunk)
+                            if md5 is not None:
+                                md5.update(chunk)
+                return md5
+            except requests.RequestException:
+                if attempt == max_attempts - 1:
+                    raise
+                time.sleep(min(2**attempt, 60))
+
+
+_client = None
+_client_pid = None
+
+
+def get_client() -> EncodeClient:
+    "The EncodeClient shared by the process (a forked worker gets its own)"
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = EncodeClient()
+        _client_pid = os.getpid()
+    return _client
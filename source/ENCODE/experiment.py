@@ -1,7 +1,11 @@
-import sqlite3
-
-from ENCODE.base import Experiment, FetchExperimentDataFailure, RunType
+from ENCODE.base import (
+    Experiment,
+    FetchExperimentDataFailure,
+    RunType,
+    accession_from_link,
+)
 from ENCODE.library import Library
+from utils import database
 
 
 class RunTypeError(Exception):
@@ -26,10 +30,14 @@ class NoControl(Exception):
 class TFChipSeq(Experiment):
     """Class for TF ChipSeq experiment object"""
 
-    def __init__(self, accession: str, expr_data: dict = None):
+    def __init__(
+        self, accession: str, expr_data: dict = None, controls_data: dict = None
+    ):
         super().__init__(accession, expr_data)
         self.fetchData()
         self.control = False
+        # Already fetched control data ({accession: expr_data}), if any
+        self.controls_data = controls_data or {}
         if self.expr_data is None:
             raise FetchExperimentDataFailure
 
@@ -40,9 +48,8 @@ class TFChipSeq(Experiment):
         elif len(self.expr_data["possible_controls"]) > 1:
             raise MoreThanOneControl
         else:
-            return Control(
-                self.expr_data["possible_controls"][0]["accession"], self.accession
-            )
+            accession = accession_from_link(self.expr_data["possible_controls"][0])
+            return Control(accession, self.accession, self.controls_data.get(accession))
 
     @staticmethod
     def get_run_type(expr_data: dict) -> RunType:
@@ -111,41 +118,20 @@ class TFChipSeq(Experiment):
 
     def update_database(self):
         "Adds information to the Selex_X_Genome.db database"
-        # Connect to the database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            meta_data = self.get_other_meta_data()
-
-            try:
-                experiment = [
-                    (
-                        self.accession,
-                        "n",
-                        meta_data.get("life_stage_age"),
-                        meta_data.get("perturbed"),
-                        meta_data.get("lab"),
-                        meta_data.get("biosample_class"),
-                        ",".join(meta_data.get("developmental_slims", [])),
-                        ",".join(meta_data.get("system_slims", [])),
-                        ",".join(meta_data.get("organ_slims", [])),
-                        ",".join(meta_data.get("cell_slims", [])),
-                    )
-                ]
-                cursor.executemany(
-                    """
-                INSERT INTO "experiments" ("accession", "control", "life_stage_age", "perturbed", "lab", "biosample_class", "developmental_slims", "system_slims", "organ_slims", "cell_slims") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    experiment,
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print("Error:", e)
-
+        meta_data = self.get_other_meta_data()
+        database.insert(
+            "experiments",
+            accession=self.accession,
+            control="n",
+            life_stage_age=meta_data.get("life_stage_age"),
+            perturbed=meta_data.get("perturbed"),
+            lab=meta_data.get("lab"),
+            biosample_class=meta_data.get("biosample_class"),
+            developmental_slims=",".join(meta_data.get("developmental_slims", [])),
+            system_slims=",".join(meta_data.get("system_slims", [])),
+            organ_slims=",".join(meta_data.get("organ_slims", [])),
+            cell_slims=",".join(meta_data.get("cell_slims", [])),
+        )
 
 class Control(Experiment):
     def __init__(self, accession: str, experiment: str, expr_data: dict = None):
@@ -204,20 +190,4 @@ class Control(Experiment):
 
     def update_database(self):
         "Adds information to the Selex_X_Genome.db database"
-        # Connect to the database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            try:
-                experiment = [(self.accession, "y")]
-                cursor.executemany(
-                    """
-                INSERT INTO "experiments" ("accession", "control") VALUES (?, ?)
-                """,
-                    experiment,
-                )
-                conn.commit()
-            except:
-                pass
+        database.insert("experiments", accession=self.accession, control="y")
@@ -0,0 +1,143 @@
+"""
+Concurrent resolution of ENCODE metadata. Every experiment of a TF, its control and the
+libraries and files of both are fetched with asyncio, under a global concurrency limit and a
+per host rate limit. The requests themselves go through the (cached) EncodeClient.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from urllib.parse import urlparse
+
+from ENCODE.base import accession_from_link
+from ENCODE.client import ENCODE_URL, EncodeClient, get_client
+from ENCODE.experiment import Control, MoreThanOneControl, TFChipSeq
+from ENCODE.files import PE_File, SE_File
+from ENCODE.search import EncodeSearch
+
+
+class RateLimiter:
+    """Spaces the requests to every host at least 1 / requests_per_second seconds apart."""
+
+    def __init__(self, requests_per_second: float = 10):
+        self.interval = 1 / requests_per_second
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, host: str) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+class ResolvedExperiment:
+    """A TF ChIP-seq experiment with its control, and the libraries and files of both."""
+
+    def __init__(self, experiment: TFChipSeq, control: Control = None):
+        self.experiment = experiment
+        self.control = control
+        self.libraries = experiment.get_libraries()
+        self.control_libraries = [] if control is None else control.get_libraries()
+
+    def get_files(self) -> dict[str, list[SE_File] | list[PE_File]]:
+        "All the fastq files of every (experiment and control) library, by library accession"
+        return {
+            library.accession: library.get_Files(all=True)
+            for library in self.libraries + self.control_libraries
+        }
+
+
+class EncodeFetcher:
+    """
+    Fetches ENCODE objects concurrently. At most max_concurrency requests are in flight
+    and each host gets at most requests_per_second. Fresh cached responses skip both.
+    Errors don't stop the other fetches, they are collected in errors by accession.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_second: float = 10,
+        client: EncodeClient = None,
+        base_url: str = ENCODE_URL,
+    ):
+        self.client = get_client() if client is None else client
+        self.base_url = base_url
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.errors = {}
+        # Controls are shared between experiments, so each one is only fetched once
+        self._controls = {}
+
+    async def get_json(self, url: str) -> dict:
+        cached = self.client.get_cached(url)
+        if cached is not None:
+            return cached
+        async with self.semaphore:
+            await self.rate_limiter.wait(urlparse(url).netloc)
+            return await asyncio.to_thread(self.client.get_json, url)
+
+    async def fetch_experiment(self, accession: str) -> TFChipSeq:
+        return TFChipSeq(accession, await self.get_json(f"{self.base_url}/{accession}"))
+
+    async def fetch_control(self, accession: str) -> dict:
+        if accession not in self._controls:
+            self._controls[accession] = asyncio.ensure_future(
+                self.get_json(f"{self.base_url}/{accession}")
+            )
+        return await self._controls[accession]
+
+    async def resolve_experiment(self, accession: str) -> ResolvedExperiment:
+        "The experiment, its control (if it has exactly one) and their libraries and files"
+        experiment = await self.fetch_experiment(accession)
+        possible_controls = experiment.expr_data["possible_controls"]
+        if len(possible_controls) > 1:
+            raise MoreThanOneControl
+        elif len(possible_controls) == 0:
+            return ResolvedExperiment(experiment)
+
+        control_accession = accession_from_link(possible_controls[0])
+        control_data = await self.fetch_control(control_accession)
+        control = Control(control_accession, accession, control_data)
+        return ResolvedExperiment(experiment, control)
+
+    async def resolve_experiments(
+        self, accessions: list[str]
+    ) -> list[ResolvedExperiment]:
+        "Resolves all the experiments concurrently. Failed ones are left out, see errors."
+        results = await asyncio.gather(
+            *(self.resolve_experiment(accession) for accession in accessions),
+            return_exceptions=True,
+        )
+        resolved = []
+        for accession, result in zip(accessions, results):
+            if isinstance(result, Exception):
+                self.errors[accession] = result
+            else:
+                resolved.append(result)
+        return resolved
+
+
+def resolve_tf(
+    tf: str,
+    organism: str,
+    max_concurrency: int = 8,
+    requests_per_second: float = 10,
+) -> tuple[list[ResolvedExperiment], dict[str, Exception]]:
+    """
+    Resolves every TF ChIP-seq experiment of the TF and organism (Homo+sapiens).
+    Returns the resolved experiments and the errors by experiment accession.
+    """
+    search = EncodeSearch(tf, organism, limit="all")
+    if search.search_result is None:
+        return [], {}
+    accessions = [hit["accession"] for hit in search.search_result]
+
+    async def resolve():
+        fetcher = EncodeFetcher(max_concurrency, requests_per_second)
+        return await fetcher.resolve_experiments(accessions), fetcher.errors
+
+    return asyncio.run(resolve())
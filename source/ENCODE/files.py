@@ -1,11 +1,21 @@
 from __future__ import annotations
 
-import sqlite3
+import gzip
 from pathlib import Path
 
 import requests
-from diskfiles.fastq import PE_Fastq, SE_Fastq
+import urllib3
+from diskfiles import manifest
+from diskfiles.fastq import PE_Fastq, SE_Fastq, write_sampled_reads
 from ENCODE.base import ENCODE_Object, RunType
+from ENCODE.client import (
+    ENCODE_URL,
+    DownloadVerificationError,
+    EncodeRequestError,
+    get_client,
+)
+from utils import database
+from utils.sampling import sample_indices
 
 
 class NoFileAvailable(Exception):
@@ -40,6 +50,8 @@ class SE_File(ENCODE_Object):
         run_type: RunType,  # This has two optional parameters pe or se
         paired_end=None,  # Will be none for SE (Assert this)
         paired_with: str = None,  # WILL be none for SE (Assert this)
+        md5sum: str = None,
+        file_size: int = None,
     ):
         super().__init__(accession)
         self.read_count = read_count
@@ -58,6 +70,8 @@ class SE_File(ENCODE_Object):
         self.run_type = run_type
         self.paired_end = paired_end
         self.paired_with = paired_with
+        self.md5sum = md5sum
+        self.file_size = file_size
 
         # Assert
         if self.run_type == RunType.SE:
@@ -96,11 +110,16 @@ class SE_File(ENCODE_Object):
             run_type,
             file_dict.get("paired_end", None),
             file_dict.get("paired_with", None),
+            file_dict.get("md5sum"),
+            file_dict.get("file_size"),
         )
 
-    def download(self, download_dr: Path | str) -> SE_Fastq:
+    def download(self, download_dr: Path | str, n_parts: int = 1) -> SE_Fastq:
         """Download the file from ENCODE server to the specified directory. By default downloads zipped files,
-        which are saved as .fastq.gz files."""
+        which are saved as .fastq.gz files.
+        Interrupted downloads are resumed, and the file is only saved once its size and md5sum match
+        the ENCODE metadata. With n_parts > 1, the file is downloaded as n_parts parallel byte ranges.
+        """
 
         if self.no_file_available:
             raise NoFileAvailable(f"No file available for {self.accession}")
@@ -110,46 +129,103 @@ class SE_File(ENCODE_Object):
         filepath = Path(download_dr) / Path(filename)
         filepath.parent.mkdir(parents=True, exist_ok=True)
 
-        # Dont' download if already downloaded
+        # Dont' download if already downloaded (and complete)
         if filepath.exists() or Path(str(filepath) + ".gz").exists():
 
             if Path(str(filepath) + ".gz").exists():
                 filepath = Path(str(filepath) + ".gz")
 
-            return SE_Fastq(
+            if self.file_size is not None and filepath.stat().st_size != self.file_size:
+                # Truncated by an older download, download again
+                filepath.unlink()
+                return self.download(download_dr, n_parts)
+
+            return self.to_fastq(filepath)
+
+        # Download to a temporary file, verified and renamed to filepath once complete
+        try:
+            get_client().download(
+                ENCODE_URL + self.href,
                 filepath,
-                self.accession,
-                self.platform,
-                self.read_length,
-                self.experiment,
-                self.library,
-                self.biosample,
-                self.technical_replicate_number,
-                self.biological_replicate_number,
-                self.control,
-                self.antibody,
-                self.href,
-                self.run_type,
-                self.paired_end,
-                self.paired_with,
+                md5sum=self.md5sum,
+                file_size=self.file_size,
+                n_parts=n_parts,
             )
+        except (EncodeRequestError, DownloadVerificationError) as e:
+            raise FileDownloadError(f"File download error for {self.accession}: {e}")
 
-        # Sending request to ENCODE for download stream
-        response = requests.get(
-            "https://www.encodeproject.org" + self.href, stream=True
-        )
+        return self.to_fastq(filepath)
 
-        # Check status code of request
-        if response.status_code != 200:
-            raise FileDownloadError(f"File download error for {self.accession}.")
+    def download_subsampled(
+        self,
+        download_dr: Path | str,
+        size: int = 1000000,
+        seed: int = 42,
+        max_attempts: int = 3,
+    ) -> SE_Fastq:
+        """
+        Downloads only a subsample of the reads, as FileAcc_subsampled.fq.gz (the same file
+        as SE_Fastq.subsample). The reads to keep are drawn from read_count upfront, and the
+        download stream is decompressed and sampled on the fly, so the full fastq never
+        touches the disk. Without a read_count, the file is downloaded and then subsampled.
+        """
+        if self.no_file_available:
+            raise NoFileAvailable(f"No file available for {self.accession}")
+
+        filepath = Path(download_dr) / Path(f"{self.accession}_subsampled.fq.gz")
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        # Sampled before from the same file, the same way
+        params = {"md5sum": self.md5sum, "seed": seed, "size": size}
+        if manifest.is_current(filepath, params=params):
+            return self.to_fastq(filepath)
+        if self.read_count is None:
+            fastq = self.download(download_dr)
+            subsampled_fastq = fastq.subsample(seed=seed, size=size)
+            fastq.delete()
+            manifest.record(subsampled_fastq.file_path, params=params)
+            return subsampled_fastq
+
+        indices = sample_indices(self.read_count, size, seed)
+        for attempt in range(max_attempts):
+            try:
+                with get_client().stream(ENCODE_URL + self.href) as response:
+                    # Server errors are retried, like a dropped connection
+                    if response.status_code >= 500:
+                        raise requests.HTTPError(
+                            f"{self.href} returned {response.status_code}",
+                            response=response,
+                        )
+                    if response.status_code != 200:
+                        raise FileDownloadError(
+                            f"File download error for {self.accession}."
+                        )
+                    response.raw.decode_content = True
+                    with gzip.GzipFile(fileobj=response.raw) as reads:
+                        n_written = write_sampled_reads(reads, indices, filepath)
+                break
+            except (requests.RequestException, urllib3.exceptions.HTTPError, EOFError):
+                if attempt == max_attempts - 1:
+                    # No subsample left from an earlier run
+                    filepath.unlink(missing_ok=True)
+                    raise FileDownloadError(f"Download of {self.accession} failed.")
+            except Exception:
+                filepath.unlink(missing_ok=True)
+                raise
+
+        if n_written != len(indices):
+            # The stream ended before the last sampled read, read_count is off
+            filepath.unlink()
+            raise FileDownloadError(
+                f"{self.accession} has fewer reads than its read_count {self.read_count}"
+            )
 
-        # Download the file in chunks
-        with filepath.open(mode="wb") as file:
-            for chunk in response.iter_content(chunk_size=1024 * 1024):
-                file.write(chunk)
+        manifest.record(filepath, params=params)
+        return self.to_fastq(filepath)
 
+    def to_fastq(self, file_path: Path) -> SE_Fastq:
+        "SE_Fastq for a downloaded copy of the file"
         return SE_Fastq(
-            filepath,
+            file_path,
             self.accession,
             self.platform,
             self.read_length,
@@ -168,51 +244,26 @@ class SE_File(ENCODE_Object):
 
     def update_database(self):
         "Adds information to the Selex_X_Genome.db database"
-        # Connect to the database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
+        experiment_id = database.fetch_value(
+            "SELECT id FROM experiments WHERE accession = ?", (self.experiment,)
+        )
+        if experiment_id is None:
+            raise ValueError("Could not find experiment in Database")
 
-            # Get the experiment_id from the experiments table
-            try:
-                cursor.execute(
-                    """
-                    SELECT "id" FROM "experiments" WHERE "accession" = ?
-                    """,
-                    (self.experiment,),
-                )
-                experiment_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find experiment in Database")
-
-            # Get the library_id from the experiments table
-            try:
-                cursor.execute(
-                    """
-                    SELECT "id" FROM "libraries" WHERE "accession" = ?
-                    """,
-                    (self.library,),
-                )
-                library_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find library in Database")
-
-            # Value to be added to DB
-            file = [(self.accession, self.read_length, experiment_id, library_id, "n")]
-            # Update DB
-            try:
-                cursor.executemany(
-                    """
-                INSERT INTO "files" ("accession", "read_length", "experiment_id", "library_id", "paired_end") VALUES (?, ?, ?, ?, ?)
-                """,
-                    file,
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print("Error:", e)
+        library_id = database.fetch_value(
+            "SELECT id FROM libraries WHERE accession = ?", (self.library,)
+        )
+        if library_id is None:
+            raise ValueError("Could not find library in Database")
+
+        database.insert(
+            "files",
+            accession=self.accession,
+            read_length=self.read_length,
+            experiment_id=experiment_id,
+            library_id=library_id,
+            paired_end="n",
+        )
 
 
 class PE_File(ENCODE_Object):
@@ -223,14 +274,29 @@ class PE_File(ENCODE_Object):
         self.r2 = r2
 
     # R1 and R2 are commutative
-    def download(self, download_dr: Path) -> PE_Fastq:
+    def download(self, download_dr: Path, n_parts: int = 1) -> PE_Fastq:
         """Download the pe files from ENCODE server to the specified directory."""
         if self.r1.no_file_available or self.r2.no_file_available:
             raise NoFileAvailable(
                 f"No file available for {self.r1.accession} and {self.r2.accession}"
             )
 
-        r1_fastq = self.r1.download(download_dr)
-        r2_fastq = self.r2.download(download_dr)
+        r1_fastq = self.r1.download(download_dr, n_parts)
+        r2_fastq = self.r2.download(download_dr, n_parts)
 
         return PE_Fastq(r1_fastq, r2_fastq)
+
+    def download_subsampled(
+        self, download_dr: Path, size: int = 1000000, seed: int = 42
+    ) -> PE_Fastq:
+        """
+        Downloads only a subsample of the read pairs. Both mates have the same read_count,
+        so the same reads are drawn from both and the pairs stay in sync.
+        """
+        if self.r1.read_count != self.r2.read_count:
+            return self.download(download_dr).subsample(seed=seed, size=size)
+
+        return PE_Fastq(
+            self.r1.download_subsampled(download_dr, size, seed),
+            self.r2.download_subsampled(download_dr, size, seed),
+        )
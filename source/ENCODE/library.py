@@ -1,7 +1,6 @@
-import sqlite3
-
 from ENCODE.base import ENCODE_Object, RunType
 from ENCODE.files import PE_File, SE_File
+from utils import database
 
 
 class Library(ENCODE_Object):
@@ -116,43 +115,18 @@ class Library(ENCODE_Object):
 
     def update_database(self):
         "Adds information to the Selex_X_Genome.db database"
-        # Connect to the database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            # Get the experiment_id from the experiments table
-            try:
-                cursor.execute(
-                    """
-                    SELECT id FROM experiments WHERE accession = ?
-                    """,
-                    (self.experiment,),
-                )
-                experiment_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find experiment in Database")
+        experiment_id = database.fetch_value(
+            "SELECT id FROM experiments WHERE accession = ?", (self.experiment,)
+        )
+        if experiment_id is None:
+            raise ValueError("Could not find experiment in Database")
 
-            library = [
-                (
-                    self.accession,
-                    self.antibody,
-                    self.biosample,
-                    self.technical_replicate_number,
-                    self.biological_replicate_number,
-                    experiment_id,
-                )
-            ]
-            try:
-                cursor.executemany(
-                    """
-                INSERT INTO "libraries" ("accession", "antibody", "biosample", "technical_rep_number", "biological_rep_number", "experiment_id") VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                    library,
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print("Error:", e)
+        database.insert(
+            "libraries",
+            accession=self.accession,
+            antibody=self.antibody,
+            biosample=self.biosample,
+            technical_rep_number=self.technical_replicate_number,
+            biological_rep_number=self.biological_replicate_number,
+            experiment_id=experiment_id,
+        )
@@ -1,4 +1,5 @@
-import requests
+from ENCODE.base import accession_from_link
+from ENCODE.client import ENCODE_URL, EncodeRequestError, get_client
 from ENCODE.experiment import TFChipSeq
 
 
@@ -21,33 +22,33 @@ class EncodeSearch:
         tf: str,
         organism: str,
         limit: str = "all",
+        embedded: bool = False,
     ):
         self.tf = tf
         self.organism = organism
         self.limit = limit
+        # Whether the hits are full (embedded frame) experiments
+        self.embedded = embedded
         try:
             self.search_result = self.search()
         except EncodeSearchError:
             self.search_result = None
 
     def search(self) -> dict:
-        # Force return from the server in JSON format
-        headers = {"accept": "application/json"}
-
         # This searches the ENCODE database for the phrase "bone chip"
         url = (
-            f"https://www.encodeproject.org/search/?type=Experiment&assay_title=TF+ChIP-seq"
+            f"{ENCODE_URL}/search/?type=Experiment&assay_title=TF+ChIP-seq"
             f"&target.label={self.tf}&replicates.library.biosample.donor.organism.scientific_name={self.organism}&status=released&files.run_type=single-ended&limit={self.limit}"
         )
+        if self.embedded:
+            url += "&frame=embedded"
 
-        # GET the search result
-        response = requests.get(url, headers=headers)
-
-        if response.status_code != 200:
+        # GET the search result (or the local cache of it)
+        try:
+            self.search_result = get_client().get_json(url)
+        except EncodeRequestError:
             raise EncodeSearchError(f"Search error for {self.tf} and {self.organism}")
 
-        # Extract the JSON response as a python dictionary
-        self.search_result = response.json()
         self.search_result = self.search_result.get("@graph")
 
         if self.search_result is None:
@@ -55,21 +56,61 @@ class EncodeSearch:
 
         return self.search_result
 
-    def get_experiments(self):
-        """Returns List of TF ChipSeq Experiments"""
+    def get_experiments(self, bulk: bool = True) -> list[TFChipSeq]:
+        """
+        Returns List of TF ChipSeq Experiments. With bulk, the experiments and their controls
+        are built from the embedded search and one batched search of the controls, instead of
+        a request per experiment and per control.
+        """
         if self.search_result is None:
             raise EncodeSearchError
-        else:
-            experiments = list(
-                [
-                    self.search_result[i]["accession"]
-                    for i in range(len(self.search_result))
-                ]
+        elif not bulk:
+            return [TFChipSeq(hit["accession"]) for hit in self.search_result]
+
+        if not self.embedded:
+            self.embedded = True
+            self.search_result = self.search()
+
+        control_accessions = sorted(
+            {
+                accession_from_link(control)
+                for hit in self.search_result
+                for control in hit.get("possible_controls", [])
+            }
+        )
+        controls_data = EncodeSearch.fetch_experiments(control_accessions)
+        return [
+            TFChipSeq(hit["accession"], hit, controls_data)
+            for hit in self.search_result
+        ]
+
+    @staticmethod
+    def fetch_experiments(accessions: list[str], batch_size: int = 100) -> dict:
+        """
+        Embedded data of the experiments, fetched batch_size accessions per search request.
+        Returns {accession: expr_data}. Accessions the search doesn't return are left out.
+        """
+        experiments = {}
+        for start in range(0, len(accessions), batch_size):
+            url = (
+                f"{ENCODE_URL}/search/?type=Experiment&frame=embedded&limit=all&"
+                + "&".join(
+                    f"accession={accession}"
+                    for accession in accessions[start : start + batch_size]
+                )
             )
-            return [TFChipSeq(experiment) for experiment in experiments]
+            try:
+                hits = get_client().get_json(url).get("@graph", [])
+            except EncodeRequestError:
+                # ENCODE answers 404 when nothing matches
+                continue
+            experiments.update({hit["accession"]: hit for hit in hits})
+        return experiments
 
     @classmethod
-    def search_using_MOTIFCENTRAL_json(cls, motif: dict, limit: str = "all"):
+    def search_using_MOTIFCENTRAL_json(
+        cls, motif: dict, limit: str = "all", embedded: bool = False
+    ):
         """Create ENCODE search object from an element of MOTIFCENTRAL dict"""
         # Get the organism
         tax_id = motif["metadata"]["factors"][0].get("tax_id")
@@ -78,4 +119,4 @@ class EncodeSearch:
         tf = motif["metadata"]["factors"][0].get("gene_symbol")
         tf = tf.upper()
         # Get the search object.
-        return EncodeSearch(tf, organism, limit)
+        return EncodeSearch(tf, organism, limit, embedded)
@@ -1,6 +1,7 @@
 from ENCODE.search import EncodeSearch
 from motifs.motif import Mononucleotide
 from motifs.parse_motifcentral_json import MOTIFCENTRAL
+from utils import ledger
 
 motif = Mononucleotide.create_from_motif_central(MOTIFCENTRAL[465])
 
@@ -8,8 +9,12 @@ search_result = EncodeSearch.search_using_MOTIFCENTRAL_json(MOTIFCENTRAL[628])
 # search_result = EncodeSearch('MAX', 'Homo+sapiens')
 
 
-motif.motif_X_TF(
+job_id = motif.motif_X_TF(
     search_result, data_path="/burg/hblab/users/wl2924/Selex-X-Genome/data/"
 )
 
-# ! I need a way to ensure that each job ran successfully.
+# Waits for every experiment to be scored, failed ones are resubmitted
+result = ledger.wait([job_id])[job_id]
+for task in result.tasks:
+    if not task.succeeded:
+        print(f"Error: {task.job_id}: {task.state} (exit code {task.returncode})")
@@ -3,6 +3,41 @@ from pathlib import Path
 
 from utils.slurmjob import Slurmjob
 
+DATA_PATH = Path("/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data")
+SOURCE_PATH = Path("/burg/hblab/users/hg2604/Projects/Selex-X-Genome/source")
+
+
+def submit_scoring(
+    tf: str, organism: str, motifcentral_index: int, after: list[str] = ()
+) -> str:
+    """
+    Submits step 2 (tf_organism_2: count tables and scores), once the jobs after (the
+    transforms of step 1) all succeeded. Returns its id.
+    """
+    # Scoring the count tables
+    slurmjob_path_2 = DATA_PATH / Path(
+        f'{tf}_{organism.replace("+","_")}/{motifcentral_index}_score.job'
+    )
+    job_name_2 = "Score_count_tables"
+    job_script_2 = SOURCE_PATH / Path("analysis/tf_organism_2.py")
+    job_params_2 = (tf, organism, motifcentral_index)
+    job_cores_2 = 32
+    job_time_2 = 11
+
+    # Create slurm job file
+    job_file_2 = Slurmjob(
+        file_path=slurmjob_path_2,
+        job_name=job_name_2,
+        job_script=job_script_2,
+        job_params=job_params_2,
+        output=f"{motifcentral_index}_score",
+        cores=job_cores_2,
+        time=job_time_2,
+    )
+    job_file_2.create_file()
+    return job_file_2.submitJob(after=after)
+
+
 if __name__ == "__main__":
 
     # Parsing the arguments
@@ -12,15 +47,14 @@ if __name__ == "__main__":
     parser.add_argument("motifcentral_index", type=int)
     args = parser.parse_args()
 
-    # Downloading the files from ENCODE
-    slurmjob_path_1 = Path(
-        f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/download.job'
+    # Downloading the files from ENCODE. It submits the transforms as one job array, and
+    # step 2 after it, so it doesn't hold its allocation while they run.
+    slurmjob_path_1 = DATA_PATH / Path(
+        f'{args.TF}_{args.organism.replace("+","_")}/download.job'
     )
     job_name_1 = "Download_files_from_ENCODE"
-    job_script_1 = Path(
-        "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/source/analysis/tf_organism_1.py"
-    )
-    job_params_1 = (args.TF, args.organism)
+    job_script_1 = SOURCE_PATH / Path("analysis/tf_organism_1.py")
+    job_params_1 = (args.TF, args.organism, args.motifcentral_index)
     job_cores_1 = 6
     job_time_1 = 6
 
@@ -30,32 +64,10 @@ if __name__ == "__main__":
         job_name=job_name_1,
         job_script=job_script_1,
         job_params=job_params_1,
+        output="download",
         cores=job_cores_1,
         time=job_time_1,
     )
     job_file_1.create_file()
-    job_file_1.submitJob()
-
-    # Scoring the count tables
-    slurmjob_path_2 = Path(
-        f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{args.motifcentral_index}_score.job'
-    )
-    job_name_2 = "Score_count_tables"
-    job_script_2 = Path(
-        "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/source/analysis/tf_organism_2.py"
-    )
-    job_params_2 = (args.TF, args.organism, args.motifcentral_index)
-    job_cores_2 = 32
-    job_time_2 = 11
-
-    # Create slurm job file
-    job_file_2 = Slurmjob(
-        file_path=slurmjob_path_2,
-        job_name=job_name_2,
-        job_script=job_script_2,
-        job_params=job_params_2,
-        cores=job_cores_2,
-        time=job_time_2,
-    )
-    job_file_2.create_file()
-    # job_file_2.submitJob()
+    job_id_1 = job_file_1.submitJob()
+    print(f"Submitted {job_id_1}")
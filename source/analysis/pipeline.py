@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+Runs everything for a TF and organism in one command: searches ENCODE, fetches the
+experiments, their controls and files, downloads a subsample of every fastq, transforms it
+to fasta, makes the count tables, records the metadata and the tables in the database and
+scores the motifs (MOTIFCENTRAL indices) on every table.
+
+The steps are tasks of a DAG (utils/dag.py), so the experiments don't wait on each other:
+a table is made as soon as its two fastas are, while other files are still downloading.
+Downloads, transforms and database updates run in threads, tables and scores in processes.
+Every step skips what is up to date (manifests of the files, rows of the database), so a
+run only redoes what changed or failed. It replaces tf_organism_1, tf_organism_2 and the
+orchestrator, which submit the same steps as two Slurm jobs.
+
+    python pipeline.py CTCF Homo+sapiens --motifcentral-index 12 40
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from diskfiles import manifest
+from diskfiles.countTables import CountTable
+from diskfiles.fasta import select_control_library
+from diskfiles.fastq import SE_Fastq
+from ENCODE.experiment import NoControl
+from ENCODE.fetcher import EncodeFetcher, ResolvedExperiment
+from ENCODE.files import SE_File
+from ENCODE.search import EncodeSearch
+from motifs.motif import Mononucleotide
+from utils import database
+from utils.dag import DAG
+
+DEFAULT_DATA_ROOT = Path("/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data")
+
+
+def get_data_root() -> Path:
+    "Directory of the data: $SELEX_X_GENOME_DATA, else the default"
+    return Path(os.environ.get("SELEX_X_GENOME_DATA", DEFAULT_DATA_ROOT))
+
+
+def attach_worker(queue, db_path: Path) -> None:
+    "Initializer of the processes of the DAG, which aren't forked from the main one"
+    database.set_db_path(db_path)
+    database.attach_writer(queue)
+
+
+def make_table(table_path: Path, control_fasta: Path, fasta: Path) -> Path:
+    "Makes the (gzipped) count table of the fasta against the control, returns its path"
+    return CountTable.create_from_fasta(
+        control_fasta, fasta, table_path, compress=True
+    ).file_path
+
+
+def score(motif: Mononucleotide, search_tf: str, table_path: Path) -> dict:
+    "Scores the motif on the count table, the top bin (None if it was scored before)"
+    return CountTable(table_path).score(motif, search_tf)
+
+
+class TFPipeline:
+    """
+    The DAG of a TF and organism (Homo+sapiens). The experiments are added by the fetch
+    task, once they are known. The files of an experiment go to
+    data_root/TF_Homo_sapiens/experiment/library, the ones of controls (shared between
+    experiments) to data_root/Control/control/library.
+    """
+
+    def __init__(
+        self,
+        tf: str,
+        organism: str,
+        motifs: list[Mononucleotide] = (),
+        data_root: Path = None,
+        dag: DAG = None,
+    ):
+        # Check that the organism has been specified in the right format.
+        if "+" not in organism:
+            raise ValueError("Organism must be in the format of Homo+sapiens")
+        self.tf = tf
+        self.organism = organism
+        self.motifs = motifs
+        self.data_root = get_data_root() if data_root is None else Path(data_root)
+        self.dag = DAG() if dag is None else dag
+        # Experiments that could not be fetched or have no control, by accession
+        self.experiment_errors = {}
+
+    @property
+    def tf_path(self) -> Path:
+        return self.data_root / Path(f'{self.tf}_{self.organism.replace("+", "_")}')
+
+    def run(self) -> dict[str, Exception]:
+        "Runs the whole DAG, returns the errors by task (or experiment accession)"
+        self.dag.add("fetch", self.fetch, after=[self.dag.add("search", self.search)])
+        errors = self.dag.run()
+        return {**self.experiment_errors, **errors}
+
+    def search(self) -> list[str]:
+        "Accessions of the TF ChIP-seq experiments of the TF"
+        search = EncodeSearch(self.tf, self.organism, limit="all")
+        if search.search_result is None:
+            return []
+        return [hit["accession"] for hit in search.search_result]
+
+    def fetch(self, accessions: list[str]) -> int:
+        "Resolves the experiments concurrently and adds their tasks, returns how many"
+
+        async def resolve():
+            fetcher = EncodeFetcher()
+            return await fetcher.resolve_experiments(accessions), fetcher.errors
+
+        experiments, errors = asyncio.run(resolve())
+        self.experiment_errors.update(errors)
+        for resolved in experiments:
+            accession = resolved.experiment.accession
+            self.dag.add(f"metadata {accession}", self.update_metadata, resolved)
+            self.dag.add(f"experiment {accession}", self.add_experiment, resolved)
+        return len(experiments)
+
+    def update_metadata(self, resolved: ResolvedExperiment) -> None:
+        "Update DB, all the metadata of the experiment in one transaction"
+        with database.transaction():
+            resolved.experiment.update_database()
+            for library in resolved.libraries:
+                library.update_database()
+                for file in library.get_Files():
+                    file.update_database()
+
+    def add_fasta(self, file: SE_File, directory: Path) -> str:
+        "Adds the tasks making the fasta of the file in directory, returns the last one"
+        download = self.dag.add(
+            f"download {file.accession}", self.download, file, directory
+        )
+        return self.dag.add(
+            f"transform {file.accession}",
+            self.transform,
+            directory / Path(f"{file.accession}.fasta"),
+            after=[download],
+        )
+
+    def download(self, file: SE_File, directory: Path) -> SE_Fastq:
+        "Subsample of the reads of the file, None if its fasta was made already"
+        # The transform can delete the fastq, the fasta is what has to be complete
+        if manifest.is_recorded(directory / Path(f"{file.accession}.fasta")):
+            return None
+        return file.download_subsampled(directory)
+
+    def transform(self, fasta_path: Path, fastq: SE_Fastq) -> Path:
+        "Transforms the fastq to fasta_path, unless fastq is None (it was made before)"
+        if fastq is None:
+            return fasta_path
+        fasta = fastq.transform_to_fasta()
+        if not manifest.is_recorded(fasta.file_path):
+            raise FileNotFoundError(f"The transform of {fastq.file_path} failed")
+        return fasta.file_path
+
+    def add_experiment(self, resolved: ResolvedExperiment) -> int:
+        """
+        Adds the tasks of every file of the experiment: its fasta and the one of its control
+        library, the count table, its row in the database and the scores. Returns the number
+        of files. Experiments without a control have no count tables, they're recorded in
+        experiment_errors.
+        """
+        experiment = resolved.experiment
+        if resolved.control is None:
+            self.experiment_errors[experiment.accession] = NoControl(
+                f"{experiment.accession} has no control"
+            )
+            return 0
+        n_files = 0
+        for library in resolved.libraries:
+            control_library = select_control_library(
+                resolved.control_libraries,
+                library.biosample,
+                library.technical_replicate_number,
+            )
+            control_fasta = self.add_fasta(
+                control_library.get_Files()[0],
+                self.data_root
+                / Path(
+                    f"Control/{resolved.control.accession}/{control_library.accession}"
+                ),
+            )
+            directory = self.tf_path / Path(
+                f"{experiment.accession}/{library.accession}"
+            )
+            for file in library.get_Files():
+                table = self.dag.add(
+                    f"table {file.accession}",
+                    make_table,
+                    directory / Path(f"{file.accession}.tsv"),
+                    after=[control_fasta, self.add_fasta(file, directory)],
+                    cpu=True,
+                )
+                table_row = self.dag.add(
+                    f"count_table {file.accession}",
+                    self.update_count_table,
+                    after=[table, f"metadata {experiment.accession}"],
+                )
+                for motif in self.motifs:
+                    self.dag.add(
+                        f"score {motif.fit_id} {file.accession}",
+                        score,
+                        motif,
+                        self.tf,
+                        after=[table_row],
+                        cpu=True,
+                    )
+                n_files += 1
+        return n_files
+
+    def update_count_table(self, table_path: Path, metadata: None) -> Path:
+        "Adds the count table to the database, after the metadata of its experiment"
+        CountTable(table_path).update_database()
+        return table_path
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument("TF", type=str)
+    parser.add_argument("organism", type=str)  # Homo+sapiens
+    parser.add_argument("--motifcentral-index", type=int, nargs="*", default=[])
+    parser.add_argument("--data-root", type=Path, default=None)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    motifs = []
+    if args.motifcentral_index:
+        from motifs.parse_motifcentral_json import MOTIFCENTRAL
+
+        motifs = [
+            Mononucleotide.create_from_motif_central(MOTIFCENTRAL[index])
+            for index in args.motifcentral_index
+        ]
+
+    # The scores are written to the DB by a single writer
+    with database.DatabaseWriter() as writer:
+        dag = DAG(
+            args.threads,
+            args.processes,
+            initializer=attach_worker,
+            initargs=(writer.queue, database.get_db_path()),
+        )
+        pipeline = TFPipeline(args.TF, args.organism, motifs, args.data_root, dag)
+        errors = pipeline.run()
+
+    # Report every task that failed, the ones after it were not run
+    for name, error in errors.items():
+        print(f"Error: {name}: {error!r}")
+    print(f"{len(dag.results)} tasks done, {len(errors)} failed")
+    if errors:
+        sys.exit(1)
@@ -4,21 +4,28 @@
 Given a TF and organism. Downloads and transforms all the fastq files from ENCODE. 
 Transfrom it to fasta based on source/se_processing_template.sh
 The script is step 1 in the pipeline it is followed by the creation of the count tables.
+The transforms are submitted as one job array, and step 2 is submitted after it, so this
+job doesn't wait for them.
 """
 
 
+import sys
 from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from ENCODE.experiment import Control, TFChipSeq
+from analysis.orchestrator import submit_scoring
+from diskfiles import manifest
+from diskfiles.fastq import SE_Fastq, slurm_transform_to_fasta_array
+from ENCODE.experiment import Control
+from ENCODE.fetcher import ResolvedExperiment, resolve_tf
 from ENCODE.library import Library
-from ENCODE.search import EncodeSearch
 
 
-def process_library(library: Library, libpath: Path):
+def process_library(library: Library, libpath: Path) -> list[SE_Fastq]:
         """
-        Download all the fastq files for a library. Process it and delete the originals.
+        Download a subsample of all the fastq files for a library.
+        Returns the fastqs to transform.
         
         library: ENCODE library object.
         libpath: Path to the basedr for given library.
@@ -27,88 +34,66 @@ def process_library(library: Library, libpath: Path):
         
         # All fastq files associated with the library
         files = library.get_Files()
+        fastqs = []
 
         for file in files:
-            # if fasta file exists then skip loop (checks if gz fasta exists)
-            if (libpath / Path (f'{file.accession}.fasta')).exists():
+            # if the fasta file was completed then skip loop (half written ones are redone)
+            if manifest.is_recorded(libpath / Path (f'{file.accession}.fasta')):
                 continue
             else:
-                # dowload the fastq files
-                fq = file.download(libpath)
-                # Subsample the fastq file. Default is half a mil
-                sub_fq = fq.subsample()
-                # Delete the og file
-                fq.delete()
-                # Submit job on slurm to transfrom file
-                sub_fq.slurm_transform()
-
-
-def process_controls(controls: list[Control]):
-    """Downloads all the fastq files for the given set of control experiments. Transform the fastq files to fasta.
+                # Download only the subsampled reads (1M by default), the full file never hits the disk
+                sub_fq = file.download_subsampled(libpath)
+                # Transformed by the job array of all the files
+                fastqs.append(sub_fq)
+        return fastqs
+
+
+def process_control(control: Control, libraries: list[Library]) -> list[SE_Fastq]:
+    """Downloads all the fastq files for the given control experiment. Transform the fastq files to fasta.
         Delete all fastq files.
 
     Args:
-        controls (list): List of encode Control Objects.
+        control (Control): ENCODE Control Object.
+        libraries (list): The libraries of the control.
+
+    Returns:
+        list: The fastqs to transform.
     """
 
-    for control in controls:
-        try:
-            # fetch data from ENCODE
-            control.fetchData()
-            # Get the libraries
-            libraries = control.get_libraries()
-
-            # If control already exists, skip iteration
-            if Path(f"/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/Control/{control.accession}").exists():
-                continue
-            else:
-                # Library is uniquely identified by a technical and biological replicate
-                for library in libraries:
-                    process_library(library, Path(f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/Control/{control.accession}/{library.accession}'))
-                    
-        except Exception as e:
-            print(f"Error: {control.accession}")
-            print(e)
+    # Files of the control that are already done are skipped by process_library
+    # Library is uniquely identified by a technical and biological replicate
+    fastqs = []
+    for library in libraries:
+        fastqs += process_library(library, Path(f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/Control/{control.accession}/{library.accession}'))
+    return fastqs
 
 
-def process_exp(experiment: TFChipSeq):
-    """For a given TFChipSeq object. It download all the important files along with the controls.
+def process_exp(resolved: ResolvedExperiment) -> list[SE_Fastq]:
+    """For a resolved TFChipSeq experiment. It download all the important files along with the controls.
         It then process the fastq files. And calls a slurm job to transform it to fasta.
         Delete all fastq files.
 
     Args:
-        experiment (TFChipSeq): A Chip seq ENCODE experiment.
-    """
-    try:
-        
-        # Fetch data from ENCODE
-        experiment.fetchData()
-        
-        # Get libraries and controls
-        libraries = experiment.get_libraries()
-        controls = experiment.get_controls()
-        
-        # Process the controls
-        process_controls(controls)
+        resolved (ResolvedExperiment): A Chip seq ENCODE experiment, with its control and libraries.
 
-        # Library is uniquely identified by a technical and biological replicate #
-        for library in libraries:
-            
-            libpath = Path(f"/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}")
+    Returns:
+        list: The fastqs to transform.
+    """
+    experiment = resolved.experiment
+    fastqs = []
 
-            # If library exists skip iteration
-            if libpath.exists():
-                continue
-            else:
-                process_library(library, libpath)
-                    
-          
+    # Process the control
+    if resolved.control is not None:
+        fastqs += process_control(resolved.control, resolved.control_libraries)
 
-    except Exception as e:
-        print(f"Error: {experiment.accession}")
-        print(e)
+    # Library is uniquely identified by a technical and biological replicate #
+    for library in resolved.libraries:
 
+        libpath = Path(f"/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}")
 
+        # Files of the library that are already done are skipped
+        fastqs += process_library(library, libpath)
+    return fastqs
 
 
 if __name__ == "__main__":
@@ -117,19 +102,42 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("TF", type=str)
     parser.add_argument("organism", type=str)  # Homo+sapiens
+    parser.add_argument("motifcentral_index", type=int)
     args = parser.parse_args()
 
     # Check that the organism has been specified in the right format.
     if "+" not in args.organism:
         raise ValueError("Organism must be in the format of Homo+sapiens")
 
-    # Querying the encode DB
-    query = EncodeSearch(args.TF, args.organism, limit="all")
-    query.search()
-
-    # All the experiments for the query
-    Experiments = query.get_experiments()
+    # Resolving all the experiments, controls, libraries and files concurrently
+    Experiments, errors = resolve_tf(args.TF, args.organism)
 
     # Processing the experiment. All data is downloaded to data/TF_Homo_sapiens
+    fastqs = []
     with ThreadPoolExecutor() as executor:
-        executor.map(process_exp, Experiments)
+        futures = {
+            executor.submit(process_exp, resolved): resolved.experiment.accession
+            for resolved in Experiments
+        }
+        for future in as_completed(futures):
+            try:
+                fastqs += future.result()
+            except Exception as e:
+                errors[futures[future]] = e
+
+    # One job array for all the transforms (controls are shared between experiments)
+    fastqs = list({fastq.file_path: fastq for fastq in fastqs}.values())
+    tf_path = Path(f"/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}")
+    transform_id = slurm_transform_to_fasta_array(fastqs, tf_path / Path("transform.job"))
+
+    # Step 2 starts once every transform succeeded. Failed tasks can be resubmitted with
+    # python ledger.py --retry, and step 2 submitted again.
+    after = [] if transform_id is None else [transform_id]
+    scoring_id = submit_scoring(args.TF, args.organism, args.motifcentral_index, after)
+    print(f"Submitted {transform_id} and {scoring_id}")
+
+    # Report every experiment that failed
+    for accession, error in errors.items():
+        print(f"Error: {accession}: {error!r}")
+    if errors:
+        sys.exit(1)
@@ -8,6 +8,8 @@ Which contains a sommary of scores for all the experiments.
 
 import json
 import multiprocessing
+import sys
+import traceback
 from argparse import ArgumentParser
 from pathlib import Path
 
@@ -16,6 +18,7 @@ from ENCODE.experiment import Control, TFChipSeq
 from ENCODE.search import EncodeSearch
 from motifs.motif import Mononucleotide
 from motifs.parse_motifcentral_json import MOTIFCENTRAL
+from utils import database
 
 
 def get_fasta(control: Control) -> list[Path]:
@@ -27,33 +30,38 @@ def get_fasta(control: Control) -> list[Path]:
     return list(control_dr.rglob("*.fasta"))
 
 
-def create_table_and_score(experiment: TFChipSeq) -> dict:
-
+def update_metadata(experiment: TFChipSeq) -> None:
+    "Update DB, all the metadata of the experiment in one transaction"
+    # Query Encode
+    experiment.fetchData()
+    with database.transaction():
+        experiment.update_database()
+        for library in experiment.get_libraries():
+            library.update_database()
+            for file in library.get_Files():
+                file.update_database()
+
+
+def create_tables(experiment: TFChipSeq) -> dict:
+    """
+    Creates a count table for every file of every library of the experiment. Nothing is
+    written to the DB here, the parent adds the tables. Returns their paths by
+    "library, file", or {"error": ...} if it failed.
+    """
     try:
-        # Query Encode
-        experiment.fetchData()
-
         # Get all the controls. This will be round 0 in the table.
         controls = experiment.get_controls()
         # ! For now selecting the first fasta file of the first control.
-        control_fasta = get_fasta(controls[0])
-        control_fasta = control_fasta[0]
+        control_fasta = get_fasta(controls)[0]
 
         # Get all the libraries. These are the round 1s in the table.
-        libraries = experiment.get_libraries()
-
-        # Score for each library will be added to this dictionary
-        experiment_scores = {}
-
-        # Create a count table for each library and score it.
-        for library in libraries:
+        tables = {}
+        for library in experiment.get_libraries():
 
             # Get all the files associated with the library.
             # ! Ideally it should just be one. I want to avoid repetition with split fastq files
-            files = library.get_Files()
+            for file in library.get_Files():
 
-            for file in files:
-                
                 # Path to supposed fasta file
                 r1_fasta = Path(
                     f"/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}/{file.accession}.fasta"
@@ -62,22 +70,32 @@ def create_table_and_score(experiment: TFChipSeq) -> dict:
 
                 # Create the count table
                 count_table = CountTable.create_from_fasta(
-                    control_fasta, r1_fasta, count_table_path
+                    control_fasta, r1_fasta, count_table_path, compress=True
                 )
-                count_table.processTable()
-                count_table.zip()
-
-                # ! I should make MOTIF a function parameter.
-                experiment_scores[f"{library.accession}, {file.accession}"] = (
-                    count_table.score(MOTIF)
+                tables[f"{library.accession}, {file.accession}"] = str(
+                    count_table.file_path
                 )
-                print(experiment.accession)
-                print(experiment_scores[f"{library.accession}, {file.accession}"])
-        return experiment_scores
+        return tables
+
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": repr(e)}
+
 
+def score_tables(tables: dict) -> dict:
+    """
+    Scores MOTIF on the count tables (by "library, file") of an experiment. The motif rows
+    go to the database writer of the pool. Returns the top bins, or {"error": ...}.
+    """
+    try:
+        # ! I should make MOTIF a function parameter.
+        return {
+            key: CountTable(Path(path)).score(MOTIF, args.TF)
+            for key, path in tables.items()
+        }
     except Exception as e:
-        print(f"Error: {experiment.accession}")
-        print(e)
+        traceback.print_exc()
+        return {"error": repr(e)}
 
 
 if __name__ == "__main__":
@@ -95,27 +113,70 @@ if __name__ == "__main__":
         raise ValueError("Organism must be in the format of Homo+sapiens")
 
     # Querying the encode DB
-    query = EncodeSearch(args.TF, args.organism, limit="all")
+    query = EncodeSearch(args.TF, args.organism, limit="all", embedded=True)
     query.search()
 
     # All the experiments for the query
     Experiments = query.get_experiments()
 
-    
-    # Create a pool of processes
-    with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-        
-        # Map the function to the list of items and collect the results
-        results = pool.map(create_table_and_score, Experiments)
-
-        # saving the results as json
-        results_json = {}
-        for i, experiment in enumerate(Experiments):
-            results_json[experiment.accession] = results[i]
-
-        json_file_path = Path(
-            f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{args.motifcentral_index}_scores.json'
+    # Only this process writes the metadata, the workers don't fight over the write lock.
+    # Experiments that failed are kept in the results with their error.
+    results_json = {}
+    for experiment in Experiments:
+        try:
+            update_metadata(experiment)
+        except Exception as e:
+            traceback.print_exc()
+            results_json[experiment.accession] = {"error": repr(e)}
+    Experiments = [
+        experiment
+        for experiment in Experiments
+        if experiment.accession not in results_json
+    ]
+
+    # Create a pool of processes. Their scores are written to the DB by a single writer.
+    with database.DatabaseWriter() as writer, multiprocessing.Pool(
+        processes=multiprocessing.cpu_count(),
+        initializer=database.attach_writer,
+        initargs=(writer.queue,),
+    ) as pool:
+
+        # Make the count tables, then add them to the DB (scoring reads their ids)
+        tables = dict(
+            zip(
+                [experiment.accession for experiment in Experiments],
+                pool.map(create_tables, Experiments),
+            )
         )
-        json_file_path.touch(exist_ok=True)
-        with open(json_file_path, "w") as file:
-            json.dump(results_json, file, indent=4)
+        for accession, experiment_tables in list(tables.items()):
+            if "error" in experiment_tables:
+                results_json[accession] = tables.pop(accession)
+                continue
+            try:
+                with database.transaction():
+                    for path in experiment_tables.values():
+                        CountTable(Path(path)).update_database()
+            except Exception as e:
+                traceback.print_exc()
+                results_json[accession] = {"error": repr(e)}
+                del tables[accession]
+
+        # Score the count tables
+        results_json.update(zip(tables, pool.map(score_tables, tables.values())))
+
+    # saving the results as json
+    json_file_path = Path(
+        f'/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/{args.TF}_{args.organism.replace("+","_")}/{args.motifcentral_index}_scores.json'
+    )
+    json_file_path.touch(exist_ok=True)
+    with open(json_file_path, "w") as file:
+        json.dump(results_json, file, indent=4, default=str)
+
+    # Report every experiment that failed
+    failed = [
+        accession for accession, result in results_json.items() if "error" in result
+    ]
+    for accession in failed:
+        print(f"Error: {accession}: {results_json[accession]['error']}")
+    if failed:
+        sys.exit(1)
@@ -1,6 +1,8 @@
 import subprocess
 from pathlib import Path
 
+from diskfiles import manifest
+
 
 class DiskFile:
     """Base class for files on disk"""
@@ -19,6 +21,7 @@ class DiskFile:
         # If file is zipped make sure it has a .gz extension
         if self.zipped and self.file_path.suffix != ".gz":
             self.file_path.rename(str(self.file_path) + ".gz")
+            manifest.move(self.file_path, Path(str(self.file_path) + ".gz"))
             self.file_path = Path(str(self.file_path) + ".gz")
 
     @staticmethod
@@ -29,6 +32,7 @@ class DiskFile:
     def delete(self):
         if self.file_path is not None:
             self.file_path.unlink()
+            manifest.forget(self.file_path)
             self.file_path = None
             self.deleted = True
 
@@ -36,6 +40,7 @@ class DiskFile:
         "Zip file"
         if not self.deleted and not self.zipped:
             subprocess.run(["gzip", str(self.file_path)])
+            manifest.move(self.file_path, Path(str(self.file_path) + ".gz"))
             # Update path
             self.file_path = Path(str(self.file_path) + ".gz")
             # Update zipped flag
@@ -45,6 +50,7 @@ class DiskFile:
         "Unzip File"
         if not self.deleted and self.zipped:
             subprocess.run(["gzip", "-d", str(self.file_path)])
+            manifest.move(self.file_path, Path(str(self.file_path)[:-3]))
             # Update path
             self.file_path = Path(str(self.file_path)[:-3])
             # Update zipped flag
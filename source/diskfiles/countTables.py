@@ -5,14 +5,90 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from motifs.motif import Mononucleotide
 
-import sqlite3
-import subprocess
-from collections import defaultdict
+import gzip
+import re
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from diskfiles import manifest
 from diskfiles.base import DiskFile
+from diskfiles.packedCountTables import PackedCountTable
+from motifs.scoring import binding_mode_score_matrix
+from utils import database
+from utils.binning import (
+    bin_statistics,
+    make_bins,
+    sort_by_score,
+    top_bin_enrichment,
+)
+from utils.encoding import (
+    N_CODE,
+    decode_sequences,
+    encode_sequences,
+    group_by_length,
+    kmer_composition,
+    kmer_names,
+    pack_2bit,
+    unpack_2bit,
+)
+
+DINUCLEOTIDES = kmer_names(2)
+
+# Any character that can't be part of a processed probe
+_NON_ACGT = re.compile("[^ACGT]")
+
+
+def _open_table(path: Path, mode: str, zipped: bool):
+    "Opens a count table as text, gzipped or not"
+    return gzip.open(path, mode) if zipped else open(path, mode)
+
+
+def _read_fasta(fasta: Path):
+    "Yields the sequences of a (gzipped or not, single or multi line) fasta file"
+    with _open_table(fasta, "rt", DiskFile.is_gz_file(fasta)) as f:
+        lines = []
+        for line in f:
+            if line.startswith(">"):
+                if lines:
+                    yield "".join(lines)
+                lines = []
+            else:
+                lines.append(line.strip())
+        if lines:
+            yield "".join(lines)
+
+
+def _chunks(iterable, chunk_size: int):
+    "Yields lists of up to chunk_size items"
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _count_probes(seqs: list[str], counts: dict, column: int) -> None:
+    "Adds the ACGT only reads to counts[length][packed read][column]"
+    for length, indices in group_by_length(seqs).items():
+        codes = encode_sequences([seqs[i] for i in indices])
+        codes = codes[(codes < N_CODE).all(axis=1)]
+        if length == 0 or len(codes) == 0:
+            continue
+        packed = pack_2bit(codes).tobytes()
+        bytes_per_probe = len(packed) // len(codes)
+        length_counts = counts.setdefault(length, {})
+        for i in range(0, len(packed), bytes_per_probe):
+            key = packed[i : i + bytes_per_probe]
+            if key in length_counts:
+                length_counts[key][column] += 1
+            else:
+                length_counts[key] = [0, 0]
+                length_counts[key][column] = 1
 
 
 # Add fit porbound method for the count table
@@ -23,42 +99,107 @@ class CountTable(DiskFile):
         super().__init__(file_path)
 
     @classmethod
-    def create_from_fasta(cls, fasta1: Path, fasta2: Path, count_table_path: Path):
-        if count_table_path.exists():
-            return CountTable(count_table_path)
-        elif (count_table_path.parent / Path(count_table_path.name + ".gz")).exists():
-            return CountTable(
-                count_table_path.parent / Path(count_table_path.name + ".gz")
-            )
-
-        """Creates a CountTable tsv file"""
+    def create_from_fasta(
+        cls,
+        fasta1: Path,
+        fasta2: Path,
+        count_table_path: Path,
+        compress: bool = False,
+        chunk_size: int = 65536,
+    ):
+        """
+        Creates a processed (uppercase, ACGT only) count table from the R0 (fasta1) and
+        R1 (fasta2) reads, which can be gzipped. Identical reads are counted in a dict keyed
+        on the 2 bit packed read, so memory grows with the number of distinct probes only.
+        With compress, the table is written gzipped to count_table_path.gz.
+        """
+        # Made before from the same fasta files (zipped or not)
+        inputs = [fasta1, fasta2]
+        for path in (count_table_path, Path(str(count_table_path) + ".gz")):
+            if manifest.is_current(path, inputs):
+                return CountTable(path)
+        input_fingerprints = manifest.fingerprints(inputs)
+
+        # {probe length: {packed probe: [r0, r1]}}
+        counts = {}
+        for column, fasta in enumerate([fasta1, fasta2]):
+            for seqs in _chunks(_read_fasta(fasta), chunk_size):
+                _count_probes(seqs, counts, column)
+
+        if compress:
+            count_table_path = Path(str(count_table_path) + ".gz")
         count_table_path.parent.mkdir(exist_ok=True, parents=True)
-        count_table_path.touch(exist_ok=True)
-
-        with open(count_table_path, "w") as output_file:
-            subprocess.run(
-                [
-                    "/burg/home/hg2604/ProBound/pb",
-                    "make-table",
-                    str(fasta1),
-                    str(fasta2),
-                ],
-                stdout=output_file,
-            )
+        tmp_path = count_table_path.parent / Path(f".{count_table_path.name}.tmp")
+        with _open_table(tmp_path, "wt", compress) as output_file:
+            for length, length_counts in counts.items():
+                for packed in _chunks(iter(length_counts), chunk_size):
+                    codes = unpack_2bit(
+                        np.frombuffer(b"".join(packed), dtype=np.uint8).reshape(
+                            len(packed), -1
+                        ),
+                        length,
+                    )
+                    output_file.writelines(
+                        f"{seq}\t{length_counts[key][0]}\t{length_counts[key][1]}\n"
+                        for seq, key in zip(decode_sequences(codes), packed)
+                    )
+        tmp_path.replace(count_table_path)
+        manifest.record(count_table_path, input_fingerprints)
 
         return CountTable(count_table_path)
 
     def processTable(
-        self,
-        script: Path = Path(__file__).parent.parent / Path("processCntTbl.sh"),
-    ):
-        """Transforms count table in place, based on the script. Table should not be zipped(assert this). (In place)"""
+        self, collapse_duplicates: bool = False, compress: bool = None
+    ) -> int:
+        """
+        Sanitizes the count table in place, in one streaming pass: probes are uppercased and
+        probes with a non ACGT base are dropped. With collapse_duplicates, repeated probes are
+        merged into one row and their counts added. Gzipped tables are read and written as gzip;
+        compress=True/False forces the output compression. Returns the number of probes dropped.
+        """
         if not self.file_path.exists():
             raise FileNotFoundError(f"File {self.file_path} does not exist.")
-        elif self.file_path.suffix == ".gz":
-            return
-        else:
-            subprocess.run([str(script), str(self.file_path)])
+        if compress is None:
+            compress = self.zipped
+
+        output_path = self.file_path
+        if self.zipped:
+            output_path = output_path.with_suffix("")
+        if compress:
+            output_path = Path(str(output_path) + ".gz")
+        tmp_path = output_path.parent / Path(f".{output_path.name}.tmp")
+
+        dropped = 0
+        counts = {}
+        with _open_table(self.file_path, "rt", self.zipped) as input_file, _open_table(
+            tmp_path, "wt", compress
+        ) as output_file:
+            for line in input_file:
+                if not line.strip():
+                    continue
+                seq, r0, r1 = line.split()
+                seq = seq.upper()
+                if _NON_ACGT.search(seq):
+                    dropped += 1
+                elif collapse_duplicates:
+                    if seq in counts:
+                        counts[seq][0] += int(r0)
+                        counts[seq][1] += int(r1)
+                    else:
+                        counts[seq] = [int(r0), int(r1)]
+                else:
+                    output_file.write(f"{seq}\t{r0}\t{r1}\n")
+            for seq, (r0, r1) in counts.items():
+                output_file.write(f"{seq}\t{r0}\t{r1}\n")
+
+        tmp_path.replace(output_path)
+        # The table is not what its manifest describes anymore
+        manifest.forget(self.file_path)
+        if output_path != self.file_path:
+            self.file_path.unlink()
+        self.file_path = output_path
+        self.zipped = compress
+        return dropped
 
     def get_pandas_df(self):
         """Returns a pandas dataframe of the count table"""
@@ -73,24 +214,45 @@ class CountTable(DiskFile):
                 names=["seq", "r0", "r1"],
             )
 
+    def get_packed_table(self) -> PackedCountTable:
+        """
+        Returns the packed (2 bit probes, memory mapped counts) version of the table, FileAcc.pct.
+        It's created on first use, and again whenever the count table changed.
+        """
+        packed_path = self.file_path.parent / Path(f"{self.file_path.name[:11]}.pct")
+        if manifest.is_current(packed_path, [self.file_path]):
+            return PackedCountTable(packed_path)
+        packed_table = PackedCountTable.create_from_count_table(self, packed_path)
+        manifest.record(packed_path, [self.file_path])
+        return packed_table
+
     @staticmethod
-    def bin_count_table(df, bin_size=1000):
-        """df should be a count Table with score column"""  # Assert this
-        i = 0
-        avg_score = []
-        r0_count = []
-        r1_count = []
-        while (
-            i < df.shape[0] - 10
-        ):  # Keeping a buffer, so that the last bin isn't super small
-            bin = df.iloc[i : i + 1000, 1:].copy()
-            avg_score.append(bin.iloc[:, 2].mean())
-            r0_count.append(bin.iloc[:, 0].sum())
-            r1_count.append(bin.iloc[:, 1].sum())
-            i += 1000
-
-        bin_df = pd.DataFrame(
-            {"avg_score": avg_score, "r0_count": r0_count, "r1_count": r1_count}
+    def bin_count_table(
+        df: pd.DataFrame,
+        bin_size: int = 1000,
+        method: str = "size",
+        n_bins: int = 100,
+        mean_columns: list[str] = None,
+    ) -> pd.DataFrame:
+        """
+        df should be a count Table with score column, sorted by score (high to low).
+        method is size (bins of bin_size probes), quantile or score_width (n_bins bins).
+        The mean of every column in mean_columns is added to the bins.
+        """
+        if "score" not in df.columns:
+            raise ValueError("Count table needs a score column to be binned")
+
+        scores = df["score"].to_numpy()
+        starts, ends = make_bins(scores, method, bin_size, n_bins)
+        means = {"avg_score": scores}
+        for column in mean_columns or []:
+            means[column] = df[column].to_numpy()
+
+        bin_df = bin_statistics(
+            starts,
+            ends,
+            means=means,
+            sums={"r0_count": df["r0"].to_numpy(), "r1_count": df["r1"].to_numpy()},
         )
         bin_df["enrichment"] = bin_df["r1_count"] / bin_df["r0_count"]
 
@@ -99,70 +261,24 @@ class CountTable(DiskFile):
     # ! motif can be a general motif class
     def score(self, motif: Mononucleotide, search_tf: str):
         """
-        Scores a motif against the count table using the fit_id and ProboundTools.
+        Scores a motif against the count table with the ProboundTools consensus model (in process).
         Also generates the enrichment vs bin plot and enrichment vs score plots.
         """
 
         # Check if the table has already been scored. If so, just exit.
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            # Get the count_table_id from the counttables table.
-            try:
-                cursor.execute(
-                    """
-                    SELECT "id" FROM "count_tables" WHERE "r1_file" IN (SELECT "id" FROM "files" WHERE "accession" = ?)
-                    """,
-                    (self.file_path.name[:11],),
-                )
-                count_table_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find count table id in Database")
-
-            try:
-                cursor.execute(
-                    """
-                    SELECT COUNT(*) FROM "motif" WHERE "tf" = ? AND "search_tf" = ? AND "organism" = ? AND "count_table_id" = ?
-                    """,
-                    (
-                        motif.tf,
-                        search_tf,
-                        motif.organism,
-                        self.file_path.name[:11],
-                    ),
-                )
-                count = cursor.fetchone()[0]
-                if count != 0:
-                    return
-            except:
-                raise ValueError("Failed to get count from Database")
-
-        # unzip count_table
-        self.unzip()
-        # score it
-        subprocess.run(
-            [
-                str(Path(__file__).parent.parent / Path("scoreCntTbl.sh")),
-                str(self.file_path),
-                motif.fit_id,
-            ]
+        count_table_id = self.get_count_table_id()
+        count = database.fetch_value(
+            """
+            SELECT COUNT(*) FROM motif
+            WHERE tf = ? AND search_tf = ? AND organism = ? AND count_table_id = ?
+            """,
+            (motif.tf, search_tf, motif.organism, count_table_id),
         )
-        # zip it again
-        self.zip()
+        if count != 0:
+            return
 
         count_table_df = self.get_pandas_df()
-
-        score_series = pd.read_csv(
-            self.file_path.parent
-            / Path(f"{self.file_path.name[:11]}_{motif.fit_id}.txt"),
-            header=None,
-        )
-
-        score_series = score_series.iloc[:, 0]
-
-        count_table_df["score"] = score_series
+        count_table_df["score"] = self.score_probes(motif, list(count_table_df["seq"]))
         count_table_df.sort_values(by="score", ascending=False, inplace=True)
 
         bin_df = CountTable.bin_count_table(count_table_df)
@@ -204,110 +320,103 @@ class CountTable(DiskFile):
         )
 
         # Add the score to Database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            # Get the count_table_id from the counttables table.
-            try:
-                cursor.execute(
-                    """
-                    SELECT "id" FROM "count_tables" WHERE "r1_file" IN (SELECT "id" FROM "files" WHERE "accession" = ?)
-                    """,
-                    (self.file_path.name[:11],),
-                )
-                count_table_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find file in Database")
-
-            # Update DB
-            type1 = "Mononucleotide"
-            tf = motif.tf
-            search_tf = search_tf
-            organism = motif.organism
-            count_table_id = count_table_id
-            top_row = bin_df.iloc[0,].to_dict()
-            score = top_row["avg_score"]
-            r0_count = top_row["r0_count"]
-            r1_count = top_row["r1_count"]
-            enrichment = top_row["enrichment"]
-            row = (
-                type1,
-                tf,
-                search_tf,
-                organism,
-                count_table_id,
-                score,
-                r0_count,
-                r1_count,
-                enrichment,
-            )
-
-            try:
-                cursor.executemany(
-                    """
-                INSERT INTO "motif" ("type", "tf", "search_tf", "organism", "count_table_id", "score", "r0_count", "r1_count", "enrichment") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    [row],
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print("Error:", e)
+        top_row = bin_df.iloc[0,].to_dict()
+        database.submit(
+            "motif",
+            type="Mononucleotide",
+            tf=motif.tf,
+            search_tf=search_tf,
+            organism=motif.organism,
+            count_table_id=count_table_id,
+            score=top_row["avg_score"],
+            r0_count=top_row["r0_count"],
+            r1_count=top_row["r1_count"],
+            enrichment=top_row["enrichment"],
+        )
 
         return bin_df.iloc[0,].to_dict()
 
+    def get_score_path(self, motif_id: str) -> Path:
+        """Path to the scores of the count table for the motif_id (fit_id). One score per line."""
+        return self.file_path.parent / Path(
+            f"{self.file_path.name[:11]}_{motif_id}.txt"
+        )
+
+    def score_probes(self, motif: Mononucleotide, seqs: list[str] = None) -> np.ndarray:
+        """
+        Scores every probe with the ProboundTools consensus model (with N scoring) of the motif,
+        in process. The table doesn't need to be unzipped.
+        Scores are also saved to get_score_path(motif.fit_id) for the plotting methods.
+        """
+        return self.score_many([motif], seqs)[motif.fit_id].to_numpy()
+
+    def score_many(
+        self,
+        motifs: list[Mononucleotide],
+        seqs: list[str] = None,
+        save_scores: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Scores every probe against all the motifs in one pass. The table is read and the probes
+        are encoded once. Returns a (probes x motifs) dataframe, the columns are the fit_ids.
+        """
+        if seqs is None:
+            seqs = list(self.get_pandas_df()["seq"])
+
+        matrices = [motif.consensus_matrix for motif in motifs]
+        scores = np.zeros((len(seqs), len(motifs)))
+        # Sequences of different lengths can't share an array
+        for indices in group_by_length(seqs).values():
+            codes = encode_sequences([seqs[i] for i in indices])
+            scores[indices] = binding_mode_score_matrix(codes, matrices)
+
+        score_df = pd.DataFrame(scores, columns=[motif.fit_id for motif in motifs])
+        if save_scores:
+            for i, motif in enumerate(motifs):
+                np.savetxt(self.get_score_path(motif.fit_id), scores[:, i], fmt="%.10g")
+
+        return score_df
+
     def get_probe_count(self):
         "Returns Total Probe Count, Probes in R0, and Probes in R1."
         df = self.get_pandas_df()
         return (df.shape[0], df[df["r0"] > 0].shape[0], df[df["r1"] > 0].shape[0])
 
+    def get_count_table_id(self) -> int:
+        "Id of the count table in the Selex_X_Genome.db database"
+        count_table_id = database.fetch_value(
+            """
+            SELECT count_tables.id FROM count_tables
+            JOIN files ON files.id = count_tables.r1_file
+            WHERE files.accession = ?
+            """,
+            (self.file_path.name[:11],),
+        )
+        if count_table_id is None:
+            raise ValueError("Could not find count table id in Database")
+        return count_table_id
+
     def update_database(self):
         "Adds information to the Selex_X_Genome.db database"
-        # Connect to the database
-        with sqlite3.connect(
-            "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
-        ) as conn:
-            cursor = conn.cursor()
-
-            # Get the r1_file_id from the files table
-            try:
-                cursor.execute(
-                    """
-                    SELECT "id" FROM "files" WHERE "accession" = ?
-                    """,
-                    (self.file_path.name[:11],),
-                )
-                r1_file_id = cursor.fetchone()[0]
-            except:
-                raise ValueError("Could not find file in Database")
-
-            probe_count, r0_count, r1_count = self.get_probe_count()
-            # Value to be added to DB
-            count_table = [(r1_file_id, probe_count, r0_count, r1_count)]
-            # Update DB
-            try:
-                cursor.executemany(
-                    """
-                INSERT INTO "count_tables" ("r1_file", "probe_count", "r0_count", "r1_count") VALUES (?, ?, ?, ?)
-                """,
-                    count_table,
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print("Error:", e)
+        r1_file_id = database.fetch_value(
+            "SELECT id FROM files WHERE accession = ?", (self.file_path.name[:11],)
+        )
+        if r1_file_id is None:
+            raise ValueError("Could not find file in Database")
+
+        probe_count, r0_count, r1_count = self.get_probe_count()
+        database.insert(
+            "count_tables",
+            r1_file=r1_file_id,
+            probe_count=probe_count,
+            r0_count=r0_count,
+            r1_count=r1_count,
+        )
 
     def plot_enrichment_vs_bin(self, motif_id: str):
         count_table_df = self.get_pandas_df()
 
-        score_series = pd.read_csv(
-            self.file_path.parent / Path(f"{self.file_path.name[:11]}_{motif_id}.txt"),
-            header=None,
-        )
+        score_series = pd.read_csv(self.get_score_path(motif_id), header=None)
 
         score_series = score_series.iloc[:, 0]
 
@@ -335,13 +444,35 @@ class CountTable(DiskFile):
 
         return fig, ax
 
+    def get_enrichment_vs_bin_size(
+        self,
+        motif_id: str,
+        min_bin_size: int = 500,
+        pseudocount: float = 1,
+        n_samples: int = None,
+    ) -> pd.DataFrame:
+        """
+        Enrichment of the top bin (sorted by the motif_id scores) for every top bin size,
+        from min_bin_size to the whole table. With n_samples, only that many log spaced
+        bin sizes. Returns a dataframe with bin_size and enrichment columns.
+        """
+        count_table_df = self.get_pandas_df()
+        scores = pd.read_csv(self.get_score_path(motif_id), header=None).iloc[:, 0]
+        order = sort_by_score(scores.to_numpy())
+
+        return top_bin_enrichment(
+            count_table_df["r0"].to_numpy()[order],
+            count_table_df["r1"].to_numpy()[order],
+            min_bin_size=min_bin_size,
+            pseudocount_r0=pseudocount,
+            pseudocount_r1=pseudocount,
+            n_samples=n_samples,
+        )
+
     def plot_enrichment_vs_score(self, motif_id: str):
 
         count_table_df = self.get_pandas_df()
-        score_series = pd.read_csv(
-            self.file_path.parent / Path(f"{self.file_path.name[:11]}_{motif_id}.txt"),
-            header=None,
-        )
+        score_series = pd.read_csv(self.get_score_path(motif_id), header=None)
 
         score_series = score_series.iloc[:, 0]
 
@@ -370,142 +501,72 @@ class CountTable(DiskFile):
 
         return fig, ax
 
-    def get_mn_base_composition(self):
-        "Saves the base composition of each sequence as a tsv file. [A,C,G,T]"
-        table_df = self.get_pandas_df()
-
-        base_counts = {"A": [], "C": [], "G": [], "T": []}
-
-        for index, row in table_df.iterrows():
-            seq = row["seq"]
-            probe_length = len(seq)
-            count = defaultdict(int)
-            for base in seq:
-                count[base] += 1
-
-            base_counts["A"].append(count["A"] / probe_length)
-            base_counts["C"].append(count["C"] / probe_length)
-            base_counts["G"].append(count["G"] / probe_length)
-            base_counts["T"].append(count["T"] / probe_length)
+    def get_kmer_composition(self, k: int, chunk_size: int = 8192) -> np.ndarray:
+        """
+        Returns the k-mer (k = 1 to 6) composition of every probe, count / probe length, as a
+        memory mapped (probes x 4**k) float32 array. Columns are in kmer_names(k) order.
+        It's computed once from the packed table and saved as FileAcc_k{k}_composition.npy.
+        """
+        if not 1 <= k <= 6:
+            raise ValueError("k must be between 1 and 6")
 
-        base_comp = pd.DataFrame.from_dict(base_counts)
-        base_comp.to_csv(
-            self.file_path.parent
-            / Path(f"{self.file_path.name[:11]}_mn_composition.tsv"),
-            sep="\t",
+        composition_path = self.file_path.parent / Path(
+            f"{self.file_path.name[:11]}_k{k}_composition.npy"
         )
+        if manifest.is_current(composition_path, [self.file_path]):
+            return np.load(composition_path, mmap_mode="r")
+
+        packed_table = self.get_packed_table()
+        composition = np.lib.format.open_memmap(
+            composition_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(packed_table.n_probes, 4**k),
+        )
+        for start in range(0, packed_table.n_probes, chunk_size):
+            stop = start + chunk_size
+            composition[start:stop] = kmer_composition(
+                packed_table.get_codes(start, stop), k, packed_table.lengths[start:stop]
+            )
+        composition.flush()
+        del composition
+        # Only now, so a half written composition is computed again
+        manifest.record(composition_path, [self.file_path])
 
-        return base_comp
-
-    def get_dn_base_composition(self):
-        "Saves the dinucleotide base composition of each sequence as a tsv file. [A,C,G,T]"
-
-        table_df = self.get_pandas_df()
+        return np.load(composition_path, mmap_mode="r")
 
-        base_counts = {
-            "AA": [],
-            "AC": [],
-            "AG": [],
-            "AT": [],
-            "CA": [],
-            "CC": [],
-            "CG": [],
-            "CT": [],
-            "GA": [],
-            "GC": [],
-            "GG": [],
-            "GT": [],
-            "TA": [],
-            "TC": [],
-            "TG": [],
-            "TT": [],
-        }
-
-        for index, row in table_df.iterrows():
-            seq = row["seq"]
-            probe_length = len(seq)
-            count = defaultdict(int)
-            for index, _ in enumerate(seq):
-                if index == len(seq) - 1:
-                    break
-                count[seq[index : index + 2]] += 1
-
-            base_counts["AA"].append(count["AA"] / probe_length)
-            base_counts["AC"].append(count["AC"] / probe_length)
-            base_counts["AG"].append(count["AG"] / probe_length)
-            base_counts["AT"].append(count["AT"] / probe_length)
-            base_counts["CA"].append(count["CA"] / probe_length)
-            base_counts["CC"].append(count["CC"] / probe_length)
-            base_counts["CG"].append(count["CG"] / probe_length)
-            base_counts["CT"].append(count["CT"] / probe_length)
-            base_counts["GA"].append(count["GA"] / probe_length)
-            base_counts["GC"].append(count["GC"] / probe_length)
-            base_counts["GG"].append(count["GG"] / probe_length)
-            base_counts["GT"].append(count["GT"] / probe_length)
-            base_counts["TA"].append(count["TA"] / probe_length)
-            base_counts["TC"].append(count["TC"] / probe_length)
-            base_counts["TG"].append(count["TG"] / probe_length)
-            base_counts["TT"].append(count["TT"] / probe_length)
-
-        base_comp = pd.DataFrame.from_dict(base_counts)
-        base_comp.to_csv(
-            self.file_path.parent
-            / Path(f"{self.file_path.name[:11]}_dn_composition.tsv"),
-            sep="\t",
-        )
+    def get_mn_base_composition(self) -> pd.DataFrame:
+        "Returns the base composition of each sequence. [A,C,G,T]"
+        return pd.DataFrame(self.get_kmer_composition(1), columns=kmer_names(1))
 
-        return base_comp
+    def get_dn_base_composition(self) -> pd.DataFrame:
+        "Returns the dinucleotide base composition of each sequence. [AA,AC,...,TT]"
+        return pd.DataFrame(self.get_kmer_composition(2), columns=DINUCLEOTIDES)
 
     def plot_perbin_mn_composition(self, motif_id: str):
 
         table_df = self.get_pandas_df()
 
-        score_series = pd.read_csv(
-            self.file_path.parent / Path(f"{self.file_path.name[:11]}_{motif_id}.txt"),
-            header=None,
-        )
+        score_series = pd.read_csv(self.get_score_path(motif_id), header=None)
 
         score_series = score_series.iloc[:, 0]
 
         table_df["score"] = score_series
 
-        mn_comp = pd.read_csv(
-            self.file_path.parent
-            / Path(f"{self.file_path.name[:11]}_mn_composition.tsv"),
-            sep="\t",
-            index_col=False,
-        )
+        mn_comp = self.get_mn_base_composition()
 
         # Concatenating the Columns
 
         merged_df = pd.concat([table_df, mn_comp], axis=1, ignore_index=False)
         merged_df.sort_values(by="score", ascending=False, inplace=True)
-        merged_df.reset_index(drop=True, inplace=True)
-
-        # Start Binning
-
-        i = 0
-        avg_score = []
-        r0_count = []
-        r1_count = []
-        A = []
-        C = []
-        G = []
-        T = []
-
-        while (
-            i < merged_df.shape[0] - 10
-        ):  # Keeping a buffer, so that the last bin isn't super small
-            bin = merged_df.iloc[i : i + 1000,].copy()
-
-            avg_score.append(bin.iloc[:, 2].mean())
-            r0_count.append(bin.iloc[:, 0].sum())
-            r1_count.append(bin.iloc[:, 1].sum())
-            A.append(bin.iloc[:, 5].mean())
-            C.append(bin.iloc[:, 6].mean())
-            G.append(bin.iloc[:, 7].mean())
-            T.append(bin.iloc[:, 8].mean())
-            i += 1000
+
+        bin_df = CountTable.bin_count_table(
+            merged_df, mean_columns=["A", "C", "G", "T"]
+        )
+        A = bin_df["A"]
+        C = bin_df["C"]
+        G = bin_df["G"]
+        T = bin_df["T"]
 
         # Make the plot
         x_axis = range(len(A))
@@ -534,79 +595,23 @@ class CountTable(DiskFile):
 
         table_df = self.get_pandas_df()
 
-        score_series = pd.read_csv(
-            self.file_path.parent / Path(f"{self.file_path.name[:11]}_{motif_id}.txt"),
-            header=None,
-        )
+        score_series = pd.read_csv(self.get_score_path(motif_id), header=None)
 
         score_series = score_series.iloc[:, 0]
 
         table_df["score"] = score_series
 
-        dn_comp = pd.read_csv(
-            self.file_path.parent
-            / Path(f"{self.file_path.name[:11]}_dn_composition.tsv"),
-            sep="\t",
-            index_col=False,
-        )
+        dn_comp = self.get_dn_base_composition()
 
         # Concatenating the Columns
 
         merged_df = pd.concat([table_df, dn_comp], axis=1, ignore_index=False)
         merged_df.sort_values(by="score", ascending=False, inplace=True)
-        merged_df.reset_index(drop=True, inplace=True)
-
-        # Start Binning
-
-        i = 0
-        avg_score = []
-        r0_count = []
-        r1_count = []
-        AA = []
-        AC = []
-        AG = []
-        AT = []
-        CA = []
-        CC = []
-        CG = []
-        CT = []
-        GA = []
-        GC = []
-        GG = []
-        GT = []
-        TA = []
-        TC = []
-        TG = []
-        TT = []
-
-        while (
-            i < merged_df.shape[0] - 10
-        ):  # Keeping a buffer, so that the last bin isn't super small
-            bin = merged_df.iloc[i : i + 1000,].copy()
-
-            avg_score.append(bin.iloc[:, 2].mean())
-            r0_count.append(bin.iloc[:, 0].sum())
-            r1_count.append(bin.iloc[:, 1].sum())
-            AA.append(bin.iloc[:, 5].mean())
-            AC.append(bin.iloc[:, 6].mean())
-            AG.append(bin.iloc[:, 7].mean())
-            AT.append(bin.iloc[:, 8].mean())
-            CA.append(bin.iloc[:, 9].mean())
-            CC.append(bin.iloc[:, 10].mean())
-            CG.append(bin.iloc[:, 11].mean())
-            CT.append(bin.iloc[:, 12].mean())
-            GA.append(bin.iloc[:, 13].mean())
-            GC.append(bin.iloc[:, 14].mean())
-            GG.append(bin.iloc[:, 15].mean())
-            GT.append(bin.iloc[:, 16].mean())
-            TA.append(bin.iloc[:, 17].mean())
-            TC.append(bin.iloc[:, 18].mean())
-            TG.append(bin.iloc[:, 19].mean())
-            TT.append(bin.iloc[:, 20].mean())
-            i += 1000
+
+        bin_df = CountTable.bin_count_table(merged_df, mean_columns=DINUCLEOTIDES)
 
         # Make the plot
-        x_axis = range(len(AA))
+        x_axis = range(bin_df.shape[0])
 
         # plot
         fig, ax = plt.subplots()
@@ -618,22 +623,8 @@ class CountTable(DiskFile):
             f"Di-Nucleotide composition across bins for {self.file_path.name[:11]}"
         )
 
-        ax.plot(x_axis, AA, color=cmap(0), label="AA")
-        ax.plot(x_axis, AC, color=cmap(1), label="AC")
-        ax.plot(x_axis, AG, color=cmap(2), label="AG")
-        ax.plot(x_axis, AT, color=cmap(3), label="AT")
-        ax.plot(x_axis, CA, color=cmap(4), label="CA")
-        ax.plot(x_axis, CC, color=cmap(5), label="CC")
-        ax.plot(x_axis, CG, color=cmap(6), label="CG")
-        ax.plot(x_axis, CT, color=cmap(7), label="CT")
-        ax.plot(x_axis, GA, color=cmap(8), label="GA")
-        ax.plot(x_axis, GC, color=cmap(9), label="GC")
-        ax.plot(x_axis, GG, color=cmap(10), label="GG")
-        ax.plot(x_axis, GT, color=cmap(11), label="GT")
-        ax.plot(x_axis, TA, color=cmap(12), label="TA")
-        ax.plot(x_axis, TC, color=cmap(13), label="TC")
-        ax.plot(x_axis, TG, color=cmap(14), label="TG")
-        ax.plot(x_axis, TT, color=cmap(15), label="TT")
+        for i, dinucleotide in enumerate(DINUCLEOTIDES):
+            ax.plot(x_axis, bin_df[dinucleotide], color=cmap(i), label=dinucleotide)
 
         ax.legend()
 
@@ -2,10 +2,12 @@ from __future__ import annotations
 
 from pathlib import Path
 
+from diskfiles import manifest
 from diskfiles.base import DiskFile
 from diskfiles.countTables import CountTable
 from ENCODE.base import RunType
 from ENCODE.experiment import TFChipSeq
+from ENCODE.library import Library
 
 
 class CantBuildTableFromControl(Exception):
@@ -20,6 +22,33 @@ class NoControlsFound(Exception):
     pass
 
 
+def select_control_library(
+    control_libs: list[Library], biosample: str, technical_replicate_number: int
+) -> Library:
+    """
+    The control library (R0) for a library of the experiment: the one of the same
+    biosample, then of the same technical replicate.
+    """
+    # Filtering the libraries based on Biosample # ! This doesnt work all the time
+    matching = [lib for lib in control_libs if lib.biosample == biosample]
+    if len(matching) == 0:
+        # Incase all the libraries got filtered out in the previous step.
+        matching = control_libs
+    # If more than one control lib then do further filtering based on technical replicate number
+    if len(matching) > 1:
+        matching = [
+            lib
+            for lib in matching
+            if lib.technical_replicate_number == technical_replicate_number
+        ]
+    # If length controls libs not equal 1, raise error
+    # if len(matching) != 1:
+    #     raise AmbiguousControls(f"Number of controls is {len(matching)}")
+    if len(matching) == 0:
+        raise NoControlsFound()
+    return matching[0]
+
+
 class SE_Fasta(DiskFile):
     def __init__(
         self,
@@ -72,58 +101,33 @@ class SE_Fasta(DiskFile):
             # Fetching the appropriate controls
             exp = TFChipSeq(self.experiment)
             control = exp.get_controls()
-            control_libs = control.get_libraries()
-            # Filtering the libraries based on Biosample # ! This doesnt work all the time
-            control_libs = list(
-                filter(
-                    lambda x: (x.biosample == self.biosample),
-                    control_libs,
-                )
+            control_lib = select_control_library(
+                control.get_libraries(),
+                self.biosample,
+                self.technical_replicate_number,
             )
-            if len(control_libs) == 0:
-                # Incase all the libraries got filtered out in the previous step.
-                control_libs = control.get_libraries()
-            # If more than one control lib then do further filtering based on technical replicate number
-            if len(control_libs) > 1:
-                control_libs = list(
-                    filter(
-                        lambda x: (
-                            x.technical_replicate_number
-                            == self.technical_replicate_number
-                        ),
-                        control_libs,
-                    )
-                )
-            # If length controls libs not equal 1, raise error
-            # if len(control_libs) != 1:
-            #     raise AmbiguousControls(f"Number of controls is {len(control_libs)}")
-            if len(control_libs) == 0:
-                raise NoControlsFound()
             # Get the files for the control lib
-            control_file = control_libs[0].get_Files()[0]
+            control_file = control_lib.get_Files()[0]
             # Path to the hypothetical fasta file
             r0 = Path(
-                f"{data_path}Control/{control.accession}/{control_libs[0].accession}/{control_file.accession}.fasta"
+                f"{data_path}Control/{control.accession}/{control_lib.accession}/{control_file.accession}.fasta"
             )
             # Creating the count table.
             cnt_tbl_path = self.file_path.parent / Path(f"{self.accession}.tsv")
-            if r0.exists():
+            if manifest.is_recorded(r0):
                 count_table = CountTable.create_from_fasta(
-                    r0, r1, cnt_tbl_path
+                    r0, r1, cnt_tbl_path, compress=True
                 )  # Returns if already exists
-                count_table.processTable()
-                count_table.zip()
                 return count_table
             else:
                 # Downlaoding all the required files
-                control_fastq = control_file.download(r0.parent)
-                control_fastq = (
-                    control_fastq.subsample()
+                control_fastq = control_file.download_subsampled(
+                    r0.parent
                 )  #! Currently happening with the defaults.
                 control_fasta = control_fastq.transform_to_fasta()
                 assert r0 == control_fasta.file_path
                 # Returning the count table
-                count_table = CountTable.create_from_fasta(r0, r1, cnt_tbl_path)
-                count_table.processTable()
-                count_table.zip()
+                count_table = CountTable.create_from_fasta(
+                    r0, r1, cnt_tbl_path, compress=True
+                )
                 return count_table
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import gzip
 import subprocess
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, BinaryIO
 
+import numpy as np
+from diskfiles import manifest
 from diskfiles.base import DiskFile
 from ENCODE.base import RunType
+from utils.sampling import sample_indices
 from utils.slurmjob import Slurmjob
 
 if TYPE_CHECKING:
@@ -19,6 +23,88 @@ if TYPE_CHECKING:
 
 # Need to clearly establish the file structure for all my downloads. (Search for library folder in the data folder)
 
+# Fastq files are read in blocks of this many (uncompressed) bytes
+BLOCK_SIZE = 1 << 24
+
+# Maps the reads and writes the fasta of the windows around them
+TRANSFORM_SCRIPT = Path(__file__).parent.parent / Path("se_processing_template.sh")
+
+
+def open_fastq(file_path: Path) -> BinaryIO:
+    "Opens a fastq file, gzipped or not, in binary mode"
+    if DiskFile.is_gz_file(file_path):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+
+def record_blocks(fastq: BinaryIO, block_size: int = BLOCK_SIZE):
+    """
+    Reads a fastq stream in blocks and yields (block, record_ends): a block of whole
+    (4 line) records and the end offset of every record in it.
+    """
+    leftover = b""
+    end_of_file = False
+    while not end_of_file:
+        data = fastq.read(block_size)
+        if not data:
+            end_of_file = True
+            # Last record without a trailing newline
+            if leftover and not leftover.endswith(b"\n"):
+                data = b"\n"
+        block = leftover + data
+        newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+        record_ends = newlines[3::4] + 1
+        if len(record_ends) == 0:
+            leftover = block
+            continue
+        cut = record_ends[-1]
+        leftover = block[cut:]
+        yield block[:cut], record_ends
+
+
+def count_reads(file_path: Path) -> int:
+    "Number of reads in a fastq file"
+    with open_fastq(file_path) as fastq:
+        return sum(len(record_ends) for _, record_ends in record_blocks(fastq))
+
+
+def write_sampled_reads(
+    source: Path | BinaryIO, indices: np.ndarray, output_path: Path
+) -> int:
+    """
+    Writes the reads at the (sorted) indices of a fastq file or stream, gzipped, to
+    output_path. Returns the number of reads written.
+    """
+    tmp_path = output_path.parent / Path(f".{output_path.name}.tmp")
+    fastq = open_fastq(source) if isinstance(source, Path) else source
+    n_written = 0
+    first_read = 0
+    try:
+        with gzip.open(tmp_path, "wb", compresslevel=6) as output_file:
+            for block, record_ends in record_blocks(fastq):
+                last_read = first_read + len(record_ends)
+                low, high = np.searchsorted(indices, [first_read, last_read])
+                record_starts = np.concatenate([[0], record_ends[:-1]])
+                output_file.write(
+                    b"".join(
+                        block[record_starts[i] : record_ends[i]]
+                        for i in indices[low:high] - first_read
+                    )
+                )
+                n_written += int(high - low)
+                first_read = last_read
+                if n_written == len(indices):
+                    break
+    except BaseException:
+        # The stream broke off, nothing half written is left
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if isinstance(source, Path):
+            fastq.close()
+    tmp_path.replace(output_path)
+    return n_written
+
 
 class SE_Fastq(DiskFile):
     """Class for SE fastq files on disk"""
@@ -63,115 +149,100 @@ class SE_Fastq(DiskFile):
         else:
             assert self.paired_end is not None and self.paired_with is not None
 
-    def subsample(self, seed: int = 42, size: int = 1000000) -> SE_Fastq:
-        """Returns a new subsampled SE_Fastq object"""
+    def subsample(
+        self, seed: int = 42, size: int = 1000000, read_count: int = None
+    ) -> SE_Fastq:
+        """
+        Returns a new subsampled SE_Fastq object, FileAcc_subsampled.fq.gz. The reads are
+        counted (unless read_count is given), size of them are drawn with the seed and then
+        written gzipped in a second pass.
+        """
         # Create path for subsampled fastq
         subsampled_fastq_file = self.file_path.parent / Path(
-            self.accession + "_subsampled.fq"
+            self.accession + "_subsampled.fq.gz"
         )
 
-        # If subsampled_fastq_file exists, then return it
-        if subsampled_fastq_file.exists():
-            return SE_Fastq(
-                subsampled_fastq_file,
-                self.accession,
-                self.platform,
-                self.read_length,
-                self.experiment,
-                self.library,
-                self.biosample,
-                self.technical_replicate_number,
-                self.biological_replicate_number,
-                self.control,
-                self.antibody,
-                self.href,
-                self.run_type,
-                self.paired_end,
-                self.paired_with,
-            )
+        # Sample the reads, unless they were already sampled the same way
+        params = {"seed": seed, "size": size}
+        if not manifest.is_current(subsampled_fastq_file, [self.file_path], params):
+            if read_count is None:
+                read_count = count_reads(self.file_path)
+            indices = sample_indices(read_count, size, seed)
+            inputs = manifest.fingerprints([self.file_path])
+            write_sampled_reads(self.file_path, indices, subsampled_fastq_file)
+            manifest.record(subsampled_fastq_file, inputs, params)
 
-        # Otherwise, call seqtk to subsample
-        else:
-            with open(subsampled_fastq_file, "w") as output_file:
-                subprocess.run(
-                    ["seqtk", "sample", f"-s{seed}", str(self.file_path), str(size)],
-                    stdout=output_file,
-                )
+        return self._with_file_path(subsampled_fastq_file)
 
-            return SE_Fastq(
-                subsampled_fastq_file,
-                self.accession,
-                self.platform,
-                self.read_length,
-                self.experiment,
-                self.library,
-                self.biosample,
-                self.technical_replicate_number,
-                self.biological_replicate_number,
-                self.control,
-                self.antibody,
-                self.href,
-                self.run_type,
-                self.paired_end,
-                self.paired_with,
-            )
+    def _with_file_path(self, file_path: Path) -> SE_Fastq:
+        "Same fastq metadata for another file on disk"
+        return SE_Fastq(
+            file_path,
+            self.accession,
+            self.platform,
+            self.read_length,
+            self.experiment,
+            self.library,
+            self.biosample,
+            self.technical_replicate_number,
+            self.biological_replicate_number,
+            self.control,
+            self.antibody,
+            self.href,
+            self.run_type,
+            self.paired_end,
+            self.paired_with,
+        )
 
     def transform_to_fasta(
         self,
-        transform_script: Path =  Path(__file__).parent.parent /  Path("se_processing_template.sh"),
+        transform_script: Path = TRANSFORM_SCRIPT,
     ) -> SE_Fasta:
         """Tranfrom fastq to fasta for now. FileAcc.fasta"""
         from diskfiles.fasta import SE_Fasta
 
-        # If exists then return
+        # If it was already made from this fastq with this script then return it
         fasta_file = self.file_path.parent / Path(self.accession + ".fasta")
-        if fasta_file.exists():
-            return SE_Fasta(
-                fasta_file,
-                self.accession,
-                self.platform,
-                self.read_length,
-                self.experiment,
-                self.library,
-                self.biosample,
-                self.technical_replicate_number,
-                self.biological_replicate_number,
-                self.control,
-                self.antibody,
-                self.href,
-                self.run_type,
-                self.paired_end,
-                self.paired_with,
-            )
-        else:
+        inputs = [self.file_path, transform_script]
+        if not manifest.is_current(fasta_file, inputs):
+            # The script can delete the fastq, so it's fingerprinted first
+            inputs = manifest.fingerprints(inputs)
             # In my use case, it should produce a fasta file in the same directory.
-            subprocess.run([str(transform_script), str(self.file_path)])
-            return SE_Fasta(
-                fasta_file,
-                self.accession,
-                self.platform,
-                self.read_length,
-                self.experiment,
-                self.library,
-                self.biosample,
-                self.technical_replicate_number,
-                self.biological_replicate_number,
-                self.control,
-                self.antibody,
-                self.href,
-                self.run_type,
-                self.paired_end,
-                self.paired_with,
-            )
+            # A failed script can leave a partial fasta, which must not be recorded.
+            subprocess.run([str(transform_script), str(self.file_path)], check=True)
+            if fasta_file.exists():
+                manifest.record(fasta_file, inputs)
+        return SE_Fasta(
+            fasta_file,
+            self.accession,
+            self.platform,
+            self.read_length,
+            self.experiment,
+            self.library,
+            self.biosample,
+            self.technical_replicate_number,
+            self.biological_replicate_number,
+            self.control,
+            self.antibody,
+            self.href,
+            self.run_type,
+            self.paired_end,
+            self.paired_with,
+        )
 
-    def slurm_transform_to_fasta(  # ! Need to implement this properly. Wait for the slurm job to finish.
+    def slurm_transform_to_fasta(
         self,
-        transform_script: Path = Path(__file__).parent.parent /  Path("se_processing_template.sh"),
-    ) -> SE_Fasta:
+        transform_script: Path = TRANSFORM_SCRIPT,
+    ) -> str:
+        """
+        Submits the transform job, returns its id (None if the fasta is up to date).
+        ledger.wait waits for it, and resubmits it if it failed.
+        """
         # Create slurm job file
         fasta_file = self.file_path.parent / Path(self.accession + ".fasta")
-        if fasta_file.exists():
-            return
+        inputs = [self.file_path, transform_script]
+        if manifest.is_current(fasta_file, inputs):
+            return None
         else:
             slurm_file_path = self.file_path.parent / Path(
                 f"{self.accession}_transfrom.job"
@@ -182,9 +253,11 @@ class SE_Fastq(DiskFile):
                 job_script=transform_script,
                 job_params=(str(self.file_path),),
                 output=f"{self.accession}_transfrom",
+                # Records the fasta once the job made it
+                post_command=manifest.record_command(fasta_file, inputs),
             )
             slurm_job.create_file()
-            slurm_job.submitJob()
+            return slurm_job.submitJob()
 
     def download(self):
         """Downloads file again if deleted."""
@@ -200,6 +273,38 @@ class SE_Fastq(DiskFile):
 
 
 # This can be implement as a tuple of SE_Fastq objects.
+def slurm_transform_to_fasta_array(
+    fastqs: list[SE_Fastq],
+    file_path: Path,
+    transform_script: Path = TRANSFORM_SCRIPT,
+) -> str:
+    """
+    Submits one job array transforming the fastqs whose fasta isn't up to date, one task
+    per fastq, instead of a job per fastq. Each task records its fasta once it made it.
+    Returns the id of the job array (None if every fasta is up to date).
+    """
+    array_params, post_commands = [], []
+    for fastq in fastqs:
+        fasta_file = fastq.file_path.parent / Path(fastq.accession + ".fasta")
+        inputs = [fastq.file_path, transform_script]
+        if not manifest.is_current(fasta_file, inputs):
+            array_params.append((fastq.file_path,))
+            post_commands.append(manifest.record_command(fasta_file, inputs))
+    if not array_params:
+        return None
+
+    slurm_job = Slurmjob(
+        file_path=file_path,
+        job_name=file_path.stem,
+        job_script=transform_script,
+        job_params=(),
+        output=file_path.stem,
+        array_params=array_params,
+        post_command=post_commands,
+    )
+    return slurm_job.submitJob()
+
+
 class PE_Fastq:
     """Class for PE fastq files on disk"""
 
@@ -216,12 +321,30 @@ class PE_Fastq:
         self.r2.delete()
 
     def subsample(self, seed=42, size=1000000):  # For now let's keep seed 42
-        """Returns subsampled fastq object"""
-
-        subsampled_read1 = self.r1.subsample(seed=seed, size=size)
-        subsampled_read2 = self.r2.subsample(seed=seed, size=size)
+        """
+        Returns subsampled fastq object. The same reads are drawn from both mates, so the
+        pairs stay in sync.
+        """
+        subsampled_files = [
+            fastq.file_path.parent / Path(fastq.accession + "_subsampled.fq.gz")
+            for fastq in (self.r1, self.r2)
+        ]
+        inputs = [self.r1.file_path, self.r2.file_path]
+        params = {"seed": seed, "size": size}
+        if not all(
+            manifest.is_current(file_path, inputs, params)
+            for file_path in subsampled_files
+        ):
+            indices = sample_indices(count_reads(self.r1.file_path), size, seed)
+            fingerprints = manifest.fingerprints(inputs)
+            for fastq, file_path in zip((self.r1, self.r2), subsampled_files):
+                write_sampled_reads(fastq.file_path, indices, file_path)
+                manifest.record(file_path, fingerprints, params)
 
-        return PE_Fastq(subsampled_read1, subsampled_read2)
+        return PE_Fastq(
+            self.r1._with_file_path(subsampled_files[0]),
+            self.r2._with_file_path(subsampled_files[1]),
+        )
 
     def transform(self, transform_script: Path):
         # In my use case, it should produce a fasta file in the same directory.
@@ -0,0 +1,151 @@
+"""
+Manifests of the files the pipeline creates. A manifest (.{name}.manifest.json, next to the
+file) records the fingerprints of the inputs and the parameters the file was made with, and is
+only written once the file is complete. A stage skips its work when its output has a manifest
+matching its current inputs and parameters, and redoes it otherwise: after a crash (no
+manifest), or when an input or a parameter changed.
+
+The fingerprint of a file with a manifest is the key of its manifest, so a change propagates
+down the pipeline. Other files are fingerprinted by their content (small files, like scripts)
+or by their size and modification time.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shlex
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+# Files up to this size are fingerprinted by their content
+CONTENT_HASH_SIZE = 1024 * 1024
+
+
+def get_manifest_path(file_path: Path) -> Path:
+    "Path of the manifest of file_path"
+    return file_path.parent / Path(f".{file_path.name}.manifest.json")
+
+
+def read_manifest(file_path: Path) -> dict:
+    "The manifest of file_path, or None if it has none"
+    try:
+        with open(get_manifest_path(file_path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def fingerprint(file_path: Path) -> str:
+    "Fingerprint of an input file, changes whenever the file does"
+    manifest = read_manifest(file_path)
+    if manifest is not None and file_path.exists():
+        return manifest["key"]
+    stat = file_path.stat()
+    if stat.st_size <= CONTENT_HASH_SIZE:
+        return hashlib.sha256(file_path.read_bytes()).hexdigest()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _key(inputs: dict[str, str], params: dict) -> str:
+    return hashlib.sha256(
+        json.dumps([inputs, params], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def is_current(file_path: Path, inputs: list[Path] = (), params: dict = None) -> bool:
+    """
+    True if file_path was completed (recorded) from the same inputs and params. Inputs that
+    no longer exist (deleted intermediates) are taken to be unchanged.
+    """
+    manifest = read_manifest(file_path)
+    if manifest is None or not file_path.exists():
+        return False
+    if manifest["params"] != json.loads(json.dumps(params or {}, default=str)):
+        return False
+    for input_path in inputs:
+        recorded = manifest["inputs"].get(Path(input_path).name)
+        if recorded is None:
+            return False
+        if Path(input_path).exists() and fingerprint(Path(input_path)) != recorded:
+            return False
+    return True
+
+
+def is_recorded(file_path: Path) -> bool:
+    "True if file_path exists and was completed, whatever it was made from"
+    return file_path.exists() and read_manifest(file_path) is not None
+
+
+def fingerprints(inputs: list[Path]) -> dict[str, str]:
+    "{file name: fingerprint} of the inputs, for record"
+    return {
+        Path(input_path).name: fingerprint(Path(input_path)) for input_path in inputs
+    }
+
+
+def record(
+    file_path: Path, inputs: list[Path] | dict[str, str] = (), params: dict = None
+) -> str:
+    """
+    Writes the manifest of the (complete) file_path, made from inputs with params. Inputs
+    that a stage deletes are given as their fingerprints, taken before the stage ran.
+    Returns the key of the manifest, the fingerprint of file_path for the next stages.
+    """
+    if not isinstance(inputs, dict):
+        inputs = fingerprints(inputs)
+    params = json.loads(json.dumps(params or {}, default=str))
+    manifest = {"key": _key(inputs, params), "inputs": inputs, "params": params}
+    # Written to a temporary file first so readers never see half a manifest
+    manifest_path = get_manifest_path(file_path)
+    tmp_path = manifest_path.parent / Path(f"{manifest_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    tmp_path.replace(manifest_path)
+    return manifest["key"]
+
+
+def record_command(
+    file_path: Path, inputs: list[Path] = (), params: dict = None
+) -> str:
+    """
+    Shell command recording the manifest of file_path, for stages that run outside of python
+    (slurm jobs). The fingerprints of the inputs are taken now.
+    """
+    return shlex.join(
+        [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            str(file_path),
+            "--inputs",
+            json.dumps(fingerprints(inputs)),
+            "--params",
+            json.dumps(params or {}, default=str),
+        ]
+    )
+
+
+def forget(file_path: Path) -> None:
+    "Removes the manifest of file_path, so it's made again"
+    get_manifest_path(file_path).unlink(missing_ok=True)
+
+
+def move(file_path: Path, new_path: Path) -> None:
+    "Moves the manifest of file_path, after file_path was renamed (or (un)zipped) to new_path"
+    if get_manifest_path(file_path).exists():
+        get_manifest_path(file_path).replace(get_manifest_path(new_path))
+
+
+if __name__ == "__main__":
+    # See record_command
+    parser = ArgumentParser()
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--inputs", type=json.loads, default={})
+    parser.add_argument("--params", type=json.loads, default={})
+    args = parser.parse_args()
+
+    if not args.output.exists():
+        sys.exit(f"{args.output} does not exist")
+    record(args.output, args.inputs, args.params)
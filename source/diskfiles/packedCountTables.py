@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from diskfiles.countTables import CountTable
+
+import gzip
+
+import numpy as np
+import pandas as pd
+from diskfiles.base import DiskFile
+from utils.encoding import (
+    decode_sequences,
+    encode_sequences,
+    group_by_length,
+    pack_2bit,
+    unpack_2bit,
+)
+
+# Layout of a packed count table (.pct), all little endian:
+#   64 byte header
+#   probes  (n_probes, bytes_per_probe) uint8, 2 bit packed, padded to probe_length
+#   lengths (n_probes,) uint16, actual length of each probe
+#   r0      (n_probes,) uint32
+#   r1      (n_probes,) uint32
+# Every section starts on an 8 byte boundary.
+MAGIC = b"SXGPCT"
+VERSION = 1
+HEADER = np.dtype(
+    [
+        ("magic", "S6"),
+        ("version", "<u2"),
+        ("n_probes", "<u8"),
+        ("probe_length", "<u4"),
+        ("bytes_per_probe", "<u4"),
+    ]
+)
+HEADER_SIZE = 64
+
+
+class NotAPackedCountTable(Exception):
+    pass
+
+
+def _align(offset: int) -> int:
+    return -(-offset // 8) * 8
+
+
+def _section_offsets(n_probes: int, bytes_per_probe: int) -> dict[str, int]:
+    "Byte offset of every section of the file"
+    offsets = {"probes": HEADER_SIZE}
+    offsets["lengths"] = _align(offsets["probes"] + n_probes * bytes_per_probe)
+    offsets["r0"] = _align(offsets["lengths"] + n_probes * 2)
+    offsets["r1"] = _align(offsets["r0"] + n_probes * 4)
+    offsets["end"] = offsets["r1"] + n_probes * 4
+    return offsets
+
+
+class PackedCountTable(DiskFile):
+    """
+    Class for a binary count table (.pct file) on disk. Probes are 2 bit packed and the
+    counts are uint32 columns. All columns are memory mapped, nothing is read upfront.
+    """
+
+    def __init__(self, file_path: Path):
+        super().__init__(file_path)
+
+        header = np.fromfile(self.file_path, dtype=HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise NotAPackedCountTable(f"{self.file_path} is not a packed count table.")
+        if header["version"][0] != VERSION:
+            raise NotAPackedCountTable(
+                f"Unsupported packed count table version {header['version'][0]}"
+            )
+
+        self.n_probes = int(header["n_probes"][0])
+        self.probe_length = int(header["probe_length"][0])
+        self.bytes_per_probe = int(header["bytes_per_probe"][0])
+
+        offsets = _section_offsets(self.n_probes, self.bytes_per_probe)
+        self.probes = self._memmap(
+            np.uint8, offsets["probes"], (self.n_probes, self.bytes_per_probe)
+        )
+        self.lengths = self._memmap("<u2", offsets["lengths"], (self.n_probes,))
+        self.r0 = self._memmap("<u4", offsets["r0"], (self.n_probes,))
+        self.r1 = self._memmap("<u4", offsets["r1"], (self.n_probes,))
+
+    def _memmap(self, dtype, offset: int, shape: tuple) -> np.ndarray:
+        # np.memmap can't map zero bytes
+        if self.n_probes == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(
+            self.file_path, dtype=dtype, mode="r", offset=offset, shape=shape
+        )
+
+    @classmethod
+    def create_from_count_table(
+        cls, count_table: CountTable, file_path: Path = None
+    ) -> PackedCountTable:
+        """
+        Packs a (processed, ACGT only) count table. By default the packed table is saved
+        next to the count table as FileAcc.pct.
+        """
+        if file_path is None:
+            file_path = count_table.file_path.parent / Path(
+                f"{count_table.file_path.name[:11]}.pct"
+            )
+        df = count_table.get_pandas_df()
+        return cls.create_from_arrays(
+            file_path,
+            list(df["seq"]),
+            df["r0"].to_numpy(),
+            df["r1"].to_numpy(),
+        )
+
+    @classmethod
+    def create_from_arrays(
+        cls, file_path: Path, seqs: list[str], r0: np.ndarray, r1: np.ndarray
+    ) -> PackedCountTable:
+        """Writes a packed count table from the probes and their counts."""
+        n_probes = len(seqs)
+        probe_length = max((len(seq) for seq in seqs), default=0)
+        bytes_per_probe = -(-probe_length // 4)
+
+        # Shorter probes are padded with A. Their length is kept in the lengths column
+        codes = np.zeros((n_probes, probe_length), dtype=np.uint8)
+        for length, indices in group_by_length(seqs).items():
+            codes[indices, :length] = encode_sequences([seqs[i] for i in indices])
+        try:
+            packed = pack_2bit(codes)
+        except ValueError:
+            raise ValueError(
+                "Count table must only contain ACGT probes. Process it first."
+            )
+
+        header = np.zeros(1, dtype=HEADER)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["n_probes"] = n_probes
+        header["probe_length"] = probe_length
+        header["bytes_per_probe"] = bytes_per_probe
+
+        offsets = _section_offsets(n_probes, bytes_per_probe)
+        sections = [
+            ("probes", packed),
+            (
+                "lengths",
+                np.fromiter((len(seq) for seq in seqs), dtype="<u2", count=n_probes),
+            ),
+            ("r0", np.asarray(r0, dtype="<u4")),
+            ("r1", np.asarray(r1, dtype="<u4")),
+        ]
+
+        file_path.parent.mkdir(exist_ok=True, parents=True)
+        with open(file_path, "wb") as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+            for name, array in sections:
+                f.write(b"\0" * (offsets[name] - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+
+        return cls(file_path)
+
+    def get_codes(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Unpacks probes [start, stop) to a (n, probe_length) array of base codes."""
+        return unpack_2bit(self.probes[start:stop], self.probe_length)
+
+    def get_seqs(self, start: int = 0, stop: int = None) -> list[str]:
+        """Probes [start, stop) as strings"""
+        seqs = decode_sequences(self.get_codes(start, stop))
+        lengths = self.lengths[start:stop]
+        if (lengths == self.probe_length).all():
+            return seqs
+        return [seq[:length] for seq, length in zip(seqs, lengths)]
+
+    def get_pandas_df(self) -> pd.DataFrame:
+        """Same dataframe as CountTable.get_pandas_df"""
+        return pd.DataFrame(
+            {
+                "seq": self.get_seqs(),
+                "r0": np.asarray(self.r0, dtype=np.int64),
+                "r1": np.asarray(self.r1, dtype=np.int64),
+            }
+        )
+
+    def to_count_table(self, count_table_path: Path) -> CountTable:
+        """Writes the table back as a gzipped tsv (seq r0 r1) count table."""
+        from diskfiles.countTables import CountTable
+
+        if count_table_path.suffix != ".gz":
+            count_table_path = Path(str(count_table_path) + ".gz")
+        count_table_path.parent.mkdir(exist_ok=True, parents=True)
+        with gzip.open(count_table_path, "wt") as f:
+            self.get_pandas_df().to_csv(f, sep="\t", header=False, index=False)
+
+        return CountTable(count_table_path)
@@ -2,18 +2,27 @@
 
 from __future__ import annotations
 
+import json
+import math
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ENCODE.search import EncodeSearch
 
-import math
+from functools import cached_property
 
 import numpy as np
 import pandas as pd
 from motifs.base import Motif
-from motifs.parse_motifcentral_json import MOTIFCENTRAL
+from motifs.scoring import (
+    binding_mode_scores,
+    consensus_matrix,
+    psam_to_matrix,
+    summed_affinity,
+)
+from utils import packing
+from utils.encoding import encode_sequences, group_by_length
 from utils.slurmjob import Slurmjob
 
 # Add methods to get all the ENCODE files for a particular TF (not necessarily same) (Use the ENCODESearch Object)
@@ -69,37 +78,53 @@ class Mononucleotide(Motif):
 
         return score
 
+    @cached_property
+    def matrix(self) -> np.ndarray:
+        """Mean centered (5, motif_size) scoring matrix. Rows are A, C, G, T and N."""
+        return psam_to_matrix(self.psam, mean_centered=True)
+
+    @cached_property
+    def standard_matrix(self) -> np.ndarray:
+        """(5, motif_size) scoring matrix of the psam as is. Not mean centered."""
+        return psam_to_matrix(self.psam, mean_centered=False)
+
+    @cached_property
+    def consensus_matrix(self) -> np.ndarray:
+        """(5, motif_size) matrix of the ProBoundTools consensus model with N scoring."""
+        return consensus_matrix(self.psam)
+
+    def score_seqs(self, seqs: list[str], mean_centered: bool = True) -> np.ndarray:
+        """
+        Scores a batch of sequences. Same result as score_seq on every sequence, but the
+        probes are one-hot encoded and all windows (both strands) are scored at once.
+        Non ACGT bases score 0.
+        """
+        matrix = self.matrix if mean_centered else self.standard_matrix
+        scores = np.zeros(len(seqs))
+        # Sequences of different lengths can't share an array
+        for indices in group_by_length(seqs).values():
+            codes = encode_sequences([seqs[i] for i in indices])
+            scores[indices] = summed_affinity(codes, matrix)
+        return scores
+
+    def binding_mode_scores(self, seqs: list[str]) -> np.ndarray:
+        """
+        Scores a batch of sequences, same scores as ProBoundTools
+        loadMotifCentralModel(fit_id).buildConsensusModel().addNScoring().bindingModeScores()
+        """
+        scores = np.zeros(len(seqs))
+        for indices in group_by_length(seqs).values():
+            codes = encode_sequences([seqs[i] for i in indices])
+            scores[indices] = binding_mode_scores(codes, self.consensus_matrix)
+        return scores
+
     def score_seq(self, seq: str):
         # Scores a sequence. Assert sequence lenght > motif lenght
-        motif_size = int(len(self.psam) / 4)
-        mean_adjusted_psam = []
-        for i in range(0, len(self.psam), 4):
-            mean_adjusted_psam += list(
-                np.array(self.psam[i : i + 4]) - np.array(self.psam[i : i + 4]).mean()
-            )
-
-        numpy_motif = np.array(mean_adjusted_psam).reshape(4, motif_size, order="F")
-
-        score = 0
-        for i in range(0, len(seq) - 2):
-            score += math.exp(
-                Mononucleotide.score_window(numpy_motif, seq[i : i + motif_size])
-            )
-
-        return score
+        return float(self.score_seqs([seq])[0])
 
     def score_seq_standard(self, seq: str):
         # Scores a sequence. Assert sequence lenght > motif lenght. Not mean centered.
-        motif_size = int(len(self.psam) / 4)
-        numpy_motif = np.array(self.psam).reshape(4, motif_size, order="F")
-
-        score = 0
-        for i in range(0, len(seq) - 2):
-            score += math.exp(
-                Mononucleotide.score_window(numpy_motif, seq[i : i + motif_size])
-            )
-
-        return score
+        return float(self.score_seqs([seq], mean_centered=False)[0])
 
     def score_random_kmers(
         self,
@@ -110,7 +135,7 @@ class Mononucleotide(Motif):
         """Get the average score and score distribution of the motif scored against data/random_sequences.csv"""
         df = pd.read_csv(data, header=None, index_col=False)
         df.columns = ["seq"]
-        df["score"] = df["seq"].apply(lambda x: self.score_seq(x))
+        df["score"] = self.score_seqs(list(df["seq"]))
         # print(df["score"].mean())
         print(df)
         ax = df["score"].hist()
@@ -124,36 +149,73 @@ class Mononucleotide(Motif):
         self,
         searchResult: EncodeSearch,
         data_path: str = "/burg/home/hg2604/hblab/Projects/Selex-X-Genome/data/",
-    ):
+        target_hours: float = 2,
+        cores: int = 8,
+    ) -> str | None:
+        """
+        Scores the motif on every experiment of the search. The experiments are packed into
+        batches of about target_hours on cores processes (from their estimated costs), run as
+        one job array with a task per batch. Returns the id of the job array, None if the
+        search has no experiments.
+        """
 
         experiments = searchResult.get_experiments()
-
-        PSAM = list([str(i) for i in self.psam])
-
-        for experiment in experiments:
-
-            # Create Slurm Job
-            job_path = Path(
-                f'{data_path}{searchResult.tf}_{searchResult.organism.replace("+","_")}/{experiment.accession}/{self.tf}_{searchResult.tf}_Score.job'
-            )
-
-            slurmjob = Slurmjob(
-                file_path=job_path,
-                job_name=f'{searchResult.tf}_{experiment.accession}_{searchResult.organism.replace("+","_")}',
-                job_script=Path(__file__).parent.parent
-                / Path("utils/motif_X_experiment.py"),
-                job_params=(
-                    self.tf,
-                    searchResult.tf,
-                    searchResult.organism,
-                    experiment.accession,
-                    data_path,
-                    self.fit_id,
-                    "--psam",
-                    " ".join(PSAM),
-                ),
-                output=f'{self.tf}_{searchResult.tf}_{searchResult.organism.replace("+","_")}',
-                cores=2,
-                time=8,
-            )
-            slurmjob.submitJob()
+        if not experiments:
+            return None
+
+        search_path = Path(
+            f'{data_path}{searchResult.tf}_{searchResult.organism.replace("+","_")}'
+        )
+        items = {
+            f"{search_path.name}/{experiment.accession}": {
+                "tf": self.tf,
+                "organism": searchResult.organism,
+                "psam": [float(value) for value in self.psam],
+                "fit_id": self.fit_id,
+                "search_tf": searchResult.tf,
+                "experiment": experiment.accession,
+                "data_path": data_path,
+                "key": f"{search_path.name}/{experiment.accession}",
+                "directory": str(search_path / Path(experiment.accession)),
+            }
+            for experiment in experiments
+        }
+        costs = packing.estimate_costs(
+            packing.MOTIF_X_EXPERIMENT,
+            {
+                key: packing.get_input_size(item["directory"], packing.COUNT_TABLES)
+                for key, item in items.items()
+            },
+        )
+        batches = packing.pack(costs, target_hours * 3600 * cores)
+
+        # One JSON file of items per batch, the largest items first
+        batch_dir = search_path / Path(f"{self.tf}_{searchResult.tf}_batches")
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        batch_paths = []
+        for i, batch in enumerate(batches):
+            batch_path = batch_dir / Path(f"batch_{i}.json")
+            with open(batch_path, "w") as f:
+                json.dump([items[key] for key in batch], f, indent=4)
+            batch_paths.append(batch_path)
+
+        # Minutes for the longest batch, with a margin for the estimates
+        runtime = max(
+            packing.get_runtime([costs[key] for key in batch], cores)
+            for batch in batches
+        )
+        minutes = max(1, math.ceil(1.5 * runtime / 60))
+
+        slurmjob = Slurmjob(
+            file_path=search_path / Path(f"{self.tf}_{searchResult.tf}_Score.job"),
+            job_name=f'{searchResult.tf}_{self.tf}_{searchResult.organism.replace("+","_")}',
+            job_script=Path(__file__).parent.parent / Path("utils/motif_X_batch.py"),
+            job_params=(),
+            array_params=[(batch_path,) for batch_path in batch_paths],
+            output=f'{self.tf}_{searchResult.tf}_{searchResult.organism.replace("+","_")}',
+            cores=cores,
+            minutes=minutes,
+            # Each process scores one count table at a time
+            memory=f"{4 * cores}G",
+        )
+        return slurmjob.submitJob()
@@ -0,0 +1,148 @@
+"""Vectorized PSAM scoring of encoded probes. See utils/encoding.py for the encoding."""
+
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from utils.encoding import one_hot_encode
+
+# Complement of each base code (A<->T, C<->G, N<->N)
+COMPLEMENT = np.array([3, 2, 1, 0, 4])
+
+
+def psam_to_matrix(psam: list, mean_centered: bool = True) -> np.ndarray:
+    """
+    Reshapes a flat motifcentral psam ([A1, C1, G1, T1, A2, ...]) to a (5, motif_size) matrix.
+    Rows are A, C, G, T and N. N scores 0.
+    """
+    motif_size = int(len(psam) / 4)
+    matrix = np.zeros((5, motif_size))
+    matrix[:4] = np.array(psam, dtype=np.float64).reshape(4, motif_size, order="F")
+    if mean_centered:
+        matrix[:4] -= matrix[:4].mean(axis=0)
+    return matrix
+
+
+def both_strand_kernel(matrix: np.ndarray) -> np.ndarray:
+    """
+    Folds the reverse complement into the matrix. Scoring a window with the kernel is the same
+    as scoring the window and its reverse complement with the matrix and adding the two.
+    """
+    return matrix + matrix[COMPLEMENT, ::-1]
+
+
+def _diagonal_sums(per_base: np.ndarray, motif_size: int) -> np.ndarray:
+    """
+    Window scores from per_base[probe, position, motif position], the score of every base at
+    every motif position. The window starting at i is the sum of the diagonal starting at (i, 0).
+    """
+    n_windows = max(per_base.shape[1] - motif_size + 1, 0)
+    strides = per_base.strides
+    diagonals = as_strided(
+        per_base,
+        shape=(per_base.shape[0], n_windows, motif_size),
+        strides=(strides[0], strides[1], strides[1] + strides[2]),
+        writeable=False,
+    )
+    return diagonals.sum(axis=-1)
+
+
+def window_scores(
+    codes: np.ndarray, kernel: np.ndarray, chunk_size: int = 2048
+) -> np.ndarray:
+    """
+    Scores every full window of the encoded probes with the kernel.
+    Returns a (n_probes, probe_length - motif_size + 1) array.
+
+    Each chunk of probes is one-hot encoded and multiplied with the kernel, giving the score of
+    every base at every motif position. The window scores are the diagonals of that product.
+    """
+    n_probes, probe_length = codes.shape
+    motif_size = kernel.shape[1]
+    n_windows = max(probe_length - motif_size + 1, 0)
+    scores = np.zeros((n_probes, n_windows))
+    if n_windows == 0:
+        return scores
+
+    for start in range(0, n_probes, chunk_size):
+        per_base = np.matmul(one_hot_encode(codes[start : start + chunk_size]), kernel)
+        scores[start : start + chunk_size] = _diagonal_sums(per_base, motif_size)
+
+    return scores
+
+
+def truncated_window_scores(codes: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Scores the windows used by Mononucleotide.score_seq: one window at every position but the
+    last two, where the windows running off the end of the probe are truncated and scored
+    against the first columns of the motif. Both strands are added. Returns (n_probes, probe_length - 2).
+    """
+    n_probes, probe_length = codes.shape
+    motif_size = matrix.shape[1]
+    n_windows = max(probe_length - 2, 0)
+    n_full = max(min(probe_length - motif_size + 1, n_windows), 0)
+
+    scores = np.zeros((n_probes, n_windows))
+    scores[:, :n_full] = window_scores(codes, both_strand_kernel(matrix))[:, :n_full]
+
+    # Truncated windows at the end of the probe, one width at a time
+    for i in range(n_full, n_windows):
+        width = probe_length - i
+        kernel = both_strand_kernel(matrix[:, :width])
+        for j in range(width):
+            scores[:, i] += kernel[codes[:, i + j], j]
+
+    return scores
+
+
+def summed_affinity(codes: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Sum of exp(window score) over the windows of truncated_window_scores, per probe."""
+    return np.exp(truncated_window_scores(codes, matrix)).sum(axis=1)
+
+
+def consensus_matrix(psam: list) -> np.ndarray:
+    """
+    (5, motif_size) matrix of the ProBoundTools consensus model with N scoring, i.e.
+    loadMotifCentralModel(fit_id).buildConsensusModel().addNScoring().
+    Every column is shifted so the consensus base scores 0, and N scores the column mean.
+    """
+    matrix = psam_to_matrix(psam, mean_centered=False)
+    matrix[:4] -= matrix[:4].max(axis=0)
+    matrix[4] = matrix[:4].mean(axis=0)
+    return matrix
+
+
+def binding_mode_scores(codes: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Binding mode score of every probe, as written by ProBoundTools bindingModeScores:
+    the summed affinity, exp(window score) summed over every full window on both strands.
+    """
+    return binding_mode_score_matrix(codes, [matrix])[:, 0]
+
+
+def binding_mode_score_matrix(
+    codes: np.ndarray, matrices: list[np.ndarray], chunk_size: int = 2048
+) -> np.ndarray:
+    """
+    Binding mode scores of every probe for several motifs. Returns (n_probes, n_motifs).
+    The matrices of all motifs and their reverse complements are stacked, so every chunk of
+    probes is one-hot encoded and multiplied once for all the motifs and both strands.
+    Each strand is exponentiated on its own, so unlike both_strand_kernel they aren't folded.
+    """
+    # Forward and reverse complement of every motif
+    strands = [
+        strand for matrix in matrices for strand in (matrix, matrix[COMPLEMENT, ::-1])
+    ]
+    motif_sizes = [strand.shape[1] for strand in strands]
+    offsets = np.cumsum([0] + motif_sizes)
+    stacked = np.concatenate(strands, axis=1) if strands else np.zeros((5, 0))
+
+    scores = np.zeros((codes.shape[0], len(matrices)))
+    for start in range(0, codes.shape[0], chunk_size):
+        per_base = np.matmul(one_hot_encode(codes[start : start + chunk_size]), stacked)
+        for i, motif_size in enumerate(motif_sizes):
+            scores[start : start + chunk_size, i // 2] += np.exp(
+                _diagonal_sums(per_base[:, :, offsets[i] : offsets[i + 1]], motif_size)
+            ).sum(axis=1)
+
+    return scores
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Fails (without a fasta to record) as soon as a step does
+set -euo pipefail
+
 BWT_INDEX=/burg/hblab/users/hg2604/Remap/Human/GRCh38_noalt_BWT_index/GRCh38_noalt_as
 REFERENCE=/burg/hblab/users/hg2604/Projects/Selex-X-Genome/data/genomes/GRCh38/GCA_000001405.15_GRCh38_no_alt_analysis_set.fna
 
@@ -31,5 +34,4 @@ rm "$currentdr"/"$stemname".bed
 rm "$currentdr"/pr"$stemname".bed
 rm "$currentdr"/"$stemname".bam
 rm "$currentdr"/"$stemname"_sorted.bam
-rm "$currentdr"/"$stemname".fastq.gz
 #rm "$fastq_file"
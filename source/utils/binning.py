@@ -0,0 +1,124 @@
+"""
+Binning of score sorted count tables. Bins are (start, end) row ranges over the sorted arrays,
+and every bin statistic is a difference of cumulative sums, so nothing is copied per bin.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def sort_by_score(scores: np.ndarray) -> np.ndarray:
+    """Indices that sort the scores from highest to lowest."""
+    return np.argsort(-np.asarray(scores), kind="stable")
+
+
+def size_bins(
+    n_rows: int, bin_size: int = 1000, buffer: int = 10
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Consecutive bins of bin_size rows. The last (partial) bin has to start more than buffer rows
+    before the end, so that it isn't super small.
+    """
+    starts = np.arange(0, max(n_rows - buffer, 0), bin_size)
+    ends = np.minimum(starts + bin_size, n_rows)
+    return starts, ends
+
+
+def quantile_bins(n_rows: int, n_bins: int = 100) -> tuple[np.ndarray, np.ndarray]:
+    """n_bins bins with (almost) the same number of rows."""
+    edges = np.linspace(0, n_rows, min(n_bins, n_rows) + 1).round().astype(np.int64)
+    return edges[:-1], edges[1:]
+
+
+def score_width_bins(
+    sorted_scores: np.ndarray, n_bins: int = 100
+) -> tuple[np.ndarray, np.ndarray]:
+    """n_bins bins spanning the same score range each. Scores must be sorted high to low."""
+    sorted_scores = np.asarray(sorted_scores)
+    if len(sorted_scores) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    thresholds = np.linspace(sorted_scores[0], sorted_scores[-1], n_bins + 1)[1:-1]
+    # Rows with a score >= threshold come before the edge
+    edges = np.searchsorted(-sorted_scores, -thresholds, side="right")
+    edges = np.concatenate([[0], edges, [len(sorted_scores)]])
+    return edges[:-1], edges[1:]
+
+
+def make_bins(
+    sorted_scores: np.ndarray,
+    method: str = "size",
+    bin_size: int = 1000,
+    n_bins: int = 100,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Bins of a score sorted table. method is one of size, quantile or score_width."""
+    if method == "size":
+        return size_bins(len(sorted_scores), bin_size)
+    elif method == "quantile":
+        return quantile_bins(len(sorted_scores), n_bins)
+    elif method == "score_width":
+        return score_width_bins(sorted_scores, n_bins)
+    else:
+        raise ValueError(f"Unknown binning method {method}")
+
+
+def bin_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Sum of values in every bin"""
+    values = np.asarray(values)
+    dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+    cumulative = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=cumulative[1:])
+    return cumulative[ends] - cumulative[starts]
+
+
+def bin_means(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Mean of values in every bin. Empty bins are NaN."""
+    sizes = (ends - starts).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return bin_sums(np.asarray(values, dtype=np.float64), starts, ends) / sizes
+
+
+def bin_statistics(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    means: dict[str, np.ndarray] = None,
+    sums: dict[str, np.ndarray] = None,
+) -> pd.DataFrame:
+    """One row per bin: the mean of every array in means and the sum of every array in sums."""
+    columns = {}
+    for name, values in (means or {}).items():
+        columns[name] = bin_means(values, starts, ends)
+    for name, values in (sums or {}).items():
+        columns[name] = bin_sums(values, starts, ends)
+    return pd.DataFrame(columns)
+
+
+def top_bin_enrichment(
+    sorted_r0: np.ndarray,
+    sorted_r1: np.ndarray,
+    min_bin_size: int = 500,
+    pseudocount_r0: float = 1,
+    pseudocount_r1: float = 1,
+    n_samples: int = None,
+) -> pd.DataFrame:
+    """
+    Enrichment (R1 / R0, with pseudocounts) of the top bin for every top bin size from
+    min_bin_size to all rows. The counts must be sorted by score (high to low).
+    With n_samples, only that many log spaced bin sizes are returned.
+    """
+    n_rows = len(sorted_r0)
+    min_bin_size = max(min_bin_size, 1)
+    if n_rows < min_bin_size:
+        return pd.DataFrame({"bin_size": [], "enrichment": []})
+
+    if n_samples is None:
+        bin_sizes = np.arange(min_bin_size, n_rows + 1)
+    else:
+        bin_sizes = np.unique(
+            np.geomspace(min_bin_size, n_rows, n_samples).round().astype(np.int64)
+        )
+
+    r0 = np.cumsum(sorted_r0, dtype=np.float64)[bin_sizes - 1] + pseudocount_r0
+    r1 = np.cumsum(sorted_r1, dtype=np.float64)[bin_sizes - 1] + pseudocount_r1
+    return pd.DataFrame({"bin_size": bin_sizes, "enrichment": r1 / r0})
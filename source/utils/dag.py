@@ -0,0 +1,142 @@
+"""
+Runs a DAG of tasks. A task runs as soon as the tasks it's after all succeeded, with their
+results as its last arguments, in a pool of threads (for downloads, subprocesses, ENCODE
+requests) or a pool of processes for CPU bound tasks (cpu=True, their function and
+arguments must be picklable). Tasks can add tasks while they run, e.g. one per experiment
+found. A failed task fails the tasks after it, the others carry on.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+class DependencyFailed(Exception):
+    "Error of the tasks that didn't run because a task they were after failed"
+
+    pass
+
+
+class Task:
+    def __init__(self, name: str, function, args: tuple, after: tuple[str], cpu: bool):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.after = after
+        self.cpu = cpu
+        # Seconds it ran
+        self.elapsed = None
+
+
+class DAG:
+    """
+    Tasks by name, see the module docstring. threads and processes are the sizes of the
+    pools (processes defaults to the number of cores). initializer(*initargs) runs in every
+    process of the pool, e.g. database.attach_writer.
+    """
+
+    def __init__(
+        self,
+        threads: int = 16,
+        processes: int = None,
+        initializer=None,
+        initargs: tuple = (),
+    ):
+        self.threads = threads
+        self.processes = processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.tasks = {}
+        self.results = {}
+        self.errors = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, function, *args, after: list[str] = (), cpu=False) -> str:
+        """
+        Adds the task function(*args, *results of after) named name, unless there is one
+        already, so tasks shared by others (e.g. a control) are added by each of them.
+        Returns the name, for the after of the next tasks.
+        """
+        with self._lock:
+            if name not in self.tasks:
+                self.tasks[name] = Task(name, function, args, tuple(after), cpu)
+                self._pending.append(name)
+        return name
+
+    def _get_ready(self) -> list[Task]:
+        "Takes the pending tasks that can run, and fails the ones after a failed task"
+        ready = []
+        with self._lock:
+            changed = True
+            while changed:
+                changed = False
+                for name in list(self._pending):
+                    task = self.tasks[name]
+                    failed = [
+                        dependency
+                        for dependency in task.after
+                        if dependency in self.errors
+                    ]
+                    if failed:
+                        self.errors[name] = DependencyFailed(f"After {failed[0]}")
+                    elif all(dependency in self.results for dependency in task.after):
+                        ready.append(task)
+                    else:
+                        continue
+                    self._pending.remove(name)
+                    changed = True
+        return ready
+
+    @staticmethod
+    def _run_task(task: Task, args: tuple):
+        start = time.perf_counter()
+        result = task.function(*args)
+        return result, time.perf_counter() - start
+
+    def run(self) -> dict[str, Exception]:
+        "Runs the tasks (and the ones they add) to the end, returns the errors by task name"
+        # Workers aren't forked from this (threaded) process, which could copy held locks
+        context = multiprocessing.get_context("forkserver")
+        with ThreadPoolExecutor(self.threads) as threads, ProcessPoolExecutor(
+            self.processes,
+            mp_context=context,
+            initializer=self.initializer,
+            initargs=self.initargs,
+        ) as processes:
+            running = {}
+            while True:
+                for task in self._get_ready():
+                    args = task.args + tuple(
+                        self.results[dependency] for dependency in task.after
+                    )
+                    pool = processes if task.cpu else threads
+                    running[pool.submit(DAG._run_task, task, args)] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        self.results[task.name], task.elapsed = future.result()
+                    except Exception as e:
+                        self.errors[task.name] = e
+
+        # After tasks that were never added
+        for name in self._pending:
+            unknown = [
+                dependency
+                for dependency in self.tasks[name].after
+                if dependency not in self.tasks
+            ]
+            self.errors[name] = DependencyFailed(f"After unknown tasks {unknown}")
+        self._pending = []
+        return self.errors
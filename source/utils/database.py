@@ -0,0 +1,306 @@
+"""
+Access to the Selex_X_Genome.db SQLite database. Every process (and thread) keeps one open
+connection in WAL mode, so readers don't block the writer, and writes are grouped in
+transactions instead of being committed row by row.
+
+database/schema.sql is the baseline schema (version 0). Changes to it are numbered migrations
+in database/migrations (NNNN_description.sql), applied in order when a connection is opened.
+The version of a database is kept in PRAGMA user_version.
+
+Pools of workers send their result rows to a single DatabaseWriter process instead of all
+writing to the file, see submit.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path(
+    "/burg/hblab/users/hg2604/Projects/Selex-X-Genome/database/Selex_X_Genome.db"
+)
+SCHEMA_PATH = Path(__file__).parents[2] / Path("database/schema.sql")
+MIGRATIONS_DIR = Path(__file__).parents[2] / Path("database/migrations")
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    # Safe with WAL: a crash can lose the last transactions but never corrupts the database
+    "synchronous": "NORMAL",
+    # Wait for the lock instead of failing with "database is locked"
+    "busy_timeout": 60000,
+    "temp_store": "MEMORY",
+    # 64MB page cache
+    "cache_size": -65536,
+}
+
+_db_path = None
+_local = threading.local()
+# Queue of the DatabaseWriter that submit sends rows to, see attach_writer
+_writer_queue = None
+
+
+class DatabaseWriterError(Exception):
+    "Error to be raised when the DatabaseWriter process failed, so rows were not written"
+
+    pass
+
+
+def get_db_path() -> Path:
+    "Path of the database: set_db_path, else $SELEX_X_GENOME_DB, else the default"
+    if _db_path is not None:
+        return _db_path
+    return Path(os.environ.get("SELEX_X_GENOME_DB", DEFAULT_DB_PATH))
+
+
+def set_db_path(db_path: Path | str) -> None:
+    "Uses another database from now on. Open connections are closed."
+    global _db_path
+    _db_path = Path(db_path)
+    close_connection()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    The connection of this process (and thread). It's opened on first use, and again after a
+    fork or a change of database path. Transactions are managed with transaction().
+    """
+    connection = getattr(_local, "connection", None)
+    if (
+        connection is None
+        or _local.pid != os.getpid()
+        or _local.db_path != get_db_path()
+    ):
+        connection = sqlite3.connect(get_db_path(), isolation_level=None)
+        for pragma, value in PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        migrate(connection)
+        _local.connection = connection
+        _local.pid = os.getpid()
+        _local.db_path = get_db_path()
+        _local.depth = 0
+    return connection
+
+
+def close_connection() -> None:
+    "Closes the connection of this thread, if any"
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.pid == os.getpid():
+        connection.close()
+    _local.connection = None
+
+
+def get_migrations() -> list[tuple[int, Path]]:
+    "(version, path) of every migration, sorted by version"
+    return sorted(
+        (int(path.name.split("_")[0]), path) for path in MIGRATIONS_DIR.glob("*.sql")
+    )
+
+
+def _statements(sql: str) -> list[str]:
+    "Splits a SQL script into its statements"
+    statements, statement = [], ""
+    for line in sql.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement)
+            statement = ""
+    return statements
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """
+    Brings the database up to the latest migration, creating the baseline schema first if
+    the database is empty. All the pending migrations run in one transaction, so a failed
+    migration leaves the database as it was. Returns the version of the database.
+    """
+    migrations = get_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    if connection.execute("PRAGMA user_version").fetchone()[0] >= latest:
+        return latest
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated while we waited for the lock
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        pending = [path for number, path in migrations if number > version]
+        if version == 0:
+            pending.insert(0, SCHEMA_PATH)
+        for path in pending:
+            for statement in _statements(path.read_text()):
+                connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {max(version, latest)}")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+    return max(version, latest)
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the block in one transaction, committed at the end or rolled back on an exception.
+    Nested transactions join the outermost one, so callers can batch many writes together.
+    """
+    connection = get_connection()
+    if _local.depth > 0:
+        _local.depth += 1
+        try:
+            yield connection
+        finally:
+            _local.depth -= 1
+        return
+
+    # IMMEDIATE takes the write lock upfront, so the transaction can't fail halfway on it
+    connection.execute("BEGIN IMMEDIATE")
+    _local.depth = 1
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    else:
+        connection.execute("COMMIT")
+    finally:
+        _local.depth = 0
+
+
+def fetch_one(query: str, params: tuple = ()) -> tuple:
+    "First row of the query, or None"
+    return get_connection().execute(query, params).fetchone()
+
+
+def fetch_value(query: str, params: tuple = ()):
+    "First column of the first row of the query, or None"
+    row = fetch_one(query, params)
+    return None if row is None else row[0]
+
+
+def insert_many(
+    table: str, columns: list[str], rows: list[tuple], batch_size: int = 10000
+) -> int:
+    """
+    Inserts the rows in batches of batch_size per transaction. Rows that already exist
+    (UNIQUE conflicts) are skipped. Returns the number of rows inserted.
+    """
+    query = (
+        f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    rows = list(rows)
+    inserted = 0
+    for start in range(0, len(rows), batch_size):
+        with transaction() as connection:
+            connection_changes = connection.total_changes
+            connection.executemany(query, rows[start : start + batch_size])
+            inserted += connection.total_changes - connection_changes
+    return inserted
+
+
+def insert(table: str, **values) -> int:
+    "Inserts one row (skipped if it already exists). Returns the number of rows inserted."
+    return insert_many(table, list(values), [tuple(values.values())])
+
+
+def attach_writer(queue: multiprocessing.SimpleQueue) -> None:
+    """
+    Sends the rows of submit in this process to the DatabaseWriter of the queue.
+    Meant as a multiprocessing.Pool initializer, with DatabaseWriter.queue as initargs.
+    """
+    global _writer_queue
+    _writer_queue = queue
+
+
+def submit(table: str, **values) -> None:
+    """
+    Inserts one row like insert, but through the DatabaseWriter when one is attached to the
+    process. The row is then written later, so this is for result rows nothing reads back.
+    """
+    if _writer_queue is None:
+        insert(table, **values)
+    else:
+        _writer_queue.put((table, tuple(values), tuple(values.values())))
+
+
+def _write_batch(batch: list[tuple]) -> None:
+    "Inserts the submitted (table, columns, row) in one transaction"
+    rows = defaultdict(list)
+    for table, columns, row in batch:
+        rows[(table, columns)].append(row)
+    with transaction():
+        for (table, columns), table_rows in rows.items():
+            insert_many(table, list(columns), table_rows)
+
+
+def _write_batches(queue: multiprocessing.SimpleQueue, db_path: Path, batch_size: int):
+    "Main of the DatabaseWriter process, writes what comes in until it gets None"
+    set_db_path(db_path)
+    failed = 0
+    done = False
+    while not done:
+        # Everything waiting in the queue (up to batch_size rows) goes in one transaction
+        batch = [queue.get()]
+        while len(batch) < batch_size and not queue.empty():
+            batch.append(queue.get())
+        if None in batch:
+            done = True
+            batch = [item for item in batch if item is not None]
+        # The queue keeps being read after an error, or the workers would block on it
+        try:
+            if batch:
+                _write_batch(batch)
+        except Exception:
+            traceback.print_exc()
+            failed += len(batch)
+    close_connection()
+    if failed:
+        sys.exit(f"Database writer failed to write {failed} rows")
+
+
+class DatabaseWriter:
+    """
+    A process that owns all the writes of submit to the database, so workers never wait on
+    the SQLite write lock. The rows waiting in the queue are written together, in
+    transactions of up to batch_size rows. Use as a context manager around the pool:
+
+        with DatabaseWriter() as writer, multiprocessing.Pool(
+            initializer=attach_writer, initargs=(writer.queue,)
+        ) as pool:
+            ...
+
+    Leaving the block writes the remaining rows. DatabaseWriterError is raised if the
+    writer failed.
+    """
+
+    def __init__(self, batch_size: int = 1000):
+        # put() of a SimpleQueue is done when it returns, so a pool can be terminated as
+        # soon as its tasks are done without losing rows (a Queue sends them in a thread)
+        self.queue = multiprocessing.SimpleQueue()
+        self.process = multiprocessing.Process(
+            target=_write_batches,
+            args=(self.queue, get_db_path(), batch_size),
+            daemon=True,
+        )
+
+    def __enter__(self) -> DatabaseWriter:
+        self.process.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        "Writes the remaining rows and stops the writer"
+        self.queue.put(None)
+        self.process.join()
+        if self.process.exitcode != 0:
+            raise DatabaseWriterError(
+                f"Database writer exited with code {self.process.exitcode}"
+            )
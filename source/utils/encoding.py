@@ -0,0 +1,122 @@
+"""Numeric encodings of DNA probes shared by the motif scorers and count tables."""
+
+from __future__ import annotations
+
+from itertools import product
+
+import numpy as np
+
+# Base codes. Anything that isn't ACGT (N, IUPAC codes, etc.) gets code 4.
+BASES = "ACGT"
+N_CODE = 4
+
+# Lookup table from ASCII byte to base code. Lower-case bases are accepted.
+_ASCII_TO_CODE = np.full(256, N_CODE, dtype=np.uint8)
+for _code, _base in enumerate(BASES):
+    _ASCII_TO_CODE[ord(_base)] = _code
+    _ASCII_TO_CODE[ord(_base.lower())] = _code
+
+
+def encode_sequences(seqs: list[str]) -> np.ndarray:
+    """
+    Encodes equal length sequences as a (n_probes, probe_length) uint8 array of base codes.
+    A=0, C=1, G=2, T=3 and every other character is 4.
+    """
+    if len(seqs) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+
+    probe_length = len(seqs[0])
+    joined = "".join(seqs).encode("ascii")
+    if len(joined) != probe_length * len(seqs):
+        raise ValueError("All sequences must have the same length to be encoded")
+
+    codes = _ASCII_TO_CODE[np.frombuffer(joined, dtype=np.uint8)]
+    return codes.reshape(len(seqs), probe_length)
+
+
+def decode_sequences(codes: np.ndarray) -> list[str]:
+    """Inverse of encode_sequences. Code 4 is decoded as N."""
+    alphabet = np.frombuffer(b"ACGTN", dtype=np.uint8)
+    as_bytes = alphabet[codes].tobytes()
+    probe_length = codes.shape[1]
+    return [
+        as_bytes[i : i + probe_length].decode("ascii")
+        for i in range(0, len(as_bytes), probe_length)
+    ]
+
+
+def one_hot_encode(codes: np.ndarray) -> np.ndarray:
+    """
+    One-hot encodes base codes as a (n_probes, probe_length, 5) uint8 array.
+    Channels are A, C, G, T and N (any non ACGT base).
+    """
+    return (codes[..., None] == np.arange(5, dtype=np.uint8)).view(np.uint8)
+
+
+def group_by_length(seqs: list[str]) -> dict[int, np.ndarray]:
+    """Returns the indices of the sequences for each sequence length."""
+    lengths = np.fromiter((len(seq) for seq in seqs), dtype=np.int64, count=len(seqs))
+    return {
+        int(length): np.flatnonzero(lengths == length) for length in np.unique(lengths)
+    }
+
+
+def pack_2bit(codes: np.ndarray) -> np.ndarray:
+    """
+    Packs ACGT base codes 4 bases per byte, first base in the high bits.
+    Returns a (n_probes, ceil(probe_length / 4)) uint8 array. Codes must be ACGT only.
+    """
+    if codes.size and codes.max() >= N_CODE:
+        raise ValueError("Only A, C, G and T can be packed in 2 bits")
+    n_probes, probe_length = codes.shape
+    padded = np.zeros((n_probes, -(-probe_length // 4) * 4), dtype=np.uint8)
+    padded[:, :probe_length] = codes
+    padded = padded.reshape(n_probes, -1, 4)
+    return (
+        (padded[..., 0] << 6)
+        | (padded[..., 1] << 4)
+        | (padded[..., 2] << 2)
+        | padded[..., 3]
+    )
+
+
+def unpack_2bit(packed: np.ndarray, probe_length: int) -> np.ndarray:
+    """Inverse of pack_2bit. Returns a (n_probes, probe_length) uint8 array of base codes."""
+    shifts = np.array([6, 4, 2, 0], dtype=np.uint8)
+    codes = (packed[..., None] >> shifts) & 3
+    return codes.reshape(packed.shape[0], -1)[:, :probe_length]
+
+
+def kmer_names(k: int) -> list[str]:
+    """All k-mers in the order of their codes (AA..A, AA..C, ..., TT..T)"""
+    return ["".join(kmer) for kmer in product(BASES, repeat=k)]
+
+
+def kmer_composition(
+    codes: np.ndarray, k: int, lengths: np.ndarray = None
+) -> np.ndarray:
+    """
+    Count of every k-mer in every probe divided by the probe length, as a (n_probes, 4**k)
+    float32 array. k-mers with a non ACGT base, or running past the probe length, aren't counted.
+    """
+    n_probes, probe_length = codes.shape
+    n_windows = max(probe_length - k + 1, 0)
+    if lengths is None:
+        lengths = np.full(n_probes, probe_length)
+
+    # Sliding k-mer code (base 4) and whether the k-mer is countable
+    kmers = np.zeros((n_probes, n_windows), dtype=np.int64)
+    valid = np.ones((n_probes, n_windows), dtype=bool)
+    for j in range(k):
+        window = codes[:, j : j + n_windows]
+        kmers = kmers * 4 + (window & 3)
+        valid &= window < N_CODE
+    valid &= np.arange(n_windows) + k <= np.asarray(lengths)[:, None]
+
+    rows = np.broadcast_to(np.arange(n_probes)[:, None], kmers.shape)
+    counts = np.bincount(
+        (rows[valid] * 4**k + kmers[valid]), minlength=n_probes * 4**k
+    ).reshape(n_probes, 4**k)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts / np.asarray(lengths)[:, None]).astype(np.float32)
@@ -0,0 +1,411 @@
+"""
+Executors run Slurmjob job files. SlurmExecutor submits them with sbatch (the cluster),
+LocalExecutor runs them on this machine, as many at a time as fit in its cores and memory,
+using each job's -c and --mem requests. Jobs write to the same .out/.err files with both,
+and both run job arrays and jobs that have to wait for others (Slurm's afterok).
+
+The executor used by Slurmjob.submitJob is chosen with SELEX_X_GENOME_EXECUTOR (slurm, the
+default, or local), or set_executor.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+MEMORY_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+# Slurm states of jobs that won't run (again)
+FINISHED_STATES = {
+    "BOOT_FAIL",
+    "CANCELLED",
+    "COMPLETED",
+    "DEADLINE",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "TIMEOUT",
+}
+
+
+class JobSubmissionError(Exception):
+    "Error to be raised when a job can't be submitted"
+
+    pass
+
+
+def parse_memory(memory: str) -> int:
+    "Bytes of a Slurm memory request (16G, 500M, ...). Megabytes without a unit, like sbatch."
+    match = re.fullmatch(r"(\d+)([KMGT]?)B?", str(memory).strip().upper())
+    if match is None:
+        raise ValueError(f"Invalid memory request {memory}")
+    return int(match.group(1)) * MEMORY_UNITS[match.group(2) or "M"]
+
+
+def _parse_time(sacct_time: str) -> float:
+    "Seconds since the epoch of a sacct time, None if Unknown (never started or ended)"
+    try:
+        return datetime.fromisoformat(sacct_time).timestamp()
+    except ValueError:
+        return None
+
+
+class JobResult:
+    """
+    State (Slurm's: COMPLETED, FAILED, TIMEOUT, CANCELLED, ...), exit code, timings (seconds
+    since the epoch) and peak memory of a finished job. Jobs that never ran, because a job
+    they were after failed, are CANCELLED with no returncode. Job arrays have the results of
+    their tasks, and the state and exit code of the first failed one.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        job_name: str,
+        state: str,
+        returncode: int,
+        start: float,
+        end: float,
+        max_rss: int = 0,
+        tasks: list[JobResult] = (),
+    ):
+        self.job_id = job_id
+        self.job_name = job_name
+        self.state = state
+        self.returncode = returncode
+        self.start = start
+        self.end = end
+        # Bytes
+        self.max_rss = max_rss
+        self.tasks = list(tasks)
+
+    @classmethod
+    def from_tasks(cls, job_id: str, job_name: str, tasks: list[JobResult]):
+        "Result of a job array"
+        failed = [task for task in tasks if not task.succeeded]
+        starts = [task.start for task in tasks if task.start is not None]
+        ends = [task.end for task in tasks if task.end is not None]
+        return cls(
+            job_id,
+            job_name,
+            failed[0].state if failed else "COMPLETED",
+            failed[0].returncode if failed else 0,
+            min(starts, default=None),
+            max(ends, default=None),
+            max(task.max_rss for task in tasks),
+            tasks,
+        )
+
+    @property
+    def elapsed(self) -> float:
+        "Seconds, None for jobs that never ran"
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+    @property
+    def succeeded(self) -> bool:
+        return self.state == "COMPLETED"
+
+    def __repr__(self):
+        return (
+            f"JobResult({self.job_id}, {self.job_name}, {self.state}, "
+            f"returncode={self.returncode}, elapsed={self.elapsed})"
+        )
+
+
+class Executor:
+    """
+    Base class of the executors. submit returns the id of the job, which only starts once the
+    jobs after (their ids) all succeeded. Submitted jobs are kept in submitted, by id.
+    """
+
+    def __init__(self):
+        self.submitted = {}
+
+    def submit(self, job, after: list[str] = ()) -> str:
+        raise NotImplementedError
+
+    def wait(self, job_ids: list[str] = None) -> dict[str, JobResult]:
+        "Waits for the jobs (all the submitted ones by default) to finish, returns their results"
+        raise NotImplementedError
+
+
+class SlurmExecutor(Executor):
+    "Submits the jobs to Slurm. wait polls sacct every poll_interval seconds."
+
+    def __init__(self, poll_interval: float = 60):
+        super().__init__()
+        self.poll_interval = poll_interval
+
+    def submit(self, job, after: list[str] = ()) -> str:
+        command = ["sbatch", "--parsable"]
+        if after:
+            # Cancelled, instead of pending forever, when a job it's after failed
+            command += [
+                f"--dependency=afterok:{':'.join(after)}",
+                "--kill-on-invalid-dep=yes",
+            ]
+        process = subprocess.run(
+            command + [str(job.file_path)], capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            raise JobSubmissionError(
+                f"sbatch {job.file_path} failed: {process.stderr.strip()}"
+            )
+        # job_id[;cluster]
+        job_id = process.stdout.strip().split(";")[0]
+        self.submitted[job_id] = job
+        return job_id
+
+    def get_results(self, job_ids: list[str]) -> dict[str, JobResult]:
+        """
+        Results of the jobs that finished (all their tasks for job arrays), from sacct. Works
+        for jobs submitted by other processes too.
+        """
+        process = subprocess.run(
+            [
+                "sacct",
+                "--noheader",
+                "--parsable2",
+                f"--jobs={','.join(job_ids)}",
+                "--format=JobID,JobName,State,ExitCode,Start,End,MaxRSS",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        tasks = defaultdict(list)
+        max_rss = {}
+        for line in process.stdout.splitlines():
+            sacct_id, job_name, state, exit_code, start, end, rss = line.split("|")
+            # Steps of a job (or task) are sacct_id.batch, .extern, ...
+            if "." in sacct_id:
+                if sacct_id.endswith(".batch") and rss:
+                    max_rss[sacct_id.split(".")[0]] = parse_memory(rss)
+                continue
+            # Tasks of arrays are job_id_index, or job_id_[indexes] while pending
+            job_id = sacct_id.split("_")[0]
+            # CANCELLED by uid
+            state = state.split()[0]
+            returncode = None if state == "CANCELLED" else int(exit_code.split(":")[0])
+            tasks[job_id].append(
+                JobResult(
+                    sacct_id,
+                    job_name,
+                    state,
+                    returncode,
+                    _parse_time(start),
+                    _parse_time(end),
+                )
+            )
+
+        results = {}
+        for job_id in job_ids:
+            if not tasks[job_id] or any(
+                task.state not in FINISHED_STATES for task in tasks[job_id]
+            ):
+                continue
+            for task in tasks[job_id]:
+                task.max_rss = max_rss.get(task.job_id, 0)
+            if "_" in tasks[job_id][0].job_id:
+                results[job_id] = JobResult.from_tasks(
+                    job_id, tasks[job_id][0].job_name, tasks[job_id]
+                )
+            else:
+                results[job_id] = tasks[job_id][0]
+        return results
+
+    def wait(self, job_ids: list[str] = None) -> dict[str, JobResult]:
+        if job_ids is None:
+            job_ids = list(self.submitted)
+        results = {}
+        while len(results) < len(job_ids):
+            pending = [job_id for job_id in job_ids if job_id not in results]
+            results.update(self.get_results(pending))
+            if len(results) < len(job_ids):
+                time.sleep(self.poll_interval)
+        return {job_id: results[job_id] for job_id in job_ids}
+
+
+class LocalExecutor(Executor):
+    """
+    Runs the jobs on this machine, in the order they're ready (after their dependencies), each
+    once enough of the cores and memory are free. Requests larger than the machine are given
+    the whole machine. The tasks of job arrays are queued as separate jobs. Jobs run in the
+    background, wait returns their JobResults once they're done.
+    """
+
+    def __init__(self, cores: int = None, memory: str | int = None):
+        super().__init__()
+        self.cores = cores or os.cpu_count()
+        if memory is None:
+            memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        self.memory = memory if isinstance(memory, int) else parse_memory(memory)
+        self.free_cores = self.cores
+        self.free_memory = self.memory
+        self.results = {}
+        self._ids = itertools.count(1)
+        self._queue = []
+        self._threads = {}
+        self._condition = threading.Condition()
+
+    def submit(self, job, after: list[str] = ()) -> str:
+        unknown = [job_id for job_id in after if job_id not in self._threads]
+        if unknown:
+            raise JobSubmissionError(f"{job.file_path} is after unknown jobs {unknown}")
+        cores = min(job.cores, self.cores)
+        memory = min(parse_memory(job.memory), self.memory)
+        job_id = f"local-{os.getpid()}-{next(self._ids)}"
+        # Not a daemon, so the jobs still run to the end if the submitting script is done
+        thread = threading.Thread(
+            target=self._run, args=(job_id, job, list(after), cores, memory)
+        )
+        self._threads[job_id] = thread
+        self.submitted[job_id] = job
+        thread.start()
+        return job_id
+
+    def _run(self, job_id: str, job, after: list[str], cores: int, memory: int):
+        self.results[job_id] = self._run_job(job_id, job, after, cores, memory)
+        # Nothing polls local jobs (like ledger.poll does Slurm's), so they're updated here
+        from utils import ledger
+
+        try:
+            ledger.update(self, {job_id: self.results[job_id]})
+        except sqlite3.Error as error:
+            print(
+                f"Job {job_id} was not updated in the ledger: {error}", file=sys.stderr
+            )
+
+    def _run_job(
+        self, job_id: str, job, after: list[str], cores: int, memory: int
+    ) -> JobResult:
+        for dependency in after:
+            self._threads[dependency].join()
+        if not all(self.results[dependency].succeeded for dependency in after):
+            return JobResult(job_id, job.job_name, "CANCELLED", None, None, None)
+        if job.array_size is None:
+            return self._run_task(job_id, job, cores, memory)
+
+        tasks = [None] * job.array_size
+        limit = threading.Semaphore(job.array_limit or job.array_size)
+
+        def run_task(index: int):
+            with limit:
+                tasks[index] = self._run_task(
+                    f"{job_id}_{index}", job, cores, memory, index
+                )
+
+        threads = [
+            threading.Thread(target=run_task, args=(index,))
+            for index in range(job.array_size)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return JobResult.from_tasks(job_id, job.job_name, tasks)
+
+    def _run_task(
+        self, task_id: str, job, cores: int, memory: int, index: int = None
+    ) -> JobResult:
+        with self._condition:
+            self._queue.append(task_id)
+            # First come first served, so large jobs aren't passed forever by small ones
+            self._condition.wait_for(
+                lambda: self._queue[0] == task_id
+                and self.free_cores >= cores
+                and self.free_memory >= memory
+            )
+            self._queue.pop(0)
+            self.free_cores -= cores
+            self.free_memory -= memory
+            self._condition.notify_all()
+
+        # What the scripts would find in a Slurm job
+        env = dict(
+            os.environ,
+            SLURM_JOB_ID=task_id,
+            SLURM_JOB_NAME=job.job_name,
+            SLURM_CPUS_PER_TASK=str(cores),
+        )
+        out_path, err_path = str(job.out_path), str(job.err_path)
+        if index is not None:
+            env["SLURM_ARRAY_TASK_ID"] = str(index)
+            out_path = out_path.replace("%a", str(index))
+            err_path = err_path.replace("%a", str(index))
+        start = time.time()
+        returncode, max_rss = -1, 0
+        try:
+            with open(out_path, "w") as out, open(err_path, "w") as err:
+                process = subprocess.Popen(
+                    ["bash", str(job.file_path)],
+                    stdout=out,
+                    stderr=err,
+                    env=env,
+                )
+                # wait4 gives the peak memory of this job alone
+                _, status, rusage = os.wait4(process.pid, 0)
+                process.returncode = returncode = os.waitstatus_to_exitcode(status)
+                max_rss = rusage.ru_maxrss * 1024
+        except OSError as error:
+            # The job couldn't start, e.g. its directory is gone
+            print(f"{task_id} ({job.job_name}): {error}", file=sys.stderr)
+        finally:
+            with self._condition:
+                self.free_cores += cores
+                self.free_memory += memory
+                self._condition.notify_all()
+        return JobResult(
+            task_id,
+            job.job_name,
+            "COMPLETED" if returncode == 0 else "FAILED",
+            returncode,
+            start,
+            time.time(),
+            max_rss,
+        )
+
+    def wait(self, job_ids: list[str] = None) -> dict[str, JobResult]:
+        if job_ids is None:
+            job_ids = list(self._threads)
+        for job_id in job_ids:
+            self._threads[job_id].join()
+        return {job_id: self.results[job_id] for job_id in job_ids}
+
+
+EXECUTORS = {"slurm": SlurmExecutor, "local": LocalExecutor}
+
+_executor = None
+_executor_pid = None
+
+
+def get_executor() -> Executor:
+    "The executor shared by the process, SELEX_X_GENOME_EXECUTOR (slurm by default)"
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        name = os.environ.get("SELEX_X_GENOME_EXECUTOR", "slurm")
+        if name not in EXECUTORS:
+            raise ValueError(
+                f"Unknown executor {name}, expected one of {list(EXECUTORS)}"
+            )
+        _executor = EXECUTORS[name]()
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def set_executor(executor: Executor) -> None:
+    "Makes Slurmjob.submitJob use executor in this process"
+    global _executor, _executor_pid
+    _executor = executor
+    _executor_pid = os.getpid()
@@ -0,0 +1,306 @@
+"""
+Ledger of the submitted jobs, in the jobs table of the Selex_X_Genome.db database.
+Slurmjob.submitJob records every job with what it runs (its inputs) and its resources, and
+update fills in its state, exit code, wall time and peak memory once the job is finished:
+for Slurm jobs when wait or poll finds out, for local jobs as soon as the LocalExecutor ran
+them.
+
+wait waits for jobs and resubmits the failed ones, up to max_attempts, with twice the time
+after a TIMEOUT and twice the memory after OUT_OF_MEMORY. Only the failed tasks of job
+arrays are resubmitted.
+
+python ledger.py updates the Slurm jobs that were still running (from sacct), resubmits the
+failed ones with --retry, and prints how many jobs are in each state.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from utils import database, executors, slurmjob
+
+# States of the jobs worth running again
+RETRY_STATES = {
+    "BOOT_FAIL",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "TIMEOUT",
+}
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def get_executor_name(executor: executors.Executor) -> str:
+    "slurm or local"
+    for name, executor_class in executors.EXECUTORS.items():
+        if isinstance(executor, executor_class):
+            return name
+    return type(executor).__name__
+
+
+def record(
+    job: slurmjob.Slurmjob,
+    job_id: str,
+    executor: executors.Executor,
+    retry_of: int = None,
+) -> int:
+    "Records the submitted job, returns its id in the ledger"
+    inputs = {
+        "job_script": str(job.job_script),
+        "job_params": [str(param) for param in job.job_params],
+        "output": job.output,
+        "post_command": job.post_command,
+        "array_params": job.array_params,
+        "array_limit": job.array_limit,
+    }
+    attempt = 1
+    if retry_of is not None:
+        attempt += database.fetch_value(
+            "SELECT attempt FROM jobs WHERE id = ?", (retry_of,)
+        )
+    with database.transaction() as connection:
+        ledger_id = connection.execute(
+            """
+            INSERT INTO jobs (
+                job_id, executor, job_name, job_file, inputs, cores, memory, time,
+                attempt, retry_of, submitted_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id,
+                get_executor_name(executor),
+                job.job_name,
+                str(job.file_path),
+                json.dumps(inputs, default=str),
+                job.cores,
+                job.memory,
+                job.minutes,
+                attempt,
+                retry_of,
+                time.time(),
+            ),
+        ).lastrowid
+    # A local job can be done before it's recorded, see LocalExecutor._run
+    if isinstance(executor, executors.LocalExecutor) and job_id in executor.results:
+        update(executor, {job_id: executor.results[job_id]})
+    return ledger_id
+
+
+def record_submission(
+    job: slurmjob.Slurmjob,
+    job_id: str,
+    executor: executors.Executor,
+    retry_of: int = None,
+) -> int:
+    """
+    record for a job that was just submitted. The job is queued whatever happens to the
+    ledger, so a failed write (e.g. database locked or unreachable) is printed instead of
+    raised, and the caller keeps the job id. Returns the id in the ledger, None if not.
+    """
+    try:
+        return record(job, job_id, executor, retry_of)
+    except sqlite3.Error as error:
+        print(f"Job {job_id} was not recorded in the ledger: {error}", file=sys.stderr)
+        return None
+
+
+def update(executor: executors.Executor, results: dict[str, executors.JobResult]):
+    "Records the results of finished jobs"
+    with database.transaction() as connection:
+        connection.executemany(
+            """
+            UPDATE jobs SET state = ?, exit_code = ?, wall_time = ?, max_rss = ?
+            WHERE executor = ? AND job_id = ?
+            """,
+            [
+                (
+                    result.state,
+                    result.returncode,
+                    result.elapsed,
+                    result.max_rss,
+                    get_executor_name(executor),
+                    job_id,
+                )
+                for job_id, result in results.items()
+            ],
+        )
+
+
+def get_ledger_id(executor: executors.Executor, job_id: str) -> int:
+    "Id in the ledger of the job (its last submission with that id)"
+    return database.fetch_value(
+        "SELECT MAX(id) FROM jobs WHERE executor = ? AND job_id = ?",
+        (get_executor_name(executor), job_id),
+    )
+
+
+def escalate(memory: str, minutes: int, state: str) -> tuple[str, int]:
+    "Memory and wall time (minutes) of the next attempt of a job that ended in state"
+    if state == "OUT_OF_MEMORY":
+        memory = f"{2 * executors.parse_memory(memory) // 1024**2}M"
+    elif state == "TIMEOUT":
+        minutes = 2 * minutes
+    return memory, minutes
+
+
+def resubmit(
+    ledger_id: int,
+    result: executors.JobResult,
+    executor: executors.Executor = None,
+) -> str:
+    """
+    Submits the failed job again (only the failed tasks of a job array), with escalated
+    resources. The job file and output of attempt n get a _retry{n} suffix, so the logs of
+    the earlier attempts are kept. Returns the id of the new job.
+    """
+    if executor is None:
+        executor = executors.get_executor()
+    job_name, job_file, inputs, cores, memory, minutes, attempt = database.fetch_one(
+        """
+        SELECT job_name, job_file, inputs, cores, memory, time, attempt
+        FROM jobs WHERE id = ?
+        """,
+        (ledger_id,),
+    )
+    inputs = json.loads(inputs)
+    memory, minutes = escalate(memory, minutes, result.state)
+    array_params = inputs["array_params"]
+    post_command = inputs["post_command"]
+    if array_params is not None:
+        failed = [
+            int(task.job_id.rsplit("_", 1)[1])
+            for task in result.tasks
+            if not task.succeeded
+        ]
+        array_params = [array_params[i] for i in failed]
+        # One post command per task
+        if isinstance(post_command, list):
+            post_command = [post_command[i] for i in failed]
+
+    job_file = Path(job_file)
+    # Without the suffix of the previous attempt
+    stem = job_file.stem.split("_retry")[0]
+    output = inputs["output"].split("_retry")[0]
+    job = slurmjob.Slurmjob(
+        file_path=job_file.parent / Path(f"{stem}_retry{attempt + 1}{job_file.suffix}"),
+        job_name=job_name,
+        job_script=Path(inputs["job_script"]),
+        job_params=tuple(inputs["job_params"]),
+        output=f"{output}_retry{attempt + 1}",
+        cores=cores,
+        memory=memory,
+        post_command=post_command,
+        array_params=array_params,
+        array_limit=inputs["array_limit"],
+        minutes=minutes,
+    )
+    job.job_id = executor.submit(job)
+    record_submission(job, job.job_id, executor, retry_of=ledger_id)
+    return job.job_id
+
+
+def wait(
+    job_ids: list[str],
+    executor: executors.Executor = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> dict[str, executors.JobResult]:
+    """
+    Waits for the jobs to finish, resubmitting the failed ones until they succeed or were
+    tried max_attempts times. Returns the results of the last attempts, by the job_ids.
+    Jobs cancelled because a job they were after failed are not resubmitted.
+    """
+    if executor is None:
+        executor = executors.get_executor()
+    # The last attempt of each job
+    attempts = {job_id: job_id for job_id in job_ids}
+    results = {}
+    pending = list(job_ids)
+    while pending:
+        finished = executor.wait([attempts[job_id] for job_id in pending])
+        update(executor, finished)
+        retried = []
+        for job_id in pending:
+            result = results[job_id] = finished[attempts[job_id]]
+            ledger_id = get_ledger_id(executor, attempts[job_id])
+            if result.state not in RETRY_STATES or ledger_id is None:
+                continue
+            attempt = database.fetch_value(
+                "SELECT attempt FROM jobs WHERE id = ?", (ledger_id,)
+            )
+            if attempt < max_attempts:
+                attempts[job_id] = resubmit(ledger_id, result, executor)
+                retried.append(job_id)
+        pending = retried
+    return results
+
+
+def poll(retry: bool = False, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+    """
+    Updates the Slurm jobs of the ledger that were not finished yet. With retry, resubmits
+    the failed jobs that weren't already, up to max_attempts.
+    """
+    executor = executors.SlurmExecutor()
+    job_ids = [
+        job_id
+        for (job_id,) in database.get_connection().execute(
+            "SELECT job_id FROM jobs WHERE executor = 'slurm' AND state = 'PENDING'"
+        )
+    ]
+    if job_ids:
+        update(executor, executor.get_results(job_ids))
+    if not retry:
+        return
+
+    failed = (
+        database.get_connection()
+        .execute(
+            f"""
+        SELECT id, job_id FROM jobs
+        WHERE executor = 'slurm'
+            AND state IN ({', '.join('?' for _ in RETRY_STATES)})
+            AND attempt < ?
+            AND id NOT IN (SELECT retry_of FROM jobs WHERE retry_of IS NOT NULL)
+        """,
+            (*sorted(RETRY_STATES), max_attempts),
+        )
+        .fetchall()
+    )
+    for ledger_id, job_id in failed:
+        result = executor.get_results([job_id]).get(job_id)
+        if result is not None:
+            print(f"Resubmitting {job_id}: {resubmit(ledger_id, result, executor)}")
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument("--retry", action="store_true")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    args = parser.parse_args()
+
+    poll(args.retry, args.max_attempts)
+
+    # Jobs by state, and the last attempts that failed
+    for state, count in database.get_connection().execute(
+        "SELECT state, COUNT(*) FROM jobs GROUP BY state ORDER BY state"
+    ):
+        print(f"{state}: {count}")
+    failed = database.get_connection().execute("""
+        SELECT job_id, job_name, state, exit_code, attempt FROM jobs
+        WHERE state NOT IN ('PENDING', 'COMPLETED')
+            AND id NOT IN (SELECT retry_of FROM jobs WHERE retry_of IS NOT NULL)
+        ORDER BY id
+        """).fetchall()
+    for job_id, job_name, state, exit_code, attempt in failed:
+        print(
+            f"Failed: {job_id} {job_name} {state} (exit code {exit_code}, attempt {attempt})"
+        )
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Runs a batch of motif_X_experiment items, a JSON file written by Mononucleotide.motif_X_TF,
+through a pool of processes (one per core of the job). Every process imports everything
+once for all its items. The scores and the timings of the items are written by a single
+DatabaseWriter. Exits with an error if any item failed, after running all the others.
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from argparse import ArgumentParser
+from pathlib import Path
+
+from motifs.motif import Mononucleotide
+from utils import database, packing
+from utils.motif_X_experiment import motif_X_experiment
+
+
+def run_item(item: dict) -> str:
+    "Runs the item and records how long it took. Returns the error if it failed, else None"
+    size = packing.get_input_size(item["directory"], packing.COUNT_TABLES)
+    start = time.perf_counter()
+    try:
+        motif = Mononucleotide(
+            item["tf"], item["organism"], item["psam"], item["fit_id"]
+        )
+        motif_X_experiment(
+            motif, item["search_tf"], item["experiment"], item["data_path"]
+        )
+    except Exception as e:
+        traceback.print_exc()
+        return f"{item['key']}: {e!r}"
+    packing.record_timing(
+        packing.MOTIF_X_EXPERIMENT, item["key"], size, time.perf_counter() - start
+    )
+    return None
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument("batch", type=Path)
+    args = parser.parse_args()
+
+    with open(args.batch) as f:
+        items = json.load(f)
+    processes = int(os.environ.get("SLURM_CPUS_PER_TASK", multiprocessing.cpu_count()))
+
+    with database.DatabaseWriter() as writer, multiprocessing.Pool(
+        processes=min(processes, len(items)),
+        initializer=database.attach_writer,
+        initargs=(writer.queue,),
+    ) as pool:
+        # Largest items first, so the last ones to finish are small
+        errors = [
+            error for error in pool.imap_unordered(run_item, items) if error is not None
+        ]
+
+    for error in errors:
+        print(f"Error: {error}")
+    if errors:
+        sys.exit(1)
@@ -1,12 +1,61 @@
 #!/usr/bin/env python3
 
-import sqlite3
 from argparse import ArgumentParser
 from pathlib import Path
 
+from diskfiles import manifest
 from diskfiles.countTables import CountTable
 from ENCODE.experiment import TFChipSeq
 from motifs.motif import Mononucleotide
+from utils import database
+
+
+def motif_X_experiment(
+    motif: Mononucleotide, search_tf: str, accession: str, data_path: str
+) -> None:
+    """
+    Scores motif on the count tables of every library of the experiment (of the search for
+    search_tf), downloading the reads and making the count tables first if needed.
+    """
+    organism = motif.organism
+    experiment = TFChipSeq(accession)
+    libraries = experiment.get_libraries()
+    # get_Files returns a list of size 1 by default
+    files = [library.get_Files()[0] for library in libraries]
+
+    # Update DB, all the metadata in one transaction
+    with database.transaction():
+        experiment.update_database()
+        for library, file in zip(libraries, files):
+            library.update_database()
+            file.update_database()
+
+    for library, file in zip(libraries, files):
+        # Check whether counttable was completed
+        if manifest.is_recorded(
+            Path(
+                f'{data_path}{search_tf}_{organism.replace("+","_")}/{experiment.accession}/{library.accession}/{file.accession}.tsv.gz'
+            )
+        ):
+            count_table = CountTable(
+                Path(
+                    f'{data_path}{search_tf}_{organism.replace("+","_")}/{experiment.accession}/{library.accession}/{file.accession}.tsv.gz'
+                )
+            )
+            count_table.update_database()
+            count_table.score(motif, search_tf)
+        else:
+            subsampled_fq = file.download_subsampled(
+                Path(
+                    f'{data_path}{search_tf}_{organism.replace("+","_")}/{experiment.accession}/{library.accession}'
+                ),
+                size=1000000,
+            )
+            fasta = subsampled_fq.transform_to_fasta()
+            count_table = fasta.build_count_table(data_path)
+            count_table.update_database()
+            count_table.score(motif, search_tf)
+
 
 if __name__ == "__main__":
 
@@ -27,39 +76,5 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    psam = args.psam
-    data_path = args.data_path
-    search_tf = args.Search_TF
-    fit_id = args.fit_id
-    motif = Mononucleotide(args.TF, args.organism, psam, fit_id)
-
-    experiment = TFChipSeq(args.experiment)
-    experiment.update_database()  # Update DB
-    libraries = experiment.get_libraries()
-    for library in libraries:
-        library.update_database()  # Update DB
-        file = library.get_Files()[0]  # By default returns a list of size 1
-        file.update_database()  # Update DB
-        # Check whether counttable exists
-        if Path(
-            f'{data_path}{search_tf}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}/{file.accession}.tsv.gz'
-        ).exists():
-            count_table = CountTable(
-                Path(
-                    f'{data_path}{search_tf}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}/{file.accession}.tsv.gz'
-                )
-            )
-            count_table.update_database()
-            count_table.score(motif, search_tf)
-        else:
-            fastq = file.download(
-                Path(
-                    f'{data_path}{search_tf}_{args.organism.replace("+","_")}/{experiment.accession}/{library.accession}'
-                )
-            )
-            subsampled_fq = fastq.subsample(size=1000000)
-            fasta = subsampled_fq.transform_to_fasta()
-            count_table = fasta.build_count_table(data_path)
-            count_table.processTable()
-            count_table.update_database()
-            count_table.score(motif, search_tf)
+    motif = Mononucleotide(args.TF, args.organism, args.psam, args.fit_id)
+    motif_X_experiment(motif, args.Search_TF, args.experiment, args.data_path)
@@ -0,0 +1,106 @@
+"""
+Packs many small work items into a few jobs of about the same runtime, instead of one job
+per item whose fixed overhead (queueing, imports, ENCODE metadata) dominates small items.
+
+The cost of an item is estimated from the history in the work_timings table: the last
+timing of the same item if its input didn't change size since, else its input size times
+the seconds per byte of all the timed items. Items with no input yet (count tables still to
+be made) cost the average of the timed items that had none.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from utils import database
+
+# Kind of the items of utils/motif_X_batch.py: a motif scored on the tables of an experiment
+MOTIF_X_EXPERIMENT = "motif_X_experiment"
+# Its input, under the directory of the experiment
+COUNT_TABLES = "*/*.tsv.gz"
+
+# Estimates until there are timings of the kind (placeholders, the history takes over)
+DEFAULT_SECONDS_PER_BYTE = 60 / 1024**2
+DEFAULT_BUILD_SECONDS = 3600
+
+
+def record_timing(kind: str, item: str, size: int, seconds: float) -> None:
+    """
+    Records how long the item took, with the size of its input before it ran. Through the
+    DatabaseWriter in pool workers.
+    """
+    database.submit(
+        "work_timings",
+        kind=kind,
+        item=item,
+        size=size,
+        seconds=seconds,
+        recorded_at=time.time(),
+    )
+
+
+def get_input_size(directory: Path, pattern: str) -> int:
+    "Bytes of the files of directory matching pattern (the input of an item), 0 if none"
+    return sum(path.stat().st_size for path in Path(directory).glob(pattern))
+
+
+def estimate_costs(kind: str, sizes: dict[str, int]) -> dict[str, float]:
+    "Estimated seconds of each item, given the size (bytes) of its input, 0 if none yet"
+    connection = database.get_connection()
+    total_seconds, total_size = connection.execute(
+        "SELECT SUM(seconds), SUM(size) FROM work_timings WHERE kind = ? AND size > 0",
+        (kind,),
+    ).fetchone()
+    seconds_per_byte = (
+        total_seconds / total_size if total_size else DEFAULT_SECONDS_PER_BYTE
+    )
+    build_seconds = connection.execute(
+        "SELECT AVG(seconds) FROM work_timings WHERE kind = ? AND size = 0", (kind,)
+    ).fetchone()[0]
+    if build_seconds is None:
+        build_seconds = DEFAULT_BUILD_SECONDS
+    # The last timing of each item
+    last = {
+        item: (size, seconds)
+        for item, size, seconds in connection.execute(
+            """
+            SELECT item, size, seconds FROM work_timings
+            WHERE id IN (SELECT MAX(id) FROM work_timings WHERE kind = ? GROUP BY item)
+            """,
+            (kind,),
+        )
+    }
+
+    costs = {}
+    for item, size in sizes.items():
+        if item in last and last[item][0] == size:
+            costs[item] = last[item][1]
+        elif size > 0:
+            costs[item] = size * seconds_per_byte
+        else:
+            costs[item] = build_seconds
+    return costs
+
+
+def pack(costs: dict[str, float], capacity: float) -> list[list[str]]:
+    """
+    Groups the items into as few bins as fit in capacity (seconds), first fit decreasing.
+    Items costing more than capacity get a bin of their own.
+    """
+    bins, loads = [], []
+    for item in sorted(costs, key=costs.get, reverse=True):
+        for i, load in enumerate(loads):
+            if load + costs[item] <= capacity:
+                bins[i].append(item)
+                loads[i] += costs[item]
+                break
+        else:
+            bins.append([item])
+            loads.append(costs[item])
+    return bins
+
+
+def get_runtime(costs: list[float], processes: int) -> float:
+    "Estimated seconds to run items of costs through a pool of processes"
+    return max(sum(costs) / processes, max(costs, default=0))
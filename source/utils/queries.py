@@ -0,0 +1,155 @@
+"""
+Results from the Selex_X_Genome.db database as pandas DataFrames, each in a single query.
+Results are cached until the database changes (its modification time), so dashboards and
+notebooks can call these repeatedly.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+
+import pandas as pd
+from utils import database
+
+EXPERIMENT_COLUMNS = """
+    experiments.accession AS experiment,
+    experiments.life_stage_age,
+    experiments.perturbed,
+    experiments.lab,
+    experiments.biosample_class,
+    experiments.developmental_slims,
+    experiments.system_slims,
+    experiments.organ_slims,
+    experiments.cell_slims,
+    libraries.accession AS library,
+    libraries.antibody,
+    libraries.biosample,
+    libraries.technical_rep_number,
+    libraries.biological_rep_number,
+    files.accession AS file,
+    files.read_length
+"""
+
+# files, with their libraries and experiments
+FILES_JOIN = """
+    JOIN libraries ON libraries.id = files.library_id
+    JOIN experiments ON experiments.id = files.experiment_id
+"""
+
+_cache = {}
+
+
+def get_db_version() -> tuple:
+    "Changes whenever the database does. With WAL, writes go to the -wal file first."
+    db_path = database.get_db_path()
+    version = [db_path]
+    for path in (db_path, db_path.parent / f"{db_path.name}-wal"):
+        try:
+            stat = os.stat(path)
+            version += [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            version += [None, None]
+    return tuple(version)
+
+
+def cached(query_function):
+    "Caches the DataFrame of query_function until the database changes"
+
+    @functools.wraps(query_function)
+    def wrapper(*args, **kwargs):
+        key = (query_function.__name__, args, tuple(sorted(kwargs.items())))
+        version = get_db_version()
+        if key not in _cache or _cache[key][0] != version:
+            _cache[key] = (version, query_function(*args, **kwargs))
+        # A copy, so callers can't change the cached frame
+        return _cache[key][1].copy()
+
+    return wrapper
+
+
+def clear_cache() -> None:
+    "Empties the cache of the query functions"
+    _cache.clear()
+
+
+def _where(conditions: dict) -> tuple[str, tuple]:
+    "WHERE clause (and its parameters) of the conditions that are not None"
+    conditions = {
+        column: value for column, value in conditions.items() if value is not None
+    }
+    if not conditions:
+        return "", ()
+    clause = " AND ".join(f"{column} = ?" for column in conditions)
+    return f"WHERE {clause}", tuple(conditions.values())
+
+
+@cached
+def experiment_metadata(control: bool = None) -> pd.DataFrame:
+    """
+    One row per file, with the metadata of its library and experiment.
+    control=True/False keeps only the control/TF experiments.
+    """
+    if control is None:
+        where, params = _where({})
+    else:
+        where, params = _where({"experiments.control": "y" if control else "n"})
+    return pd.read_sql_query(
+        f"""
+        SELECT experiments.control, {EXPERIMENT_COLUMNS}
+        FROM files {FILES_JOIN}
+        {where}
+        ORDER BY experiment, library, file
+        """,
+        database.get_connection(),
+        params=params,
+    )
+
+
+@cached
+def motif_scores(
+    search_tf: str = None, organism: str = None, tf: str = None
+) -> pd.DataFrame:
+    """
+    One row per scored (motif, count table), with the top bin of the motif and the metadata of
+    the count table's file. Filtered by the search TF, organism and motif TF when given.
+    """
+    where, params = _where(
+        {"motif.search_tf": search_tf, "motif.organism": organism, "motif.tf": tf}
+    )
+    return pd.read_sql_query(
+        f"""
+        SELECT
+            motif.tf,
+            motif.search_tf,
+            motif.organism,
+            motif.type,
+            motif.score AS avg_score,
+            motif.r0_count,
+            motif.r1_count,
+            motif.enrichment,
+            motif.correlation,
+            count_tables.probe_count,
+            {EXPERIMENT_COLUMNS}
+        FROM motif
+        JOIN count_tables ON count_tables.id = motif.count_table_id
+        JOIN files ON files.id = count_tables.r1_file
+        {FILES_JOIN}
+        {where}
+        ORDER BY motif.tf, experiment, library, file
+        """,
+        database.get_connection(),
+        params=params,
+    )
+
+
+def enrichment_matrix(
+    search_tf: str, organism: str, value: str = "enrichment"
+) -> pd.DataFrame:
+    """
+    TF x experiment matrix of value (a column of motif_scores), averaged over the files of
+    each experiment.
+    """
+    return motif_scores(search_tf, organism).pivot_table(
+        index="tf", columns="experiment", values=value, aggfunc="mean"
+    )
@@ -0,0 +1,16 @@
+"""Read subsampling shared by the fastq files and the downloads."""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def sample_indices(n_reads: int, size: int, seed: int = 42) -> np.ndarray:
+    """
+    Sorted indices of size reads drawn without replacement out of n_reads, the same for a
+    given seed. Every read is kept if there are no more than size reads.
+    """
+    if size >= n_reads:
+        return np.arange(n_reads)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n_reads, size=size, replace=False))
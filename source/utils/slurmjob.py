@@ -1,12 +1,21 @@
-import subprocess
-import sys
+from __future__ import annotations
+
+import shlex
 from pathlib import Path
 
 from diskfiles.base import DiskFile
+from utils import executors, ledger
 
 
 class Slurmjob(DiskFile):
-    """Class for creating a Slurmjob files."""
+    """
+    Class for creating a Slurmjob files. With array_params, a job array of one task per
+    params: the params are written to a tasks file (one line per task) and each task runs
+    job_script with job_params followed by its own line. post_command can then also be a
+    list, one command per task (written to a .post file).
+
+    The wall time is time hours (the job asks for time:59:00), or minutes when given.
+    """
 
     def __init__(
         self,
@@ -17,6 +26,11 @@ class Slurmjob(DiskFile):
         output: str,
         cores: int = 4,
         time: int = 4,
+        memory: str = "16G",
+        post_command: str | list[str] = None,
+        array_params: list[tuple] = None,
+        array_limit: int = None,
+        minutes: int = None,
     ):
         self.file_path = file_path
         self.job_name = job_name
@@ -24,33 +38,103 @@ class Slurmjob(DiskFile):
         self.job_params = job_params
         self.output = output
         self.cores = cores
-        self.time = time
+        self.minutes = 60 * time + 59 if minutes is None else minutes
+        self.memory = memory
+        # Shell command run after job_script, e.g. to record the manifest of its output
+        self.post_command = post_command
+        if array_params is not None and len(array_params) == 0:
+            raise ValueError(f"Job array {job_name} has no tasks")
+        self.array_params = array_params
+        if isinstance(post_command, list) and len(post_command) != self.array_size:
+            raise ValueError(
+                f"Job {job_name} has {len(post_command)} post commands for"
+                f" {self.array_size} tasks"
+            )
+        # Most tasks of the array running at once
+        self.array_limit = array_limit
+        # Set by submitJob
+        self.job_id = None
         self.create_file()
         super().__init__(file_path)
 
+    @property
+    def array_size(self) -> int:
+        "Number of tasks of the job array, None for a single job"
+        return None if self.array_params is None else len(self.array_params)
+
+    @property
+    def tasks_path(self) -> Path:
+        return self.file_path.with_suffix(".tasks")
+
+    @property
+    def post_path(self) -> Path:
+        "Post commands of the tasks, when there is one per task"
+        return self.file_path.with_suffix(".post")
+
+    @property
+    def out_path(self) -> Path:
+        "%a is the index of the task in job arrays"
+        task = "" if self.array_params is None else "_%a"
+        return self.file_path.parent / Path(f"{self.output}{task}.out")
+
+    @property
+    def err_path(self) -> Path:
+        task = "" if self.array_params is None else "_%a"
+        return self.file_path.parent / Path(f"{self.output}{task}.err")
+
     def create_file(self):
         self.file_path.parent.mkdir(exist_ok=True, parents=True)
         self.file_path.touch(exist_ok=True)
         with self.file_path.open(mode="w") as jf:
             jf.write("#!/bin/bash\n")
             jf.writelines(f"#SBATCH --job-name={self.job_name}\n")
-            jf.writelines(
-                f"#SBATCH --output={self.file_path.parent}/{self.output}.out\n"
-            )
-            jf.writelines(
-                f"#SBATCH --error={self.file_path.parent}/{self.output}.err\n"
-            )
+            jf.writelines(f"#SBATCH --output={self.out_path}\n")
+            jf.writelines(f"#SBATCH --error={self.err_path}\n")
             jf.writelines(f"#SBATCH -c {self.cores}\n")
-            jf.writelines("#SBATCH --mem=16G\n")
+            jf.writelines(f"#SBATCH --mem={self.memory}\n")
             jf.writelines("#SBATCH --account=hblab\n")
-            jf.writelines(f"#SBATCH -t {self.time}:59:00\n\n")
+            if self.array_params is not None:
+                limit = "" if self.array_limit is None else f"%{self.array_limit}"
+                jf.writelines(f"#SBATCH --array=0-{self.array_size - 1}{limit}\n")
             jf.writelines(
-                f'{str(self.job_script)} {" ".join(str(param) for param in self.job_params)}'
+                f"#SBATCH -t {self.minutes // 60}:{self.minutes % 60:02d}:00\n\n"
             )
+            command = f'{str(self.job_script)} {" ".join(str(param) for param in self.job_params)}'
+            if self.array_params is None:
+                jf.writelines(command)
+            else:
+                with self.tasks_path.open(mode="w") as tf:
+                    tf.writelines(
+                        shlex.join(str(param) for param in params) + "\n"
+                        for params in self.array_params
+                    )
+                jf.writelines(
+                    f'TASK_PARAMS=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {self.tasks_path})\n'
+                )
+                jf.writelines(f'eval {shlex.quote(command)} "$TASK_PARAMS"')
+            post_command = self.post_command
+            if isinstance(post_command, list):
+                with self.post_path.open(mode="w") as pf:
+                    pf.writelines(f"{task_command}\n" for task_command in post_command)
+                post_command = (
+                    f'eval "$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {self.post_path})"'
+                )
+            if post_command is not None:
+                # Only once job_script succeeded, and the job keeps its exit code
+                jf.writelines(f" || exit $?\n{post_command}\n")
 
-    def submitJob(self):
+    def submitJob(
+        self, executor: executors.Executor = None, after: list[str] = ()
+    ) -> str:
+        """
+        Runs the job with executor (by default executors.get_executor()), once the jobs after
+        (their ids) all succeeded. The job is recorded in the ledger, even if that fails the
+        job is queued (see ledger.record_submission). Returns the id of the job.
+        """
         if not self.file_path.exists():
             self.create_file()
-
-        # Call subprocess
-        subprocess.run(["sbatch", str(self.file_path)])
+        if executor is None:
+            executor = executors.get_executor()
+        self.job_id = executor.submit(self, after)
+        ledger.record_submission(self, self.job_id, executor)
+        return self.job_id
@@ -12,7 +12,8 @@ job_script = Path(
     "/burg/home/hg2604/hblab/Projects/Selex-X-Genome/source/utils/pyprob_2.py"
 )
 
-# Slurmjob("/burg/home/hg2604/hblab/Projects/Selex-X-Genome/temp")
+# One job array, a task per count table
+count_tables = []
 for index, row in df.iterrows():
 
     exp = row["Experiment_Acc.x"]
@@ -20,14 +21,16 @@ for index, row in df.iterrows():
     file = row["File_Acc"] + ".tsv.gz"
 
     cnt_table = f"/burg/home/hg2604/hblab/Projects/Selex-X-Genome/data/CTCF_Human/{exp}/{lib}/{file}"
-
-    slurm_job = Slurmjob(
-        Path(f"/burg/home/hg2604/hblab/Projects/Selex-X-Genome/temp/{file}.job"),
-        file,
-        job_script,
-        (cnt_table,),
-        file,
-        cores=6,
-        time=6,
-    )
-    slurm_job.submitJob()
+    count_tables.append((cnt_table,))
+
+slurm_job = Slurmjob(
+    Path("/burg/home/hg2604/hblab/Projects/Selex-X-Genome/temp/cluster_1.job"),
+    "cluster_1",
+    job_script,
+    (),
+    "cluster_1",
+    cores=6,
+    time=6,
+    array_params=count_tables,
+)
+print(slurm_job.submitJob())
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+from ENCODE.client import DownloadVerificationError, EncodeClient, EncodeRequestError
+
+
+class ENCODEHandler(BaseHTTPRequestHandler):
+    'Serves {"accession": ...} with an ETag for /ENCSR*, and 404 for everything else'
+
+    requests_served = []
+
+    def do_GET(self):
+        ENCODEHandler.requests_served.append(self.path)
+        if not self.path.startswith("/ENCSR"):
+            self.send_response(404)
+            self.end_headers()
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = json.dumps({"accession": self.path[1:]}).encode()
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = HTTPServer(("127.0.0.1", 0), ENCODEHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ENCODEHandler.requests_served = []
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_get_json_cached(tmp_path, server_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    url = f"{server_url}/ENCSR068HEE"
+
+    assert client.get_json(url) == {"accession": "ENCSR068HEE"}
+    assert client.get_cache_path(url).exists()
+    # Second call comes from the cache, even from another client
+    assert EncodeClient(cache_dir=tmp_path).get_json(url) == {
+        "accession": "ENCSR068HEE"
+    }
+    assert ENCODEHandler.requests_served == ["/ENCSR068HEE"]
+
+
+def test_get_json_revalidated(tmp_path, server_url):
+    client = EncodeClient(cache_dir=tmp_path, ttl=0)
+    url = f"{server_url}/ENCSR068HEE"
+
+    client.get_json(url)
+    # Expired, so revalidated with the ETag (304)
+    assert client.get_json(url) == {"accession": "ENCSR068HEE"}
+    assert len(ENCODEHandler.requests_served) == 2
+
+
+def test_get_json_error(tmp_path, server_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    with pytest.raises(EncodeRequestError) as error:
+        client.get_json(f"{server_url}/search/?type=Experiment")
+    assert error.value.status_code == 404
+
+
+FILE_DATA = bytes(range(256)) * 1000
+
+
+class DownloadHandler(BaseHTTPRequestHandler):
+    "Serves FILE_DATA with Range support. The first response is cut off halfway."
+
+    requests_served = []
+
+    def do_GET(self):
+        DownloadHandler.requests_served.append(self.headers.get("Range"))
+        start, end = 0, len(FILE_DATA) - 1
+        if self.headers.get("Range"):
+            first, last = self.headers["Range"][len("bytes=") :].split("-")
+            start, end = int(first), int(last) if last else end
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        body = FILE_DATA[start : end + 1]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if len(DownloadHandler.requests_served) == 1:
+            body = body[: len(body) // 2]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def download_url():
+    server = HTTPServer(("127.0.0.1", 0), DownloadHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    DownloadHandler.requests_served = []
+    yield f"http://127.0.0.1:{server.server_port}/file.fastq.gz"
+    server.shutdown()
+
+
+class NoRangeHandler(BaseHTTPRequestHandler):
+    "Serves FILE_DATA, ignoring the Range header"
+
+    requests_served = []
+
+    def do_GET(self):
+        NoRangeHandler.requests_served.append(self.headers.get("Range"))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(FILE_DATA)))
+        self.end_headers()
+        self.wfile.write(FILE_DATA)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def no_range_url():
+    server = HTTPServer(("127.0.0.1", 0), NoRangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    NoRangeHandler.requests_served = []
+    yield f"http://127.0.0.1:{server.server_port}/file.fastq.gz"
+    server.shutdown()
+
+
+def test_download_resumed(tmp_path, download_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    file_path = tmp_path / Path("ENCFF000AAA.fastq")
+    md5sum = hashlib.md5(FILE_DATA).hexdigest()
+
+    client.download(download_url, file_path, md5sum, len(FILE_DATA), chunk_size=1024)
+
+    assert file_path.read_bytes() == FILE_DATA
+    assert not (tmp_path / Path("ENCFF000AAA.fastq.part")).exists()
+    # The second request continues where the cut off one stopped
+    assert DownloadHandler.requests_served == [None, f"bytes={len(FILE_DATA) // 2}-"]
+
+
+def test_download_parallel_ranges(tmp_path, download_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    file_path = tmp_path / Path("ENCFF000AAA.fastq")
+    md5sum = hashlib.md5(FILE_DATA).hexdigest()
+
+    client.download(download_url, file_path, md5sum, len(FILE_DATA), n_parts=4)
+
+    assert file_path.read_bytes() == FILE_DATA
+    assert list(tmp_path.glob("*.part*")) == []
+
+
+def test_download_parallel_ranges_unsupported(tmp_path, no_range_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    file_path = tmp_path / Path("ENCFF000AAA.fastq")
+    md5sum = hashlib.md5(FILE_DATA).hexdigest()
+    # Left over by an earlier run
+    (tmp_path / Path("ENCFF000AAA.fastq.part0")).write_bytes(FILE_DATA[:100])
+
+    client.download(no_range_url, file_path, md5sum, len(FILE_DATA), n_parts=4)
+
+    assert file_path.read_bytes() == FILE_DATA
+    assert list(tmp_path.glob("*.part*")) == []
+    # The ranges were given up on, the file came as one stream
+    assert NoRangeHandler.requests_served[-1] is None
+
+
+def test_download_bad_md5sum(tmp_path, download_url):
+    client = EncodeClient(cache_dir=tmp_path)
+    file_path = tmp_path / Path("ENCFF000AAA.fastq")
+
+    with pytest.raises(DownloadVerificationError):
+        client.download(download_url, file_path, "0" * 32, len(FILE_DATA))
+    assert not file_path.exists()
@@ -3,7 +3,7 @@ import json
 import sqlite3
 
 import pytest
-from ENCODE.base import RunType
+from ENCODE.base import RunType, accession_from_link
 from ENCODE.experiment import Control, TFChipSeq
 from ENCODE.library import Library
 
@@ -41,6 +41,11 @@ def test_get_controls(my_TFChipSeq):
     assert isinstance(my_Control, Control)
 
 
+def test_accession_from_link():
+    assert accession_from_link("/experiments/ENCSR608IVH/") == "ENCSR608IVH"
+    assert accession_from_link({"accession": "ENCSR608IVH"}) == "ENCSR608IVH"
+
+
 def test_get_libraries(my_TFChipSeq):
     my_Libraries = my_TFChipSeq.get_libraries()
     assert len(my_Libraries) == 4
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from ENCODE.client import EncodeClient
+from ENCODE.experiment import MoreThanOneControl
+from ENCODE.fetcher import EncodeFetcher, RateLimiter
+
+
+def experiment_json(accession: str, possible_controls: list[dict]) -> dict:
+    "Smallest embedded experiment with one library and one fastq file"
+    return {
+        "accession": accession,
+        "possible_controls": possible_controls,
+        "replicates": [
+            {
+                "library": {
+                    "accession": f"ENCLB{accession[5:]}",
+                    "biosample": {"accession": "ENCBS000AAA"},
+                },
+                "antibody": {"accession": "ENCAB000AAA"},
+                "technical_replicate_number": 1,
+                "biological_replicate_number": 1,
+                "experiment": f"/experiments/{accession}/",
+            }
+        ],
+        "files": [
+            {
+                "accession": f"ENCFF{accession[5:]}",
+                "file_format": "fastq",
+                "run_type": "single-ended",
+                "replicate": {"library": f"/libraries/ENCLB{accession[5:]}/"},
+                "platform": {"term_name": "Illumina"},
+                "read_length": 36,
+                "read_count": 1000,
+                "href": f"/files/ENCFF{accession[5:]}/@@download/x.fastq.gz",
+            }
+        ],
+    }
+
+
+ENCODE_JSON = {
+    "/ENCSR000AAA": experiment_json("ENCSR000AAA", [{"accession": "ENCSR000CCC"}]),
+    "/ENCSR000BBB": experiment_json("ENCSR000BBB", ["/experiments/ENCSR000CCC/"]),
+    "/ENCSR000CCC": experiment_json("ENCSR000CCC", []),
+    "/ENCSR000DDD": experiment_json(
+        "ENCSR000DDD", [{"accession": "ENCSR000CCC"}, {"accession": "ENCSR000EEE"}]
+    ),
+}
+
+
+class ENCODEHandler(BaseHTTPRequestHandler):
+    requests_served = []
+
+    def do_GET(self):
+        ENCODEHandler.requests_served.append(self.path)
+        if self.path not in ENCODE_JSON:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps(ENCODE_JSON[self.path]).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = HTTPServer(("127.0.0.1", 0), ENCODEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ENCODEHandler.requests_served = []
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_resolve_experiments(tmp_path, server_url):
+    async def resolve():
+        fetcher = EncodeFetcher(
+            client=EncodeClient(cache_dir=tmp_path, retries=0), base_url=server_url
+        )
+        accessions = ["ENCSR000AAA", "ENCSR000BBB", "ENCSR000DDD", "ENCSR000ZZZ"]
+        return await fetcher.resolve_experiments(accessions), fetcher.errors
+
+    resolved, errors = asyncio.run(resolve())
+
+    assert [r.experiment.accession for r in resolved] == ["ENCSR000AAA", "ENCSR000BBB"]
+    for r in resolved:
+        assert r.control.accession == "ENCSR000CCC"
+        assert r.control.experiment == r.experiment.accession
+        assert [library.accession for library in r.control_libraries] == ["ENCLB000CCC"]
+        files = r.get_files()
+        assert files[f"ENCLB{r.experiment.accession[5:]}"][0].read_count == 1000
+    # The shared control is only fetched once
+    assert ENCODEHandler.requests_served.count("/ENCSR000CCC") == 1
+
+    assert set(errors) == {"ENCSR000DDD", "ENCSR000ZZZ"}
+    assert isinstance(errors["ENCSR000DDD"], MoreThanOneControl)
+
+
+def test_rate_limiter():
+    async def wait_all():
+        rate_limiter = RateLimiter(requests_per_second=50)
+        start = time.monotonic()
+        await asyncio.gather(*(rate_limiter.wait("host") for _ in range(6)))
+        await rate_limiter.wait("other_host")
+        return time.monotonic() - start
+
+    # 6 requests to one host are 5 intervals apart, other hosts don't wait
+    assert 0.1 <= asyncio.run(wait_all()) < 0.5
@@ -1,11 +1,16 @@
 # Experiment:ENCSR068HEE  Control:ENCSR608IVH
+import gzip
 import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
 
 import pytest
+from ENCODE import files
 from ENCODE.base import RunType
+from ENCODE.client import EncodeClient
 from ENCODE.experiment import TFChipSeq
-from ENCODE.files import SE_File
+from ENCODE.files import FileDownloadError, SE_File
 
 
 @pytest.fixture
@@ -192,3 +197,69 @@ def test_update_db_file(my_File):
 
     assert read_length == my_File.read_length
     assert paired_end == "n"
+
+
+FASTQ_DATA = gzip.compress(
+    b"".join(f"@read{i}\nACGT\n+\nIIII\n".encode() for i in range(10))
+)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    "Answers 503 to the first n_errors requests, then serves FASTQ_DATA"
+
+    n_errors = 1
+    requests_served = 0
+
+    def do_GET(self):
+        FlakyHandler.requests_served += 1
+        if FlakyHandler.requests_served <= FlakyHandler.n_errors:
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(FASTQ_DATA)))
+        self.end_headers()
+        self.wfile.write(FASTQ_DATA)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_file(tmp_path, monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FlakyHandler.requests_served = 0
+    monkeypatch.setattr(files, "ENCODE_URL", f"http://127.0.0.1:{server.server_port}")
+    # The retries are download_subsampled's, not the session's
+    client = EncodeClient(cache_dir=tmp_path, retries=0)
+    monkeypatch.setattr(files, "get_client", lambda: client)
+    yield SE_File(
+        "ENCFF000AAA", 10, "fastq", False, "Illumina", 4, "ENCSR000AAA", False,
+        "ENCLB000AAA", "ENCBS000AAA", 1, 1, "ENCAB000AAA", "/ENCFF000AAA.fastq.gz",
+        RunType.SE,
+    )  # fmt: skip
+    server.shutdown()
+
+
+def test_download_subsampled_retried(flaky_file, tmp_path):
+    FlakyHandler.n_errors = 1
+
+    fastq = flaky_file.download_subsampled(tmp_path, size=5)
+
+    assert FlakyHandler.requests_served == 2
+    with gzip.open(fastq.file_path) as f:
+        assert len(f.read().splitlines()) == 5 * 4
+
+
+def test_download_subsampled_failed(flaky_file, tmp_path):
+    FlakyHandler.n_errors = 3
+    # Left over by an earlier run
+    filepath = tmp_path / Path("ENCFF000AAA_subsampled.fq.gz")
+    filepath.write_bytes(b"stale")
+
+    with pytest.raises(FileDownloadError):
+        flaky_file.download_subsampled(tmp_path, size=5)
+    assert FlakyHandler.requests_served == 3
+    assert list(tmp_path.glob("*.fq.gz*")) == []
@@ -29,6 +29,18 @@ def test_get_experiment_valid_search(my_valid_search):
     assert not my_Experiment[0].control
 
 
+def test_get_experiments_bulk(my_valid_search):
+    bulk = my_valid_search.get_experiments()
+    one_by_one = my_valid_search.get_experiments(bulk=False)
+    assert [exp.accession for exp in bulk] == [exp.accession for exp in one_by_one]
+    for bulk_exp, exp in zip(bulk, one_by_one):
+        assert bulk_exp.expr_data["files"] == exp.expr_data["files"]
+        if len(exp.expr_data["possible_controls"]) == 1:
+            # Controls come from the batched search
+            assert bulk_exp.controls_data
+            assert bulk_exp.get_controls().accession == exp.get_controls().accession
+
+
 def test_invalid_search(my_invalid_search):
     assert my_invalid_search.tf == "TFE3"
     assert my_invalid_search.organism == "Mus+musculus"
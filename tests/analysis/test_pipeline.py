@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from analysis.pipeline import TFPipeline
+from ENCODE.experiment import NoControl
+from utils.dag import DAG
+
+
+def test_experiment_without_control(tmp_path):
+    pipeline = TFPipeline("CTCF", "Homo+sapiens", data_root=tmp_path, dag=DAG())
+    # What EncodeFetcher.resolve_experiment gives for an experiment with no control
+    resolved = SimpleNamespace(
+        experiment=SimpleNamespace(accession="ENCSR000AAA"),
+        control=None,
+        libraries=[SimpleNamespace(accession="ENCLB000AAA")],
+        control_libraries=[],
+    )
+    pipeline.dag.add("experiment ENCSR000AAA", pipeline.add_experiment, resolved)
+
+    assert pipeline.dag.run() == {}
+    assert pipeline.dag.results["experiment ENCSR000AAA"] == 0
+    assert isinstance(pipeline.experiment_errors["ENCSR000AAA"], NoControl)
+    # Nothing was planned for it
+    assert list(pipeline.dag.tasks) == ["experiment ENCSR000AAA"]
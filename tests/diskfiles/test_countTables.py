@@ -1,5 +1,45 @@
+import gzip
 import math
 import sqlite3
+from pathlib import Path
+
+import numpy as np
+from diskfiles.countTables import CountTable
+from motifs.motif import Mononucleotide
+
+
+def probound_scores(psam: list, seqs: list[str]) -> list[float]:
+    """
+    Scores of ProBoundTools buildConsensusModel().addNScoring().bindingModeScores(), window
+    by window: exp(window score) summed over the full windows of both strands.
+    """
+    motif_size = len(psam) // 4
+    columns = [dict(zip("ACGT", psam[4 * j : 4 * j + 4])) for j in range(motif_size)]
+    # The consensus base of every column scores 0, N scores the mean
+    for column in columns:
+        top = max(column.values())
+        for base in "ACGT":
+            column[base] -= top
+        column["N"] = sum(column.values()) / 4
+    complement = {"A": "T", "C": "G", "G": "C", "T": "A", "N": "N"}
+
+    scores = []
+    for seq in seqs:
+        rev_comp = "".join(complement[base] for base in seq[::-1])
+        scores.append(
+            sum(
+                math.exp(
+                    sum(
+                        columns[j][base]
+                        for j, base in enumerate(strand[i:][:motif_size])
+                    )
+                )
+                for strand in (seq, rev_comp)
+                for i in range(len(strand) - motif_size + 1)
+            )
+        )
+    return scores
+
 
 # def test_get_probe_count(my_countTable):
 #     counts = my_countTable.get_probe_count()
@@ -58,3 +98,122 @@ def test_score(my_countTable_sample, my_mono_motif):
     assert r0_count == 44
     assert r1_count == 977
     assert math.isclose(enrichment, 22.204545, rel_tol=1e-4, abs_tol=1e-4)
+
+
+def test_score_probes(tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv.gz")
+    with gzip.open(table_path, "wt") as f:
+        f.write("ACGTACGTAC\t1\t0\nTTTTGGGGCC\t0\t2\n")
+
+    motif = Mononucleotide("CTCF", "9606", list(np.linspace(-1, 1, 16)), "fit_id")
+    scores = CountTable(table_path).score_probes(motif)
+
+    assert np.allclose(scores, motif.binding_mode_scores(["ACGTACGTAC", "TTTTGGGGCC"]))
+    assert np.allclose(np.loadtxt(tmp_path / Path("ENCFF000AAA_fit_id.txt")), scores)
+
+
+def test_score_many(tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv.gz")
+    with gzip.open(table_path, "wt") as f:
+        f.write("ACGTACGTAC\t1\t0\nTTTTGGGGCC\t0\t2\nACGTACG\t3\t3\n")
+
+    motifs = [
+        Mononucleotide("CTCF", "9606", list(np.linspace(-1, 1, 16)), "fit_1"),
+        Mononucleotide("YY1", "9606", list(np.linspace(1, -1, 20)), "fit_2"),
+        # Affinities far below 1e-6, which are kept in the score files
+        Mononucleotide("MAX", "9606", list(np.linspace(-40, 40, 24)), "fit_3"),
+    ]
+    score_df = CountTable(table_path).score_many(motifs)
+
+    assert list(score_df.columns) == ["fit_1", "fit_2", "fit_3"]
+    assert score_df.shape == (3, 3)
+    for motif in motifs:
+        expected = probound_scores(motif.psam, ["ACGTACGTAC", "TTTTGGGGCC", "ACGTACG"])
+        assert np.allclose(score_df[motif.fit_id], expected, rtol=1e-7, atol=0)
+        assert np.allclose(
+            np.loadtxt(tmp_path / Path(f"ENCFF000AAA_{motif.fit_id}.txt")),
+            expected,
+            rtol=1e-7,
+            atol=0,
+        )
+
+
+def test_kmer_composition(tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv.gz")
+    with gzip.open(table_path, "wt") as f:
+        f.write("ACGTACGTAC\t1\t0\nTTTTGGGGCC\t0\t2\n")
+    count_table = CountTable(table_path)
+
+    mn_comp = count_table.get_mn_base_composition()
+    assert list(mn_comp.columns) == ["A", "C", "G", "T"]
+    assert np.allclose(mn_comp.iloc[0], [0.3, 0.3, 0.2, 0.2])
+    assert np.allclose(mn_comp.iloc[1], [0, 0.2, 0.4, 0.4])
+
+    dn_comp = count_table.get_dn_base_composition()
+    assert dn_comp.shape == (2, 16)
+    assert np.isclose(dn_comp.loc[1, "TT"], 0.3)
+
+    # Cached as a memory mapped sidecar
+    assert (tmp_path / Path("ENCFF000AAA_k2_composition.npy")).exists()
+    assert isinstance(count_table.get_kmer_composition(2), np.memmap)
+
+
+def test_process_table(tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv")
+    table_path.write_text(
+        "acgtACGT\t1\t2\nACGNACGT\t5\t5\nACGTACGT\t3\t0\nTTRTACGT\t1\t1\nGGGGCCCC\t0\t4\n"
+    )
+    count_table = CountTable(table_path)
+
+    assert count_table.processTable() == 2
+    assert count_table.get_pandas_df().values.tolist() == [
+        ["ACGTACGT", 1, 2],
+        ["ACGTACGT", 3, 0],
+        ["GGGGCCCC", 0, 4],
+    ]
+
+    assert count_table.processTable(collapse_duplicates=True, compress=True) == 0
+    assert count_table.file_path == tmp_path / Path("ENCFF000AAA.tsv.gz")
+    assert not table_path.exists()
+    with gzip.open(count_table.file_path, "rt") as f:
+        assert f.read() == "ACGTACGT\t4\t2\nGGGGCCCC\t0\t4\n"
+
+
+def test_create_from_fasta(tmp_path):
+    fasta1 = tmp_path / Path("r0.fasta")
+    fasta1.write_text(">1\nACGTAC\n>2\nacgtac\n>3\nACGNAC\n>4\nTTTT\nGG\n")
+    fasta2 = tmp_path / Path("r1.fasta.gz")
+    with gzip.open(fasta2, "wt") as f:
+        f.write(">1\nTTTTGG\n>2\nCCCCAA\n>3\nACGTAC\n>4\nTTTTGG\n")
+
+    count_table = CountTable.create_from_fasta(
+        fasta1, fasta2, tmp_path / Path("ENCFF000AAA.tsv"), compress=True
+    )
+
+    assert count_table.file_path == tmp_path / Path("ENCFF000AAA.tsv.gz")
+    assert count_table.get_pandas_df().values.tolist() == [
+        ["ACGTAC", 2, 1],
+        ["TTTTGG", 1, 2],
+        ["CCCCAA", 0, 1],
+    ]
+
+
+def test_create_from_fasta_reused(tmp_path):
+    fasta1, fasta2 = tmp_path / Path("r0.fasta"), tmp_path / Path("r1.fasta")
+    fasta1.write_text(">1\nACGTAC\n")
+    fasta2.write_text(">1\nACGTAC\n")
+    count_table_path = tmp_path / Path("ENCFF000AAA.tsv")
+
+    CountTable.create_from_fasta(fasta1, fasta2, count_table_path)
+    mtime = count_table_path.stat().st_mtime_ns
+    # Same inputs, the table is reused
+    CountTable.create_from_fasta(fasta1, fasta2, count_table_path)
+    assert count_table_path.stat().st_mtime_ns == mtime
+
+    # Changed input, the table is made again
+    fasta2.write_text(">1\nTTTTGG\n")
+    count_table = CountTable.create_from_fasta(fasta1, fasta2, count_table_path)
+    assert count_table.get_pandas_df().values.tolist() == [
+        ["ACGTAC", 1, 0],
+        ["TTTTGG", 0, 1],
+    ]
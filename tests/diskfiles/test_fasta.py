@@ -1,6 +1,10 @@
 from pathlib import Path
 
+import pytest
 from diskfiles.countTables import CountTable
+from diskfiles.fasta import NoControlsFound, select_control_library
+from ENCODE.base import RunType
+from ENCODE.library import Library
 
 
 def test_build_count_table(my_Fasta_file):
@@ -10,3 +14,34 @@ def test_build_count_table(my_Fasta_file):
     assert count_table.file_path == Path(
         "/burg/home/hg2604/hblab/Projects/Selex-X-Genome/tests/ENCODE/ENCFF476FQX.tsv.gz"
     )
+
+
+def make_library(accession, biosample, technical_replicate_number):
+    return Library(
+        accession,
+        None,
+        technical_replicate_number,
+        1,
+        "ENCSR",
+        biosample,
+        RunType.SE,
+        [],
+        True,
+    )
+
+
+def test_select_control_library():
+    libraries = [
+        make_library("ENCLB1", "ENCBS1", 1),
+        make_library("ENCLB2", "ENCBS1", 2),
+        make_library("ENCLB3", "ENCBS2", 1),
+    ]
+    # Same biosample, then same technical replicate
+    assert select_control_library(libraries, "ENCBS1", 2).accession == "ENCLB2"
+    assert select_control_library(libraries, "ENCBS2", 2).accession == "ENCLB3"
+    # No library of the biosample, any of the technical replicate
+    assert select_control_library(libraries, "ENCBS3", 1).accession == "ENCLB1"
+    with pytest.raises(NoControlsFound):
+        select_control_library(libraries, "ENCBS3", 3)
+    with pytest.raises(NoControlsFound):
+        select_control_library([], "ENCBS1", 1)
@@ -1,9 +1,215 @@
+import gzip
+import io
+import os
+import subprocess
 from pathlib import Path
 
+import pytest
+from diskfiles import manifest
+from diskfiles.fastq import (
+    PE_Fastq,
+    SE_Fastq,
+    count_reads,
+    slurm_transform_to_fasta_array,
+    write_sampled_reads,
+)
+from ENCODE.base import RunType
+from utils import database, executors, ledger
+from utils.sampling import sample_indices
+
 
 def test_Fastq_subsample(my_Fastq_file):
     subsampled_fq = my_Fastq_file.subsample()
     assert subsampled_fq.file_path.exists()
     assert subsampled_fq.file_path == Path(
-        "/burg/home/hg2604/hblab/Projects/Selex-X-Genome/tests/ENCODE/ENCFF476FQX_subsampled.fq"
+        "/burg/home/hg2604/hblab/Projects/Selex-X-Genome/tests/ENCODE/ENCFF476FQX_subsampled.fq.gz"
+    )
+
+
+def write_fastq(file_path: Path, prefix: str, n_reads: int) -> None:
+    with gzip.open(file_path, "wt") as f:
+        for i in range(n_reads):
+            f.write(f"@{prefix}{i}\nACGTACGT\n+\nIIIIIIII\n")
+
+
+def make_fastq(file_path: Path, accession: str, run_type=RunType.SE, mate=None):
+    return SE_Fastq(
+        file_path,
+        accession,
+        "Illumina",
+        8,
+        "ENCSR000AAA",
+        "ENCLB000AAA",
+        "K562",
+        1,
+        1,
+        False,
+        "antibody",
+        "href",
+        run_type,
+        None if mate is None else "1",
+        mate,
+    )
+
+
+def test_SE_Fastq_subsample(tmp_path):
+    write_fastq(tmp_path / Path("ENCFF000AAA.fastq.gz"), "read", 1000)
+    fastq = make_fastq(tmp_path / Path("ENCFF000AAA.fastq.gz"), "ENCFF000AAA")
+
+    subsampled_fq = fastq.subsample(size=100)
+    assert subsampled_fq.file_path == tmp_path / Path("ENCFF000AAA_subsampled.fq.gz")
+    assert subsampled_fq.zipped
+    assert count_reads(subsampled_fq.file_path) == 100
+
+    # Same seed, same reads. Every read is kept if there are less than size.
+    with gzip.open(subsampled_fq.file_path, "rt") as f:
+        reads = f.read()
+    subsampled_fq.delete()
+    with gzip.open(fastq.subsample(size=100).file_path, "rt") as f:
+        assert f.read() == reads
+    # A different size is sampled again, not reused
+    assert count_reads(fastq.subsample(size=5000).file_path) == 1000
+
+
+@pytest.mark.parametrize("size", [10, 2000])
+def test_PE_Fastq_subsample(tmp_path, size):
+    write_fastq(tmp_path / Path("ENCFF000AAA.fastq.gz"), "pair", 1000)
+    write_fastq(tmp_path / Path("ENCFF000BBB.fastq.gz"), "pair", 1000)
+    fastq = PE_Fastq(
+        make_fastq(
+            tmp_path / Path("ENCFF000AAA.fastq.gz"), "ENCFF000AAA", RunType.PE, "BBB"
+        ),
+        make_fastq(
+            tmp_path / Path("ENCFF000BBB.fastq.gz"), "ENCFF000BBB", RunType.PE, "AAA"
+        ),
+    )
+
+    subsampled_fq = fastq.subsample(size=size)
+    with gzip.open(subsampled_fq.r1.file_path, "rt") as r1, gzip.open(
+        subsampled_fq.r2.file_path, "rt"
+    ) as r2:
+        r1_names, r2_names = r1.read().splitlines()[::4], r2.read().splitlines()[::4]
+    assert len(r1_names) == min(size, 1000)
+    assert r1_names == r2_names
+
+
+def test_write_sampled_reads_from_stream(tmp_path):
+    # A download stream sampled with the read count gives the same reads as the file
+    write_fastq(tmp_path / Path("ENCFF000AAA.fastq.gz"), "read", 1000)
+    fastq = make_fastq(tmp_path / Path("ENCFF000AAA.fastq.gz"), "ENCFF000AAA")
+    subsampled_fq = fastq.subsample(size=100)
+
+    stream = gzip.GzipFile(
+        fileobj=io.BytesIO((tmp_path / Path("ENCFF000AAA.fastq.gz")).read_bytes())
+    )
+    output_path = tmp_path / Path("streamed.fq.gz")
+    assert write_sampled_reads(stream, sample_indices(1000, 100), output_path) == 100
+
+    with gzip.open(output_path) as streamed, gzip.open(subsampled_fq.file_path) as f:
+        assert streamed.read() == f.read()
+
+
+# Stand-ins of the tools of se_processing_template.sh, printing what they would
+STUB_TOOLS = {
+    "bowtie2": "echo read",
+    "samtools": 'if [ "$1" = sort ]; then echo sorted > "$4"; else cat; fi',
+    "bedtools": (
+        'if [ "$1" = bamtobed ]; then printf "chr1\\t1000\\t1050\\tread\\t30\\t+\\n";'
+        ' else echo ">chr1:1000-1200(+)" > "${@: -1}"; echo ACGT >> "${@: -1}"; fi'
+    ),
+}
+
+
+@pytest.fixture
+def stub_tools(tmp_path, monkeypatch):
+    "Puts the stand-ins first in PATH, returns a function making one of them fail"
+    bin_path = tmp_path / Path("bin")
+    bin_path.mkdir()
+
+    def write_tool(name, command):
+        (bin_path / Path(name)).write_text(f"#!/bin/bash\n{command}\n")
+        (bin_path / Path(name)).chmod(0o755)
+
+    for name, command in STUB_TOOLS.items():
+        write_tool(name, command)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    return lambda name: write_tool(name, "exit 1")
+
+
+@pytest.fixture
+def local_executor(tmp_path, monkeypatch):
+    # Transform jobs are recorded in the ledger
+    database.set_db_path(tmp_path / Path("Selex_X_Genome.db"))
+    monkeypatch.setattr(executors, "_executor", None)
+    executor = executors.LocalExecutor(cores=1)
+    executors.set_executor(executor)
+    yield executor
+    database.close_connection()
+
+
+def test_slurm_transform_to_fasta(tmp_path, stub_tools, local_executor):
+    write_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "read", 10)
+    fastq = make_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "ENCFF000AAA")
+    fasta_path = tmp_path / Path("ENCFF000AAA.fasta")
+
+    job_id = fastq.slurm_transform_to_fasta()
+    result = ledger.wait([job_id], local_executor)[job_id]
+
+    assert result.succeeded
+    assert fasta_path.read_text() == ">chr1:1000-1200(+)\nACGT\n"
+    # Recorded by the job, so it's not submitted again
+    assert manifest.is_current(fasta_path, [fastq.file_path])
+    assert fastq.slurm_transform_to_fasta() is None
+
+
+def test_slurm_transform_to_fasta_failed(tmp_path, stub_tools, local_executor):
+    write_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "read", 10)
+    fastq = make_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "ENCFF000AAA")
+    # Failing in the middle of a pipe still writes the fasta
+    stub_tools("bowtie2")
+
+    job_id = fastq.slurm_transform_to_fasta()
+    result = local_executor.wait([job_id])[job_id]
+
+    assert result.state == "FAILED"
+    assert not manifest.is_recorded(tmp_path / Path("ENCFF000AAA.fasta"))
+
+
+def test_transform_to_fasta(tmp_path):
+    write_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "read", 10)
+    fastq = make_fastq(tmp_path / Path("ENCFF000AAA_subsampled.fq.gz"), "ENCFF000AAA")
+    fasta_path = tmp_path / Path("ENCFF000AAA.fasta")
+    script = tmp_path / Path("transform.sh")
+    # Writes part of the fasta, then fails
+    script.write_text(
+        f"#!/bin/bash\necho '>chr1:1000-1200(+)' > {fasta_path}\nexit 1\n"
     )
+    script.chmod(0o755)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        fastq.transform_to_fasta(script)
+    assert not manifest.is_recorded(fasta_path)
+
+    script.write_text(f"#!/bin/bash\necho '>chr1:1000-1200(+)' > {fasta_path}\n")
+    assert fastq.transform_to_fasta(script).file_path == fasta_path
+    assert manifest.is_current(fasta_path, [fastq.file_path, script])
+
+
+def test_slurm_transform_to_fasta_array(tmp_path, stub_tools, local_executor):
+    fastqs = []
+    for accession in ["ENCFF000AAA", "ENCFF000BBB"]:
+        fastq_path = tmp_path / Path(f"{accession}/{accession}_subsampled.fq.gz")
+        fastq_path.parent.mkdir()
+        write_fastq(fastq_path, "read", 10)
+        fastqs.append(make_fastq(fastq_path, accession))
+    job_path = tmp_path / Path("transform.job")
+
+    job_id = slurm_transform_to_fasta_array(fastqs, job_path)
+    result = local_executor.wait([job_id])[job_id]
+
+    assert result.succeeded and len(result.tasks) == 2
+    # Every task recorded its own fasta
+    for fastq in fastqs:
+        fasta_path = fastq.file_path.parent / Path(f"{fastq.accession}.fasta")
+        assert manifest.is_current(fasta_path, [fastq.file_path])
+    assert slurm_transform_to_fasta_array(fastqs, job_path) is None
@@ -0,0 +1,55 @@
+import subprocess
+from pathlib import Path
+
+from diskfiles import manifest
+
+
+def test_is_current(tmp_path):
+    input_path = tmp_path / Path("reads.fasta")
+    input_path.write_text(">1\nACGT\n")
+    output_path = tmp_path / Path("table.tsv")
+    output_path.write_text("ACGT\t1\t0\n")
+
+    # Not recorded, e.g. the stage crashed before the end
+    assert not manifest.is_current(output_path, [input_path], {"seed": 42})
+
+    manifest.record(output_path, [input_path], {"seed": 42})
+    assert manifest.is_current(output_path, [input_path], {"seed": 42})
+    assert not manifest.is_current(output_path, [input_path], {"seed": 1})
+
+    input_path.write_text(">1\nTTTT\n")
+    assert not manifest.is_current(output_path, [input_path], {"seed": 42})
+
+    # Deleted inputs are taken to be unchanged
+    manifest.record(output_path, [input_path], {"seed": 42})
+    input_path.unlink()
+    assert manifest.is_current(output_path, [input_path], {"seed": 42})
+
+
+def test_changes_propagate(tmp_path):
+    first, second, third = (tmp_path / Path(name) for name in ("a", "b", "c"))
+    for path in (first, second, third):
+        path.write_text("data")
+    manifest.record(second, [first])
+    manifest.record(third, [second])
+    assert manifest.is_current(third, [second])
+
+    # Remade from another input, with the same content
+    manifest.record(second, [first], {"size": 10})
+    assert not manifest.is_current(third, [second])
+
+
+def test_record_command(tmp_path):
+    input_path = tmp_path / Path("reads.fastq")
+    input_path.write_text("@1\nACGT\n+\nIIII\n")
+    output_path = tmp_path / Path("reads.fasta")
+    command = manifest.record_command(output_path, [input_path], {"window": 200})
+
+    # Fails while the output doesn't exist
+    assert subprocess.run(command, shell=True).returncode != 0
+    output_path.write_text(">1\nACGT\n")
+    # The input may be gone by the time the job records its output
+    input_path.unlink()
+    assert subprocess.run(command, shell=True).returncode == 0
+    assert manifest.read_manifest(output_path)["params"] == {"window": 200}
+    assert manifest.is_current(output_path, [input_path], {"window": 200})
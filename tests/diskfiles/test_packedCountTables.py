@@ -0,0 +1,51 @@
+import gzip
+from pathlib import Path
+
+import numpy as np
+import pytest
+from diskfiles.countTables import CountTable
+from diskfiles.packedCountTables import NotAPackedCountTable, PackedCountTable
+from utils.encoding import encode_sequences, pack_2bit, unpack_2bit
+
+
+@pytest.fixture
+def my_countTable_small(tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv.gz")
+    with gzip.open(table_path, "wt") as f:
+        f.write("ACGTACGTAC\t1\t0\nTTTTGGGGCC\t0\t2\nCCGTA\t3\t5\n")
+    return CountTable(table_path)
+
+
+def test_pack_2bit():
+    codes = encode_sequences(["ACGTTGCAG", "TTTTTTTTT"])
+    packed = pack_2bit(codes)
+    assert packed.shape == (2, 3)
+    assert packed[0, 0] == 0b00011011
+    assert (unpack_2bit(packed, 9) == codes).all()
+
+    with pytest.raises(ValueError):
+        pack_2bit(encode_sequences(["ACGN"]))
+
+
+def test_create_from_count_table(my_countTable_small):
+    packed = my_countTable_small.get_packed_table()
+    assert packed.file_path.name == "ENCFF000AAA.pct"
+    assert packed.n_probes == 3
+    assert packed.probe_length == 10
+    assert isinstance(packed.r0, np.memmap)
+    assert packed.r0.tolist() == [1, 0, 3]
+    assert packed.r1.tolist() == [0, 2, 5]
+    assert packed.get_seqs() == ["ACGTACGTAC", "TTTTGGGGCC", "CCGTA"]
+    assert packed.get_pandas_df().equals(my_countTable_small.get_pandas_df())
+
+
+def test_to_count_table(my_countTable_small, tmp_path):
+    packed = my_countTable_small.get_packed_table()
+    count_table = packed.to_count_table(tmp_path / Path("copy/ENCFF000AAA.tsv"))
+    assert count_table.zipped
+    assert count_table.get_pandas_df().equals(my_countTable_small.get_pandas_df())
+
+
+def test_not_a_packed_count_table(my_countTable_small):
+    with pytest.raises(NotAPackedCountTable):
+        PackedCountTable(my_countTable_small.file_path)
@@ -0,0 +1,171 @@
+import math
+import os
+import random
+import shutil
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+from motifs.motif import Mononucleotide
+from motifs.scoring import (
+    binding_mode_score_matrix,
+    both_strand_kernel,
+    psam_to_matrix,
+    window_scores,
+)
+from utils.encoding import decode_sequences, encode_sequences
+
+# ProBoundTools jar with dependencies, to check the scores against
+PROBOUND_JAR = os.environ.get("PROBOUND_JAR")
+
+
+def score_seq_loop(motif: Mononucleotide, seq: str) -> float:
+    """Window by window scoring with Mononucleotide.score_window"""
+    numpy_motif = motif.matrix[:4]
+    motif_size = numpy_motif.shape[1]
+    return sum(
+        math.exp(Mononucleotide.score_window(numpy_motif, seq[i : i + motif_size]))
+        for i in range(0, len(seq) - 2)
+    )
+
+
+@pytest.fixture
+def my_random_motif():
+    random.seed(0)
+    psam = [random.gauss(0, 0.5) for _ in range(4 * 12)]
+    return Mononucleotide("CTCF", "9606", psam, "fit_id")
+
+
+@pytest.fixture
+def my_random_seqs():
+    random.seed(1)
+    return ["".join(random.choice("ACGT") for _ in range(40)) for _ in range(25)]
+
+
+def test_encode_sequences():
+    codes = encode_sequences(["ACGTN", "acgtx"])
+    assert codes.tolist() == [[0, 1, 2, 3, 4], [0, 1, 2, 3, 4]]
+    assert decode_sequences(codes) == ["ACGTN", "ACGTN"]
+
+
+def test_psam_to_matrix():
+    psam = list(range(8))
+    matrix = psam_to_matrix(psam, mean_centered=False)
+    assert matrix.shape == (5, 2)
+    assert matrix[:, 0].tolist() == [0, 1, 2, 3, 0]
+    assert matrix[:, 1].tolist() == [4, 5, 6, 7, 0]
+    assert np.allclose(psam_to_matrix(psam)[:4].mean(axis=0), 0)
+
+
+def test_both_strand_kernel(my_random_motif):
+    # A window and its reverse complement get the same score
+    kernel = both_strand_kernel(my_random_motif.matrix)
+    scores = window_scores(encode_sequences(["ACCGTTAGCATG", "CATGCTAACGGT"]), kernel)
+    assert scores.shape == (2, 1)
+    assert math.isclose(scores[0, 0], scores[1, 0])
+
+
+def test_score_seqs(my_random_motif, my_random_seqs):
+    scores = my_random_motif.score_seqs(my_random_seqs)
+    expected = [score_seq_loop(my_random_motif, seq) for seq in my_random_seqs]
+    assert np.allclose(scores, expected)
+
+
+def test_score_seq_mixed_lengths(my_random_motif, my_random_seqs):
+    # Short sequences only have truncated windows
+    seqs = my_random_seqs[:3] + ["ACGTACG", "AC", ""]
+    for seq, score in zip(seqs, my_random_motif.score_seqs(seqs)):
+        assert math.isclose(my_random_motif.score_seq(seq), score)
+        assert math.isclose(score, score_seq_loop(my_random_motif, seq))
+
+
+def test_consensus_matrix(my_random_motif):
+    matrix = my_random_motif.consensus_matrix
+    assert np.allclose(matrix[:4].max(axis=0), 0)
+    assert np.allclose(matrix[4], matrix[:4].mean(axis=0))
+
+
+def test_binding_mode_scores(my_random_motif, my_random_seqs):
+    seqs = my_random_seqs[:5] + ["N" + my_random_seqs[5][1:]]
+    matrix = my_random_motif.consensus_matrix
+    motif_size = matrix.shape[1]
+    complement = {"A": "T", "C": "G", "G": "C", "T": "A", "N": "N"}
+    rows = {base: i for i, base in enumerate("ACGTN")}
+
+    for seq, score in zip(seqs, my_random_motif.binding_mode_scores(seqs)):
+        rev_comp = "".join(complement[base] for base in seq[::-1])
+        expected = 0
+        # Summed affinity, every window of each strand is exponentiated
+        for strand in (seq, rev_comp):
+            for i in range(len(strand) - motif_size + 1):
+                expected += math.exp(
+                    sum(
+                        matrix[rows[base], j]
+                        for j, base in enumerate(strand[i : i + motif_size])
+                    )
+                )
+        assert math.isclose(score, expected)
+
+
+def test_binding_mode_scores_base_order(my_random_motif):
+    matrix = my_random_motif.consensus_matrix
+    consensus = "".join("ACGT"[i] for i in matrix[:4].argmax(axis=0))
+    # The same bases, out of order
+    shuffled = "".join(sorted(consensus))
+    consensus_score, shuffled_score, alone_score = my_random_motif.binding_mode_scores(
+        ["ACGTTG" + consensus + "GATCCA", "ACGTTG" + shuffled + "GATCCA", consensus]
+    )
+
+    assert consensus_score > shuffled_score
+    # The consensus scores 0, exp(0) on the forward strand
+    rev_comp = "".join("TGCA"["ACGT".index(base)] for base in consensus[::-1])
+    rev_comp_score = sum(
+        matrix["ACGT".index(base), j] for j, base in enumerate(rev_comp)
+    )
+    assert math.isclose(alone_score, 1 + math.exp(rev_comp_score))
+
+
+@pytest.mark.skipif(
+    PROBOUND_JAR is None or shutil.which("java") is None,
+    reason="Needs java and the ProBoundTools jar in $PROBOUND_JAR",
+)
+def test_binding_mode_scores_probound_parity(tmp_path, my_random_seqs):
+    # What scoreCntTbl.sh ran, for a MotifCentral fit
+    from motifs.parse_motifcentral_json import MOTIFCENTRAL
+
+    motif = Mononucleotide.create_from_motif_central(MOTIFCENTRAL[0])
+    seqs_path = tmp_path / Path("seqs.txt")
+    seqs_path.write_text("\n".join(my_random_seqs) + "\n")
+    output = subprocess.run(
+        [
+            "java",
+            "-cp",
+            PROBOUND_JAR,
+            "proBoundTools/App",
+            "-c",
+            f"loadMotifCentralModel({motif.fit_id}).buildConsensusModel()"
+            f".addNScoring().inputTXT({seqs_path}).bindingModeScores(/dev/stdout)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    expected = [float(line.split()[1]) for line in output.splitlines()]
+
+    assert np.allclose(
+        motif.binding_mode_scores(my_random_seqs), expected, rtol=1e-5, atol=0
+    )
+
+
+def test_binding_mode_score_matrix(my_random_motif, my_random_seqs):
+    other_motif = Mononucleotide("YY1", "9606", list(np.linspace(-1, 1, 24)), "fit_2")
+    codes = encode_sequences(my_random_seqs)
+    scores = binding_mode_score_matrix(
+        codes, [my_random_motif.consensus_matrix, other_motif.consensus_matrix]
+    )
+    assert scores.shape == (len(my_random_seqs), 2)
+    assert np.allclose(
+        scores[:, 0], my_random_motif.binding_mode_scores(my_random_seqs)
+    )
+    assert np.allclose(scores[:, 1], other_motif.binding_mode_scores(my_random_seqs))
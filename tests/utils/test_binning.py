@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+from diskfiles.countTables import CountTable
+from utils.binning import (
+    make_bins,
+    quantile_bins,
+    score_width_bins,
+    size_bins,
+    top_bin_enrichment,
+)
+
+
+@pytest.fixture
+def my_scored_df():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "seq": ["A"] * 2505,
+            "r0": rng.integers(0, 5, 2505),
+            "r1": rng.integers(0, 5, 2505),
+            "score": rng.normal(size=2505),
+        }
+    )
+    return df.sort_values(by="score", ascending=False)
+
+
+def bin_count_table_loop(df, bin_size):
+    """Bin by bin with iloc, like CountTable.bin_count_table used to"""
+    rows = []
+    i = 0
+    while i < df.shape[0] - 10:
+        bin = df.iloc[i : i + bin_size]
+        rows.append((bin["score"].mean(), bin["r0"].sum(), bin["r1"].sum()))
+        i += bin_size
+    return pd.DataFrame(rows, columns=["avg_score", "r0_count", "r1_count"])
+
+
+@pytest.mark.parametrize("bin_size", [1000, 500, 7])
+def test_bin_count_table(my_scored_df, bin_size):
+    bin_df = CountTable.bin_count_table(my_scored_df, bin_size=bin_size)
+    expected = bin_count_table_loop(my_scored_df, bin_size)
+    assert list(bin_df.columns) == ["avg_score", "r0_count", "r1_count", "enrichment"]
+    assert np.allclose(bin_df["avg_score"], expected["avg_score"])
+    assert (bin_df["r0_count"] == expected["r0_count"]).all()
+    assert (bin_df["r1_count"] == expected["r1_count"]).all()
+
+
+def test_size_bins():
+    starts, ends = size_bins(2505, 1000)
+    assert starts.tolist() == [0, 1000, 2000]
+    assert ends.tolist() == [1000, 2000, 2505]
+    # The last 5 rows are too few for a bin of their own
+    starts, ends = size_bins(2005, 1000)
+    assert ends.tolist() == [1000, 2000]
+
+
+def test_quantile_bins():
+    starts, ends = quantile_bins(10, 3)
+    assert starts.tolist() == [0, 3, 7]
+    assert ends.tolist() == [3, 7, 10]
+
+
+def test_score_width_bins():
+    scores = np.array([10.0, 9.5, 6.0, 5.5, 1.0, 0.0])
+    starts, ends = score_width_bins(scores, 2)
+    assert starts.tolist() == [0, 4]
+    assert ends.tolist() == [4, 6]
+
+
+def test_bin_count_table_methods(my_scored_df):
+    for method in ["quantile", "score_width"]:
+        bin_df = CountTable.bin_count_table(my_scored_df, method=method, n_bins=10)
+        assert bin_df.shape[0] == 10
+        assert bin_df["r0_count"].sum() == my_scored_df["r0"].sum()
+
+    with pytest.raises(ValueError):
+        make_bins(my_scored_df["score"].to_numpy(), method="unknown")
+
+
+def test_top_bin_enrichment(my_scored_df):
+    r0 = my_scored_df["r0"].to_numpy()
+    r1 = my_scored_df["r1"].to_numpy()
+    curve = top_bin_enrichment(r0, r1, min_bin_size=500)
+
+    assert curve["bin_size"].tolist() == list(range(500, 2506))
+    for bin_size, enrichment in zip(curve["bin_size"], curve["enrichment"]):
+        expected = (r1[:bin_size].sum() + 1) / (r0[:bin_size].sum() + 1)
+        assert np.isclose(enrichment, expected)
+
+
+def test_top_bin_enrichment_log_samples(my_scored_df):
+    curve = top_bin_enrichment(
+        my_scored_df["r0"].to_numpy(),
+        my_scored_df["r1"].to_numpy(),
+        min_bin_size=10,
+        pseudocount_r0=5,
+        pseudocount_r1=5,
+        n_samples=20,
+    )
+    assert curve.shape[0] <= 20
+    assert curve["bin_size"].iloc[0] == 10
+    assert curve["bin_size"].iloc[-1] == 2505
+    assert curve["bin_size"].is_monotonic_increasing
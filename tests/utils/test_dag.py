@@ -0,0 +1,64 @@
+import operator
+
+from utils.dag import DAG, DependencyFailed
+
+
+def test_run():
+    dag = DAG(threads=4, processes=2)
+    order = []
+
+    def record(name, *results):
+        order.append(name)
+        return name
+
+    dag.add("a", record, "a")
+    dag.add("b", record, "b", after=["a"])
+    dag.add("c", record, "c", after=["a", "b"])
+    # In a process
+    dag.add(
+        "sum", operator.add, 1, after=[dag.add("two", operator.mul, 1, 2)], cpu=True
+    )
+
+    assert dag.run() == {}
+    assert order == ["a", "b", "c"]
+    assert dag.results["sum"] == 3
+    assert dag.tasks["c"].elapsed >= 0
+
+
+def test_failures():
+    dag = DAG()
+
+    def fail():
+        raise ValueError("failed")
+
+    dag.add("failed", fail)
+    dag.add("after_failed", print, after=["failed"])
+    dag.add("after_after", print, after=["after_failed"])
+    dag.add("after_missing", print, after=["missing"])
+    dag.add("independent", int, "1")
+
+    errors = dag.run()
+
+    assert isinstance(errors["failed"], ValueError)
+    assert isinstance(errors["after_failed"], DependencyFailed)
+    assert isinstance(errors["after_after"], DependencyFailed)
+    assert isinstance(errors["after_missing"], DependencyFailed)
+    assert dag.results == {"independent": 1}
+
+
+def test_added_while_running():
+    dag = DAG()
+
+    def fan_out(items):
+        # One task per item, and one after all of them
+        names = [dag.add(f"square_{item}", operator.mul, item, item) for item in items]
+        dag.add("total", lambda *squares: sum(squares), after=names)
+        return len(items)
+
+    dag.add("fan_out", fan_out, [1, 2, 3])
+    # Added once
+    dag.add("fan_out", fan_out, [4])
+
+    assert dag.run() == {}
+    assert dag.results["fan_out"] == 3
+    assert dag.results["total"] == 14
@@ -0,0 +1,126 @@
+import multiprocessing
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+from diskfiles.countTables import CountTable
+from utils import database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # Created from the schema and the migrations on the first connection
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    database.set_db_path(db_path)
+    yield db_path
+    database.close_connection()
+
+
+def test_connection_reused(db_path):
+    connection = database.get_connection()
+
+    assert database.get_connection() is connection
+    assert database.fetch_value("PRAGMA journal_mode") == "wal"
+    # Other threads get their own connection
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not connection
+
+
+def test_insert_many(db_path):
+    rows = [(f"ENCSR{i:06}", "n") for i in range(25)]
+
+    assert database.insert_many("experiments", ["accession", "control"], rows, 10) == 25
+    # Existing rows are skipped
+    assert database.insert_many("experiments", ["accession", "control"], rows[:5]) == 0
+    assert database.insert("experiments", accession="ENCSR999999", control="y") == 1
+    assert database.fetch_value("SELECT COUNT(*) FROM experiments") == 26
+
+
+def test_transaction(db_path):
+    with database.transaction():
+        database.insert("experiments", accession="ENCSR000AAA", control="n")
+        # Nested transactions are part of the outer one
+        with database.transaction():
+            database.insert("experiments", accession="ENCSR000BBB", control="n")
+
+    with pytest.raises(ValueError):
+        with database.transaction():
+            database.insert("experiments", accession="ENCSR000CCC", control="n")
+            raise ValueError
+
+    accessions = database.get_connection().execute("SELECT accession FROM experiments")
+    assert [row[0] for row in accessions] == ["ENCSR000AAA", "ENCSR000BBB"]
+
+
+def submit_experiments(worker: int) -> None:
+    for i in range(200):
+        database.submit("experiments", accession=f"ENCSR{worker}{i:05}", control="n")
+
+
+def test_database_writer(db_path):
+    with database.DatabaseWriter(batch_size=150) as writer, multiprocessing.Pool(
+        4, initializer=database.attach_writer, initargs=(writer.queue,)
+    ) as pool:
+        pool.map(submit_experiments, range(4))
+
+    assert database.fetch_value("SELECT COUNT(*) FROM experiments") == 800
+
+
+def test_database_writer_error(db_path):
+    with pytest.raises(database.DatabaseWriterError):
+        with database.DatabaseWriter() as writer:
+            writer.queue.put(("no_such_table", ("accession",), ("ENCSR000AAA",)))
+
+
+def test_count_table_update_database(db_path, tmp_path):
+    table_path = tmp_path / Path("ENCFF000AAA.tsv")
+    table_path.write_text("ACGTACGT\t1\t2\nGGGGCCCC\t0\t4\n")
+    count_table = CountTable(table_path)
+
+    with pytest.raises(ValueError):
+        count_table.update_database()
+
+    database.insert("experiments", accession="ENCSR000AAA", control="n")
+    database.insert("libraries", accession="ENCLB000AAA", experiment_id=1)
+    database.insert(
+        "files", accession="ENCFF000AAA", experiment_id=1, library_id=1, paired_end="n"
+    )
+    count_table.update_database()
+    count_table.update_database()
+
+    assert database.fetch_one("SELECT * FROM count_tables") == (1, 1, 2, 1, 2)
+    assert count_table.get_count_table_id() == 1
+
+
+def test_migrate(tmp_path):
+    # A database with the baseline schema, from before the migrations
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(database.SCHEMA_PATH.read_text())
+        conn.execute("INSERT INTO count_tables VALUES (1, '7', 10, 5, 5)")
+    conn.close()
+
+    with sqlite3.connect(db_path, isolation_level=None) as conn:
+        latest = database.get_migrations()[-1][0]
+        assert database.migrate(conn) == latest
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == latest
+        # Already up to date
+        assert database.migrate(conn) == latest
+
+        assert conn.execute(
+            "SELECT r1_file, typeof(r1_file) FROM count_tables"
+        ).fetchone() == (7, "integer")
+        # The count table of a file is found with the index, not a scan
+        plan = conn.execute(
+            """
+            EXPLAIN QUERY PLAN SELECT count_tables.id FROM count_tables
+            JOIN files ON files.id = count_tables.r1_file WHERE files.accession = ?
+            """,
+            ("ENCFF000AAA",),
+        ).fetchall()
+        assert all(step[-1].startswith("SEARCH") for step in plan)
+    conn.close()
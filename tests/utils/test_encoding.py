@@ -0,0 +1,37 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+from utils.encoding import encode_sequences, kmer_composition, kmer_names
+
+
+def kmer_composition_loop(seq, k):
+    """k-mer counts / probe length, counted one k-mer at a time"""
+    count = defaultdict(int)
+    for i in range(len(seq) - k + 1):
+        count[seq[i : i + k]] += 1
+    return [count[kmer] / len(seq) for kmer in kmer_names(k)]
+
+
+def test_kmer_names():
+    assert kmer_names(1) == ["A", "C", "G", "T"]
+    assert kmer_names(2)[:5] == ["AA", "AC", "AG", "AT", "CA"]
+    assert len(kmer_names(6)) == 4096
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 6])
+def test_kmer_composition(k):
+    seqs = ["ACGTTGCANNACGTAC", "TTTTTTTTTTTTTTTT", "GATTACAGATTACAGA"]
+    composition = kmer_composition(encode_sequences(seqs), k)
+    assert composition.dtype == np.float32
+    assert composition.shape == (3, 4**k)
+    for seq, row in zip(seqs, composition):
+        assert np.allclose(row, kmer_composition_loop(seq, k))
+
+
+def test_kmer_composition_lengths():
+    # Padded probes only count k-mers within their length
+    codes = encode_sequences(["ACGTAAAA", "ACGTACGT"])
+    composition = kmer_composition(codes, 2, lengths=np.array([4, 8]))
+    assert np.allclose(composition[0], kmer_composition_loop("ACGT", 2))
+    assert np.allclose(composition[1], kmer_composition_loop("ACGTACGT", 2))
@@ -0,0 +1,196 @@
+import os
+from pathlib import Path
+
+import pytest
+from utils import database, executors
+from utils.slurmjob import Slurmjob
+
+
+@pytest.fixture(autouse=True)
+def db_path(tmp_path):
+    # Submitted jobs are recorded in the ledger
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    database.set_db_path(db_path)
+    yield db_path
+    database.close_connection()
+
+
+def make_job(tmp_path, name, command, cores=1, memory="1G"):
+    script = tmp_path / Path(f"{name}.sh")
+    script.write_text(f"#!/bin/bash\n{command}\n")
+    script.chmod(0o755)
+    return Slurmjob(
+        file_path=tmp_path / Path(f"{name}.job"),
+        job_name=name,
+        job_script=script,
+        job_params=(),
+        output=name,
+        cores=cores,
+        memory=memory,
+    )
+
+
+def test_parse_memory():
+    assert executors.parse_memory("16G") == 16 * 1024**3
+    assert executors.parse_memory("500") == 500 * 1024**2
+    with pytest.raises(ValueError):
+        executors.parse_memory("lots")
+
+
+def test_local_executor(tmp_path):
+    executor = executors.LocalExecutor(cores=2, memory="2G")
+    ok = make_job(tmp_path, "ok", "echo $SLURM_CPUS_PER_TASK")
+    failed = make_job(tmp_path, "failed", "echo oops >&2; exit 3", cores=8)
+
+    results = executor.wait([ok.submitJob(executor), failed.submitJob(executor)])
+
+    ok_result, failed_result = results.values()
+    assert ok_result.succeeded and ok_result.elapsed >= 0
+    assert ok.out_path.read_text() == "1\n"
+    # Given the whole executor
+    assert failed_result.returncode == 3
+    assert failed.err_path.read_text() == "oops\n"
+
+
+def test_local_executor_resources(tmp_path):
+    executor = executors.LocalExecutor(cores=4, memory="4G")
+    log = tmp_path / Path("log")
+    # Each job takes half the cores or half the memory
+    jobs = [
+        make_job(
+            tmp_path,
+            f"job_{i}",
+            f"echo start >> {log}; sleep 0.2; echo end >> {log}",
+            **request,
+        )
+        for i, request in enumerate(
+            [{"cores": 2}, {"cores": 2}, {"memory": "2G"}, {"memory": "2G"}] * 2
+        )
+    ]
+    for job in jobs:
+        job.submitJob(executor)
+    assert all(result.succeeded for result in executor.wait().values())
+
+    running, most_running = 0, 0
+    for line in log.read_text().split():
+        running += 1 if line == "start" else -1
+        most_running = max(most_running, running)
+    assert most_running == 2
+
+
+def test_post_command(tmp_path):
+    executor = executors.LocalExecutor(cores=1)
+    marker = tmp_path / Path("marker")
+    ok = make_job(tmp_path, "ok", "true")
+    ok.post_command = f"touch {marker}"
+    ok.create_file()
+    failed = make_job(tmp_path, "failed", "exit 2")
+    failed.post_command = f"touch {marker}.failed"
+    failed.create_file()
+
+    results = executor.wait([ok.submitJob(executor), failed.submitJob(executor)])
+
+    assert [result.returncode for result in results.values()] == [0, 2]
+    assert marker.exists()
+    assert not Path(f"{marker}.failed").exists()
+
+
+def test_wall_time(tmp_path):
+    job = make_job(tmp_path, "job", "true")
+    assert "#SBATCH -t 4:59:00\n" in job.file_path.read_text()
+
+    job.minutes = 90
+    job.create_file()
+    assert "#SBATCH -t 1:30:00\n" in job.file_path.read_text()
+
+
+def test_slurm_executor(tmp_path, monkeypatch):
+    # sbatch stand-in printing what sbatch --parsable does
+    sbatch = tmp_path / Path("bin/sbatch")
+    sbatch.parent.mkdir()
+    sbatch.write_text(
+        '#!/bin/bash\necho "$@" > "$(dirname $0)/args"\necho "1234;burg"\n'
+    )
+    sbatch.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{sbatch.parent}{os.pathsep}{os.environ['PATH']}")
+    job = make_job(tmp_path, "job", "true")
+
+    assert job.submitJob(executors.SlurmExecutor()) == "1234"
+    assert (sbatch.parent / Path("args")).read_text().split() == [
+        "--parsable",
+        str(job.file_path),
+    ]
+    job.submitJob(executors.SlurmExecutor(), after=["1", "2"])
+    assert (sbatch.parent / Path("args")).read_text().split() == [
+        "--parsable",
+        "--dependency=afterok:1:2",
+        "--kill-on-invalid-dep=yes",
+        str(job.file_path),
+    ]
+
+    sbatch.write_text("#!/bin/bash\necho 'invalid account' >&2\nexit 1\n")
+    with pytest.raises(executors.JobSubmissionError):
+        job.submitJob(executors.SlurmExecutor())
+
+
+def test_local_array_after(tmp_path):
+    executor = executors.LocalExecutor(cores=2)
+    log = tmp_path / Path("log")
+    first = make_job(tmp_path, "first", f"echo first >> {log}")
+    array = make_job(tmp_path, "array", f'echo "$1 $2" >> {log}')
+    array.array_params = [("a", "b c"), ("d", "e")]
+    array.array_limit = 1
+    array.create_file()
+
+    array_id = array.submitJob(executor, after=[first.submitJob(executor)])
+    result = executor.wait([array_id])[array_id]
+
+    assert result.succeeded and len(result.tasks) == 2
+    lines = log.read_text().splitlines()
+    assert lines[0] == "first"
+    assert sorted(lines[1:]) == ["a b c", "d e"]
+    assert (tmp_path / Path("array_1.out")).exists()
+
+
+def test_local_after_failed(tmp_path):
+    executor = executors.LocalExecutor(cores=2)
+    failed = make_job(tmp_path, "failed", "exit 1")
+    never = make_job(tmp_path, "never", "true")
+    never_id = never.submitJob(executor, after=[failed.submitJob(executor)])
+
+    result = executor.wait([never_id])[never_id]
+
+    assert result.state == "CANCELLED" and result.returncode is None
+    assert not never.out_path.exists()
+    with pytest.raises(executors.JobSubmissionError):
+        never.submitJob(executor, after=["12345"])
+
+
+def test_slurm_wait(tmp_path, monkeypatch):
+    bin_path = tmp_path / Path("bin")
+    bin_path.mkdir()
+    # sacct stand-in, with a finished job and a job array
+    sacct = bin_path / Path("sacct")
+    sacct.write_text(
+        "#!/bin/bash\ncat <<EOF\n"
+        "10|single|COMPLETED|0:0|2024-01-01T10:00:00|2024-01-01T10:01:40|\n"
+        "11_0|array|COMPLETED|0:0|2024-01-01T10:00:00|2024-01-01T10:00:10|\n"
+        "11_1|array|TIMEOUT|0:0|2024-01-01T10:00:00|2024-01-01T12:00:00|\n"
+        "EOF\n"
+    )
+    sacct.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    executor = executors.SlurmExecutor(poll_interval=0)
+
+    results = executor.wait(["10", "11"])
+
+    assert results["10"].succeeded and results["10"].elapsed == 100
+    assert results["11"].state == "TIMEOUT"
+    assert [task.job_id for task in results["11"].tasks] == ["11_0", "11_1"]
+
+
+def test_get_executor(monkeypatch):
+    monkeypatch.setattr(executors, "_executor", None)
+    monkeypatch.setenv("SELEX_X_GENOME_EXECUTOR", "local")
+    assert isinstance(executors.get_executor(), executors.LocalExecutor)
+    assert executors.get_executor() is executors.get_executor()
@@ -0,0 +1,164 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from utils import database, executors, ledger
+from utils.slurmjob import Slurmjob
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    database.set_db_path(db_path)
+    yield db_path
+    database.close_connection()
+
+
+def make_job(tmp_path, name, command, **kwargs):
+    script = tmp_path / Path(f"{name}.sh")
+    script.write_text(f"#!/bin/bash\n{command}\n")
+    script.chmod(0o755)
+    return Slurmjob(
+        file_path=tmp_path / Path(f"{name}.job"),
+        job_name=name,
+        job_script=script,
+        job_params=(),
+        output=name,
+        cores=1,
+        memory="1G",
+        **kwargs,
+    )
+
+
+def get_jobs():
+    return (
+        database.get_connection()
+        .execute(
+            "SELECT job_id, state, exit_code, attempt, retry_of, inputs FROM jobs ORDER BY id"
+        )
+        .fetchall()
+    )
+
+
+def test_escalate():
+    assert ledger.escalate("16G", 90, "OUT_OF_MEMORY") == ("32768M", 90)
+    assert ledger.escalate("16G", 90, "TIMEOUT") == ("16G", 180)
+    assert ledger.escalate("16G", 90, "FAILED") == ("16G", 90)
+
+
+def test_wait_retries(db_path, tmp_path):
+    executor = executors.LocalExecutor(cores=2)
+    marker = tmp_path / Path("marker")
+    # Fails the first time only
+    flaky = make_job(
+        tmp_path, "flaky", f"[ -e {marker} ] || {{ touch {marker}; exit 1; }}"
+    )
+    job_id = flaky.submitJob(executor)
+
+    result = ledger.wait([job_id], executor)[job_id]
+
+    assert result.succeeded
+    (first_id, state, exit_code, attempt, retry_of, _), retry = get_jobs()
+    assert (first_id, state, exit_code, attempt, retry_of) == (
+        job_id,
+        "FAILED",
+        1,
+        1,
+        None,
+    )
+    assert retry[1:5] == ("COMPLETED", 0, 2, 1)
+    assert (tmp_path / Path("flaky_retry2.out")).exists()
+    wall_time, max_rss = database.fetch_one(
+        "SELECT wall_time, max_rss FROM jobs WHERE job_id = ?", (job_id,)
+    )
+    assert wall_time >= 0 and max_rss > 0
+
+
+def test_wait_retries_failed_tasks(db_path, tmp_path):
+    executor = executors.LocalExecutor(cores=2)
+    array = make_job(
+        tmp_path,
+        "array",
+        '[ "$1" = ok ]',
+        array_params=[("ok",), ("fail",), ("ok",)],
+        post_command=[f"touch {tmp_path / Path(f'post_{i}')}" for i in range(3)],
+    )
+    job_id = array.submitJob(executor)
+
+    result = ledger.wait([job_id], executor, max_attempts=2)[job_id]
+
+    assert result.state == "FAILED"
+    first, retry = get_jobs()
+    assert retry[3:5] == (2, 1)
+    # Only the failed task is run again, with its own post command
+    assert json.loads(retry[5])["array_params"] == [["fail"]]
+    assert json.loads(retry[5])["post_command"] == [
+        f"touch {tmp_path / Path('post_1')}"
+    ]
+    assert [(tmp_path / Path(f"post_{i}")).exists() for i in range(3)] == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_poll(db_path, tmp_path, monkeypatch):
+    bin_path = tmp_path / Path("bin")
+    bin_path.mkdir()
+    # sbatch and sacct stand-ins: job 55 ran out of memory, its retry is 56
+    (bin_path / Path("sbatch")).write_text("#!/bin/bash\necho 56\n")
+    (bin_path / Path("sacct")).write_text(
+        "#!/bin/bash\ncat <<EOF\n"
+        "55|job|OUT_OF_MEMORY|0:125|2024-01-01T10:00:00|2024-01-01T10:00:30|\n"
+        "55.batch|batch|OUT_OF_MEMORY|0:125|2024-01-01T10:00:00|2024-01-01T10:00:30|2048K\n"
+        "EOF\n"
+    )
+    for path in bin_path.iterdir():
+        path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    job = make_job(tmp_path, "job", "true")
+    ledger.record(job, "55", executors.SlurmExecutor())
+
+    ledger.poll(retry=True)
+
+    assert database.fetch_one(
+        "SELECT state, wall_time, max_rss FROM jobs WHERE job_id = '55'"
+    ) == ("OUT_OF_MEMORY", 30, 2048 * 1024)
+    assert database.fetch_one(
+        "SELECT memory, attempt, state FROM jobs WHERE job_id = '56'"
+    ) == ("2048M", 2, "PENDING")
+    # Already resubmitted
+    ledger.poll(retry=True)
+    assert database.fetch_value("SELECT COUNT(*) FROM jobs") == 2
+
+
+def test_local_jobs_recorded_when_done(db_path, tmp_path):
+    executor = executors.LocalExecutor(cores=1)
+    job_ids = [
+        make_job(tmp_path, "ok", "true").submitJob(executor),
+        make_job(tmp_path, "failed", "exit 4").submitJob(executor),
+    ]
+
+    # Without ledger.wait
+    executor.wait(job_ids)
+
+    assert [row[:3] for row in get_jobs()] == [
+        (job_ids[0], "COMPLETED", 0),
+        (job_ids[1], "FAILED", 4),
+    ]
+
+
+def test_submit_without_ledger(tmp_path, capsys):
+    # A directory can't be opened as the database
+    database.set_db_path(tmp_path)
+    executor = executors.LocalExecutor(cores=1)
+    job = make_job(tmp_path, "ok", "true")
+
+    job_id = job.submitJob(executor)
+
+    # The job was queued, its id isn't lost
+    assert job.job_id == job_id
+    assert executor.wait([job_id])[job_id].succeeded
+    assert f"Job {job_id} was not recorded in the ledger" in capsys.readouterr().err
+    database.close_connection()
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+from utils import database, packing
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    database.set_db_path(db_path)
+    yield db_path
+    database.close_connection()
+
+
+def test_pack():
+    costs = {"a": 50, "b": 40, "c": 30, "d": 20, "e": 10, "huge": 500}
+
+    bins = packing.pack(costs, 100)
+
+    assert bins == [["huge"], ["a", "b", "e"], ["c", "d"]]
+    assert packing.get_runtime([costs[item] for item in bins[1]], 2) == 50
+    assert packing.get_runtime([costs["huge"]], 2) == 500
+
+
+def test_estimate_costs(db_path):
+    kind = packing.MOTIF_X_EXPERIMENT
+    # No history yet
+    assert packing.estimate_costs(kind, {"new": 0, "old": 1024**2}) == {
+        "new": packing.DEFAULT_BUILD_SECONDS,
+        "old": 60,
+    }
+
+    packing.record_timing(kind, "old", 1000, 30)
+    packing.record_timing(kind, "other", 3000, 30)
+    packing.record_timing(kind, "built", 0, 500)
+    costs = packing.estimate_costs(kind, {"old": 1000, "other": 6000, "new": 0})
+
+    # Its last timing, the rate of all the timings, the average of the ones built
+    assert costs == {"old": 30, "other": 90, "new": 500}
+
+
+def test_get_input_size(tmp_path):
+    for name in ("ENCLB1/ENCFF1.tsv.gz", "ENCLB2/ENCFF2.tsv.gz", "ENCLB2/ENCFF2.fasta"):
+        (tmp_path / Path(name)).parent.mkdir(exist_ok=True)
+        (tmp_path / Path(name)).write_bytes(b"x" * 10)
+
+    assert packing.get_input_size(tmp_path, packing.COUNT_TABLES) == 20
+    assert packing.get_input_size(tmp_path / Path("missing"), packing.COUNT_TABLES) == 0
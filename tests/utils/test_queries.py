@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+from utils import database, queries
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / Path("Selex_X_Genome.db")
+    database.set_db_path(db_path)
+    queries.clear_cache()
+
+    with database.transaction():
+        database.insert("experiments", accession="ENCSR000AAA", control="n", lab="a")
+        database.insert("experiments", accession="ENCSR000BBB", control="n", lab="b")
+        database.insert("experiments", accession="ENCSR000CCC", control="y")
+        for i, experiment_id in enumerate([1, 1, 2, 3]):
+            database.insert(
+                "libraries", accession=f"ENCLB00{i}AAA", experiment_id=experiment_id
+            )
+            database.insert(
+                "files",
+                accession=f"ENCFF00{i}AAA",
+                experiment_id=experiment_id,
+                library_id=i + 1,
+            )
+        for i in range(3):
+            database.insert(
+                "count_tables", r1_file=i + 1, probe_count=10, r0_count=5, r1_count=5
+            )
+            for tf, enrichment in (("CTCF", 2.0 + i), ("YY1", 1.0)):
+                database.insert(
+                    "motif",
+                    type="Mononucleotide",
+                    tf=tf,
+                    search_tf="CTCF",
+                    organism="Homo+sapiens",
+                    count_table_id=i + 1,
+                    enrichment=enrichment,
+                )
+    yield db_path
+    database.close_connection()
+
+
+def test_experiment_metadata(db_path):
+    metadata = queries.experiment_metadata()
+
+    assert list(metadata["file"]) == [f"ENCFF00{i}AAA" for i in range(4)]
+    assert list(metadata["experiment"]) == ["ENCSR000AAA"] * 2 + [
+        "ENCSR000BBB",
+        "ENCSR000CCC",
+    ]
+    assert list(queries.experiment_metadata(control=True)["file"]) == ["ENCFF003AAA"]
+
+
+def test_motif_scores(db_path):
+    scores = queries.motif_scores("CTCF", "Homo+sapiens", tf="CTCF")
+
+    assert list(scores["enrichment"]) == [2.0, 3.0, 4.0]
+    assert list(scores["lab"]) == ["a", "a", "b"]
+    assert queries.motif_scores(tf="GATA1").empty
+
+
+def test_enrichment_matrix(db_path):
+    matrix = queries.enrichment_matrix("CTCF", "Homo+sapiens")
+
+    assert matrix.loc["CTCF"].to_dict() == {"ENCSR000AAA": 2.5, "ENCSR000BBB": 4.0}
+    assert matrix.loc["YY1"].to_dict() == {"ENCSR000AAA": 1.0, "ENCSR000BBB": 1.0}
+
+
+def test_cache(db_path):
+    scores = queries.motif_scores(tf="CTCF")
+    scores["enrichment"] = 0
+    # Cached frames can't be changed by callers
+    assert list(queries.motif_scores(tf="CTCF")["enrichment"]) == [2.0, 3.0, 4.0]
+
+    database.get_connection().execute("UPDATE motif SET enrichment = 10")
+    # New results once the database changed
+    assert list(queries.motif_scores(tf="CTCF")["enrichment"]) == [10.0] * 3